@@ -0,0 +1,161 @@
+"""
+Admission control
+
+Every request is admitted through the pool of its route before it runs. A
+pool allows `concurrency` requests at once and lets at most `queue` more wait
+(up to ADMISSION_TIMEOUT seconds) for a slot; anything beyond that is turned
+away at once with 503 and Retry-After instead of tying up a worker. Expensive
+routes get their own small pools, so a burst of sign-ups or Google logins
+cannot starve the cheap read endpoints in the default pool.
+
+Routes map to pools by endpoint (`user.login`), then by blueprint (`auth`),
+then `default`. Both can be overridden from the environment:
+
+    ADMISSION_LIMITS="passwords=2:8,default=32:64"   # pool=concurrency:queue
+    ADMISSION_ROUTES="exercise.start_workout=writes"  # endpoint or blueprint=pool
+
+A concurrency of 0 leaves a pool unlimited. Per pool, /metrics shows the
+`admission.<pool>.active` and `.waiting` gauges, the configured `.limit` and
+`.queue`, and `.rejected` / `.timeouts` counters. Streamed responses give
+their slot back when the view returns, before the body is sent. That is
+deliberate: a slow or stalled client must not hold a slot for as long as it
+takes to download, and the body's reads are short batched queries that
+hold no database lock between batches (see streaming.py).
+"""
+
+import threading
+from flask import g, request, jsonify
+
+from metrics import metrics
+
+# pool -> (concurrency, queue)
+DEFAULT_POOLS = {
+    'passwords': (4, 16),
+    'google': (4, 8),
+    'writes': (16, 64),
+    'default': (64, 256),
+}
+
+# endpoint or blueprint -> pool
+DEFAULT_ROUTES = {
+    'user.register': 'passwords',
+    'user.login': 'passwords',
+    'user.update_user_profile': 'passwords',
+    'auth': 'google',
+    'exercise.start_workout': 'writes',
+    'exercise.reset_workout_library': 'writes',
+    'catalog_import': 'writes',
+    'telemetry': 'writes',
+}
+
+
+class Rejected(Exception):
+    """Raised when a pool is full."""
+
+
+class Pool:
+    def __init__(self, name, concurrency, queue):
+        self.name = name
+        self.concurrency = concurrency
+        self.queue = queue
+        self._slots = threading.Semaphore(concurrency) if concurrency else None
+        self._lock = threading.Lock()
+        self.active = 0
+        self.waiting = 0
+        metrics.set_gauge(f'admission.{name}.limit', concurrency)
+        metrics.set_gauge(f'admission.{name}.queue', queue)
+
+    def acquire(self, timeout):
+        """Take a slot, waiting in the queue if there is room. Returns False if rejected."""
+        if self._slots is None:
+            return True
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                if self.waiting >= self.queue:
+                    metrics.incr(f'admission.{self.name}.rejected')
+                    return False
+                self.waiting += 1
+                metrics.set_gauge(f'admission.{self.name}.waiting', self.waiting)
+            try:
+                admitted = self._slots.acquire(timeout=timeout)
+            finally:
+                with self._lock:
+                    self.waiting -= 1
+                    metrics.set_gauge(f'admission.{self.name}.waiting', self.waiting)
+            if not admitted:
+                metrics.incr(f'admission.{self.name}.timeouts')
+                return False
+        with self._lock:
+            self.active += 1
+            metrics.set_gauge(f'admission.{self.name}.active', self.active)
+        return True
+
+    def release(self):
+        if self._slots is None:
+            return
+        with self._lock:
+            self.active -= 1
+            metrics.set_gauge(f'admission.{self.name}.active', self.active)
+        self._slots.release()
+
+
+class Admission:
+    def __init__(self, pools=None, routes=None, timeout=5.0):
+        self.pools = {name: Pool(name, *limits) for name, limits in (pools or DEFAULT_POOLS).items()}
+        if 'default' not in self.pools:
+            self.pools['default'] = Pool('default', 0, 0)
+        self.routes = dict(routes or DEFAULT_ROUTES)
+        self.timeout = timeout
+
+    def pool_for(self, endpoint):
+        if endpoint in self.routes:
+            return self.pools[self.routes[endpoint]]
+        blueprint = (endpoint or '').rpartition('.')[0]
+        return self.pools[self.routes.get(blueprint, 'default')]
+
+
+def parse_limits(value):
+    """Parse 'pool=concurrency:queue,...' into {pool: (concurrency, queue)}."""
+    limits = {}
+    for item in filter(None, (part.strip() for part in (value or '').split(','))):
+        name, _, spec = item.partition('=')
+        concurrency, _, queue = spec.partition(':')
+        limits[name.strip()] = (int(concurrency), int(queue or 0))
+    return limits
+
+
+def parse_routes(value):
+    """Parse 'endpoint=pool,...' into {endpoint: pool}."""
+    routes = {}
+    for item in filter(None, (part.strip() for part in (value or '').split(','))):
+        route, _, pool = item.partition('=')
+        routes[route.strip()] = pool.strip()
+    return routes
+
+
+def init_app(app):
+    """Create the pools from the app config and admit every request through them."""
+    pools = dict(DEFAULT_POOLS, **parse_limits(app.config.get('ADMISSION_LIMITS')))
+    routes = dict(DEFAULT_ROUTES, **parse_routes(app.config.get('ADMISSION_ROUTES')))
+    unknown = set(routes.values()) - set(pools)
+    if unknown:
+        raise ValueError(f"ADMISSION_ROUTES refers to unknown pools: {', '.join(sorted(unknown))}")
+    admission = Admission(pools, routes, app.config.get('ADMISSION_TIMEOUT', 5.0))
+    app.extensions['admission'] = admission
+
+    @app.before_request
+    def _admit():
+        pool = admission.pool_for(request.endpoint)
+        if not pool.acquire(admission.timeout):
+            raise Rejected(pool.name)
+        g.admission_pool = pool
+
+    @app.teardown_request
+    def _leave(exc):
+        pool = g.pop('admission_pool', None)
+        if pool is not None:
+            pool.release()
+
+    @app.errorhandler(Rejected)
+    def _rejected(e):
+        return jsonify({'error': 'Server busy, please retry shortly'}), 503, {'Retry-After': '1'}
@@ -0,0 +1,157 @@
+"""
+Workout session archival
+
+Sessions older than the archive horizon are moved out of `workoutSession`
+into `workoutArchive`, one row per user and month. Each row keeps rollup
+stats (session count, total duration, posture accuracy sum) next to a
+zlib-compressed columnar JSON blob of the original sessions, so totals stay
+exact and the full history can still be rebuilt when a request asks for it.
+"""
+
+import json
+import zlib
+from datetime import datetime, timedelta
+
+COLUMNS = ('sessionID', 'date', 'duration', 'postureAccuracy')
+# Columns stored in a segment; older segments may lack the trailing ones
+SEGMENT_COLUMNS = COLUMNS + ('exerciseID',)
+
+
+def duration_seconds(duration):
+    """Convert a stored duration ('HH:MM:SS', 'MM:SS' or seconds) to seconds."""
+    if isinstance(duration, (int, float)):
+        return float(duration)
+    seconds = 0.0
+    try:
+        for part in str(duration).split(':'):
+            seconds = seconds * 60 + float(part)
+    except ValueError:
+        return 0.0
+    return seconds
+
+
+def archive_cutoff(horizon_days, now=None):
+    """Return the first day of the month that is `horizon_days` old, as 'YYYY-MM-DD'.
+
+    Sessions dated before the cutoff get archived. Cutting on a month
+    boundary keeps every segment a whole month.
+    """
+    now = now or datetime.now()
+    return (now - timedelta(days=horizon_days)).strftime('%Y-%m-01')
+
+
+def next_month(month):
+    year, mon = int(month[:4]), int(month[5:7])
+    return f"{year + mon // 12:04d}-{mon % 12 + 1:02d}"
+
+
+def encode_segment(rows):
+    columns = {name: [row[i] for row in rows] for i, name in enumerate(SEGMENT_COLUMNS)}
+    return zlib.compress(json.dumps(columns, separators=(',', ':')).encode('utf-8'))
+
+
+def decode_segment(data):
+    columns = json.loads(zlib.decompress(data).decode('utf-8'))
+    missing = [None] * len(columns['sessionID'])
+    return list(zip(*(columns.get(name, missing) for name in SEGMENT_COLUMNS)))
+
+
+def archive_sessions(storage, horizon_days, now=None):
+    """Move sessions older than the horizon into monthly segments.
+
+    Returns the number of sessions archived.
+    """
+    cutoff = archive_cutoff(horizon_days, now)
+    archived = 0
+    for partition in storage.partitions():
+        conn = partition.connect()
+        try:
+            months = conn.execute(
+                "SELECT DISTINCT userID, substr(date, 1, 7) FROM workoutSession WHERE date < ?", (cutoff,)
+            ).fetchall()
+            for user_id, month in months:
+                archived += _archive_month(conn, user_id, month)
+        finally:
+            conn.close()
+    return archived
+
+
+def _archive_month(conn, user_id, month):
+    with conn:
+        conn.execute("BEGIN IMMEDIATE")
+        rows = conn.execute(
+            "SELECT sessionID, date, duration, postureAccuracy, exerciseID FROM workoutSession "
+            "WHERE userID=? AND date >= ? AND date < ? ORDER BY date, sessionID",
+            (user_id, month, next_month(month))
+        ).fetchall()
+        if not rows:
+            return 0
+        existing = conn.execute(
+            "SELECT data FROM workoutArchive WHERE userID=? AND month=?", (user_id, month)
+        ).fetchone()
+        segment = (decode_segment(existing[0]) if existing else []) + rows
+        conn.execute(
+            "INSERT OR REPLACE INTO workoutArchive"
+            "(userID, month, sessionCount, totalDuration, postureAccuracySum, data) VALUES (?, ?, ?, ?, ?, ?)",
+            (user_id, month, len(segment),
+             sum(duration_seconds(row[2]) for row in segment),
+             sum(row[3] or 0.0 for row in segment),
+             encode_segment(segment))
+        )
+        ids = [(row[0],) for row in rows]
+        conn.executemany("DELETE FROM workoutSession WHERE sessionID=?", ids)
+        # archived sessions are still part of the history, so sync clients must not drop them
+        conn.executemany("DELETE FROM workoutTombstone WHERE sessionID=?", ids)
+    return len(rows)
+
+
+def reaches_archive(since, horizon_days, now=None):
+    """Return True if a history range starting at `since` may include archived months."""
+    return not since or since < archive_cutoff(horizon_days, now)
+
+
+def list_archived_sessions(storage, user_id, since=None, until=None):
+    """Return archived sessions of a user with since <= date < until, oldest first."""
+    return list(iter_archived_sessions(storage, user_id, since, until))
+
+
+def iter_archived_sessions(storage, user_id, since=None, until=None):
+    """Yield archived sessions like list_archived_sessions, decoding one month at a time."""
+    query = "SELECT month, data FROM workoutArchive WHERE userID=?"
+    params = [user_id]
+    if since:
+        query += " AND month >= ?"
+        params.append(since[:7])
+    if until:
+        query += " AND month <= ?"
+        params.append(until[:7])
+    segments = storage._iterate(query, params, key=('month',), batch_size=1,
+                                connect=lambda: storage.connect_for_user(user_id))
+    for _, data in segments:
+        for row in decode_segment(data):
+            if (not since or row[1] >= since) and (not until or row[1] < until):
+                yield row[:len(COLUMNS)]
+
+
+def workout_stats(storage, user_id):
+    """Return session count, total duration and average posture accuracy over the whole history."""
+    conn = storage.connect_for_user(user_id)
+    try:
+        live = conn.execute(
+            "SELECT duration, postureAccuracy FROM workoutSession WHERE userID=?", (user_id,)
+        ).fetchall()
+        count, total, accuracy = conn.execute(
+            "SELECT COALESCE(SUM(sessionCount), 0), COALESCE(SUM(totalDuration), 0), "
+            "COALESCE(SUM(postureAccuracySum), 0) FROM workoutArchive WHERE userID=?", (user_id,)
+        ).fetchone()
+    finally:
+        conn.close()
+
+    count += len(live)
+    total += sum(duration_seconds(duration) for duration, _ in live)
+    accuracy += sum(pa or 0.0 for _, pa in live)
+    return {
+        'sessionCount': count,
+        'totalDuration': total,
+        'averagePostureAccuracy': accuracy / count if count else 0.0
+    }
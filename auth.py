@@ -6,11 +6,9 @@ It allows users to sign in or register with their Google accounts.
 """
 
 from flask import Blueprint, request, jsonify
-from google.oauth2 import id_token
-from google.auth.transport import requests as google_requests
-import sqlite3
-import base64
-import re
+
+import thumbnails
+from storage import get_storage
 
 # Create a Blueprint for auth routes
 auth_bp = Blueprint('auth', __name__)
@@ -25,134 +23,63 @@ GOOGLE_CLIENT_IDS = [
 # Primary Web Client ID (used for verification)
 GOOGLE_CLIENT_ID = "192945878015-c7ck03vqeduqhnln1a9eslb085on44te.apps.googleusercontent.com"
 
-def get_db_connection():
-    """Create and return a connection to the SQLite database."""
-    conn = sqlite3.connect('fitness.db')
-    conn.row_factory = sqlite3.Row
-    return conn
-
 def find_user_by_email(email):
     """Find a user by their email address."""
-    conn = get_db_connection()
-    try:
-        cursor = conn.cursor()
-        cursor.execute("SELECT * FROM user WHERE email = ?", (email,))
-        user = cursor.fetchone()
-        return dict(user) if user else None
-    finally:
-        conn.close()
+    return get_storage().find_user(email=email)
 
 def find_user_by_google_id(google_id):
     """Find a user by their Google ID."""
-    conn = get_db_connection()
-    try:
-        cursor = conn.cursor()
-        # Add a query to check if google_id column exists
-        cursor.execute("PRAGMA table_info(user)")
-        columns = [column[1] for column in cursor.fetchall()]
-        
-        if 'google_id' not in columns:
-            # Add google_id column if it doesn't exist
-            cursor.execute("ALTER TABLE user ADD COLUMN google_id TEXT")
-            conn.commit()
-            
-        cursor.execute("SELECT * FROM user WHERE google_id = ?", (google_id,))
-        user = cursor.fetchone()
-        return dict(user) if user else None
-    finally:
-        conn.close()
+    return get_storage().find_user(google_id=google_id)
 
 def create_user_with_google(google_data):
     """Create a new user using Google account information."""
-    conn = get_db_connection()
-    try:
-        cursor = conn.cursor()
-        
-        # Check if google_id column exists
-        cursor.execute("PRAGMA table_info(user)")
-        columns = [column[1] for column in cursor.fetchall()]
-        
-        if 'google_id' not in columns:
-            # Add google_id column if it doesn't exist
-            cursor.execute("ALTER TABLE user ADD COLUMN google_id TEXT")
-            conn.commit()
-        
-        # Generate a username from email if not provided
-        username = google_data.get('username', google_data['email'].split('@')[0])
-        
-        # Check if username already exists, append numbers if needed
-        base_username = username
-        counter = 1
-        while True:
-            cursor.execute("SELECT username FROM user WHERE username = ?", (username,))
-            if not cursor.fetchone():
-                break
-            username = f"{base_username}{counter}"
-            counter += 1
-        
-        # Generate a random password for Google users
-        # This is not used for authentication but satisfies the NOT NULL constraint
-        google_password = f"GOOGLE_AUTH_{google_data['google_id']}"
-        
-        # Insert the new user with isActive=1
-        cursor.execute(
-            'INSERT INTO user (full_name, username, email, google_id, profilepic, isActive, password) VALUES (?, ?, ?, ?, ?, 1, ?)',
-            (
-                google_data['name'],
-                username,
-                google_data['email'],
-                google_data['google_id'],
-                google_data.get('photo', None),
-                google_password
-            )
-        )
-        conn.commit()
-        
-        # Get the newly created user
-        cursor.execute("SELECT * FROM user WHERE google_id = ?", (google_data['google_id'],))
-        user = cursor.fetchone()
-        return dict(user) if user else None
-    finally:
-        conn.close()
+    store = get_storage()
+
+    # Generate a username from email if not provided
+    username = google_data.get('username', google_data['email'].split('@')[0])
+
+    # Check if username already exists, append numbers if needed
+    base_username = username
+    counter = 1
+    while store.username_exists(username):
+        username = f"{base_username}{counter}"
+        counter += 1
+
+    # Generate a random password for Google users
+    # This is not used for authentication but satisfies the NOT NULL constraint
+    google_password = f"GOOGLE_AUTH_{google_data['google_id']}"
+
+    # Insert the new user with isActive=1
+    store.create_user({
+        'full_name': google_data['name'],
+        'username': username,
+        'email': google_data['email'],
+        'google_id': google_data['google_id'],
+        'profilepic': google_data.get('photo', None),
+        'isActive': 1,
+        'password': google_password
+    })
+
+    # Get the newly created user
+    return store.find_user(google_id=google_data['google_id'])
 
 def update_user_with_google_id(email, google_id, photo=None):
     """Update an existing user with Google ID."""
-    conn = get_db_connection()
-    try:
-        cursor = conn.cursor()
-        
-        # Check if google_id column exists
-        cursor.execute("PRAGMA table_info(user)")
-        columns = [column[1] for column in cursor.fetchall()]
-        
-        if 'google_id' not in columns:
-            # Add google_id column if it doesn't exist
-            cursor.execute("ALTER TABLE user ADD COLUMN google_id TEXT")
-            conn.commit()
-        
-        # Update query
-        update_query = 'UPDATE user SET google_id = ?'
-        params = [google_id]
-        
-        # Add photo update if provided
-        if photo:
-            update_query += ', profilepic = ?'
-            params.append(photo)
-            
-        # Complete the query
-        update_query += ' WHERE email = ?'
-        params.append(email)
-        
-        # Execute update
-        cursor.execute(update_query, params)
-        conn.commit()
-        
-        # Get the updated user
-        cursor.execute("SELECT * FROM user WHERE email = ?", (email,))
-        user = cursor.fetchone()
-        return dict(user) if user else None
-    finally:
-        conn.close()
+    store = get_storage()
+    user = store.find_user(email=email)
+    if not user:
+        return None
+
+    updates = {'google_id': google_id}
+
+    # Add photo update if provided
+    if photo:
+        updates['profilepic'] = photo
+
+    store.update_user(user['userID'], updates)
+
+    # Get the updated user
+    return store.find_user(email=email)
 
 def user_to_dict(user):
     """Convert a user database row to a dictionary."""
@@ -171,6 +98,7 @@ def user_to_dict(user):
         "email": user['email'],
         "full_name": user['full_name'],
         "profilePic": user.get('profilepic', None),
+        "profilePicThumbnails": thumbnails.thumbnail_urls(user['userID'], user.get('profilepic')),
         "profileComplete": profile_complete,
         "isActive": bool(user.get('isActive', 1))
     }
@@ -182,6 +110,10 @@ def google_auth():
     This endpoint verifies Google ID tokens and either creates a new user
     or authenticates an existing user based on the Google account details.
     """
+    # google-auth is heavy to import and only needed here
+    from google.oauth2 import id_token
+    from google.auth.transport import requests as google_requests
+
     data = request.json
     
     if not data or 'id_token' not in data:
@@ -237,6 +169,10 @@ def google_auth():
             else:
                 # Update existing user with Google ID
                 user = update_user_with_google_id(email, google_id, photo)
+
+            # the photo is only stored when the account is created or linked
+            if photo:
+                thumbnails.schedule(user['userID'])
         
         # Check if the user is active
         if not user.get('isActive', 1):
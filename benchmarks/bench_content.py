@@ -0,0 +1,84 @@
+"""
+Latency of GET /content for cached first pages versus pages read from SQLite.
+
+Seeds --items content rows spread over a few types in an in-memory database,
+then times the first page of every type from memory, with If-None-Match
+(304) and read from the database (cache dropped before every request).
+Prints mean, p50 and p95 latency.
+
+    python benchmarks/bench_content.py --items 5000 --requests 500
+"""
+
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DATABASE', 'memory:bench_content')
+# one client issuing many requests
+os.environ.setdefault('RATE_LIMIT_ENABLED', '0')
+
+import content  # noqa: E402
+from main import app, startup  # noqa: E402
+from security import encode_auth_token  # noqa: E402
+from storage import get_storage  # noqa: E402
+
+TYPES = ['tip', 'article', 'recipe', 'challenge']
+
+
+def report(name, latencies):
+    latencies = sorted(latencies)
+    p95 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+    print(f"{name:<16} mean={statistics.mean(latencies) * 1000:7.3f}ms "
+          f"p50={statistics.median(latencies) * 1000:7.3f}ms p95={p95 * 1000:7.3f}ms")
+
+
+def timed(func, repeat):
+    latencies = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        latencies.append(time.perf_counter() - start)
+    return latencies
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--items', type=int, default=5000)
+    parser.add_argument('--requests', type=int, default=500)
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    startup(background_jobs=False)
+    with app.app_context():
+        conn = get_storage().connect()
+        conn.executemany(
+            "INSERT INTO content(type, title, description) VALUES (?, ?, ?)",
+            ((rng.choice(TYPES), f'Item {i}', 'Lorem ipsum dolor sit amet. ' * 8) for i in range(args.items))
+        )
+        conn.commit()
+        conn.close()
+        headers = {'Authorization': f'Bearer {encode_auth_token(1, "user")}'}
+
+    with app.test_client() as client:
+        etags = {kind: client.get(f'/content?type={kind}', headers=headers).headers['ETag'] for kind in TYPES}
+
+        def cached():
+            assert client.get(f'/content?type={rng.choice(TYPES)}', headers=headers).status_code == 200
+
+        def revalidated():
+            kind = rng.choice(TYPES)
+            res = client.get(f'/content?type={kind}', headers=dict(headers, **{'If-None-Match': etags[kind]}))
+            assert res.status_code == 304
+
+        def uncached():
+            content.invalidate_content()
+            cached()
+
+        report('first page (db)', timed(uncached, args.requests))
+        report('first page', timed(cached, args.requests))
+        report('304', timed(revalidated, args.requests))
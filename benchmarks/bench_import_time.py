@@ -0,0 +1,65 @@
+"""
+Import-time budget for the app module.
+
+Imports `main` in fresh interpreters with `python -X importtime`, takes the
+fastest of several runs and compares its cumulative import time with the
+budget in import_budget.json. Exits with status 1 when the budget is
+exceeded or when a module listed as forbidden (heavy dependencies that must
+stay lazy) is imported.
+
+    python benchmarks/bench_import_time.py --runs 5
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BUDGET_FILE = os.path.join(ROOT, 'benchmarks', 'import_budget.json')
+
+
+def measure(module):
+    """Return {module name: (self us, cumulative us)} for one fresh import of `module`."""
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+        cwd=ROOT, capture_output=True, text=True, check=True,
+        env=dict(os.environ, DATABASE='memory:import_budget')
+    )
+    timings = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        timings[name.strip()] = (int(self_us), int(cumulative_us))
+    return timings
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--top', type=int, default=10, help="slowest modules to list")
+    args = parser.parse_args()
+
+    with open(BUDGET_FILE) as f:
+        budget = json.load(f)
+    module = budget['module']
+
+    runs = [measure(module) for _ in range(args.runs)]
+    best = min(runs, key=lambda timings: timings[module][1])
+    total_ms = best[module][1] / 1000
+
+    print(f"import {module}: {total_ms:.1f} ms (budget {budget['budget_ms']} ms, best of {args.runs})")
+    for name, (self_us, _) in sorted(best.items(), key=lambda item: -item[1][0])[:args.top]:
+        print(f"  {self_us / 1000:8.1f} ms  {name}")
+
+    failures = []
+    if total_ms > budget['budget_ms']:
+        failures.append(f"import time {total_ms:.1f} ms exceeds budget of {budget['budget_ms']} ms")
+    for name in budget.get('forbidden', []):
+        if name in best:
+            failures.append(f"{name} is imported eagerly")
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    sys.exit(1 if failures else 0)
@@ -0,0 +1,77 @@
+"""
+Login throughput at different password-hashing pool sizes.
+
+Registers one user against an in-memory database, then hammers POST /login
+from concurrent client threads for each pool size and prints successful
+logins/s, p50/p95 latency and how many requests were shed with 503.
+
+    python benchmarks/bench_login.py --clients 16 --seconds 5 --pools 1 2 4 8
+"""
+
+import argparse
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DATABASE', 'memory:bench_login')
+
+from main import app, startup  # noqa: E402
+from passwords import PasswordHasher  # noqa: E402
+
+USER = {
+    'full_name': 'Bench', 'username': 'bench', 'password': 'Passw0rd!', 'email': 'bench@example.com',
+    'gender': 'Male', 'height': 180, 'weight': 75, 'birth_date': '1990-01-01',
+    'fitness_goal': 'Strength', 'activity_level': 'High'
+}
+
+
+def percentile(values, pct):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))] if values else 0.0
+
+
+def run(workers, queue, clients, seconds):
+    app.extensions['passwords'] = PasswordHasher(workers=workers, max_queue=queue,
+                                                 n=app.config['PASSWORD_SCRYPT_N'])
+    deadline = time.perf_counter() + seconds
+    latencies, shed = [], [0]
+    lock = threading.Lock()
+
+    def client():
+        with app.test_client() as c:
+            while time.perf_counter() < deadline:
+                start = time.perf_counter()
+                res = c.post('/login', json={'username': USER['username'], 'password': USER['password']})
+                elapsed = time.perf_counter() - start
+                with lock:
+                    if res.status_code == 200:
+                        latencies.append(elapsed)
+                    elif res.status_code == 503:
+                        shed[0] += 1
+
+    with ThreadPoolExecutor(max_workers=clients) as pool:
+        for _ in range(clients):
+            pool.submit(client)
+    app.extensions['passwords'].shutdown()
+    return len(latencies) / seconds, percentile(latencies, 50), percentile(latencies, 95), shed[0]
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--clients', type=int, default=16)
+    parser.add_argument('--seconds', type=float, default=5)
+    parser.add_argument('--queue', type=int, default=64)
+    parser.add_argument('--pools', type=int, nargs='+', default=[1, 2, 4, 8])
+    args = parser.parse_args()
+
+    startup(background_jobs=False)
+    with app.test_client() as c:
+        c.post('/register', json=USER)
+
+    for workers in args.pools:
+        rate, p50, p95, shed = run(workers, args.queue, args.clients, args.seconds)
+        print(f"pool={workers:<3} logins/s={rate:8.1f} p50={p50 * 1000:7.1f}ms "
+              f"p95={p95 * 1000:7.1f}ms shed={shed}")
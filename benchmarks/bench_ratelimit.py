@@ -0,0 +1,70 @@
+"""
+Cost of a rate limit check in microseconds.
+
+Times RateLimiter.check for a single hot client and spread over --clients
+clients (with a --max-keys cap forcing evictions), the whole before_request
+check of an IP-keyed request, and that of a bearer token request, where
+decoding the token is shared with token_required.
+
+    python benchmarks/bench_ratelimit.py --checks 200000 --clients 50000
+"""
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DATABASE', 'memory:bench_ratelimit')
+
+from main import app, startup  # noqa: E402
+from ratelimit import RateLimiter, client_key  # noqa: E402
+from security import encode_auth_token  # noqa: E402
+
+
+def measure(name, func, checks):
+    start = time.perf_counter()
+    func(checks)
+    elapsed = time.perf_counter() - start
+    print(f"{name:<22} {elapsed / checks * 1e6:7.2f} us/check  ({checks} checks)")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--checks', type=int, default=200000)
+    parser.add_argument('--clients', type=int, default=50000)
+    parser.add_argument('--max-keys', type=int, default=10000)
+    args = parser.parse_args()
+
+    startup(background_jobs=False)
+    limiter = RateLimiter({'default': (10 ** 9, 1)}, max_keys=args.max_keys)
+    clients = [f'ip:10.0.{i // 256 % 256}.{i % 256}-{i}' for i in range(args.clients)]
+
+    def hot(n):
+        check = limiter.check
+        for _ in range(n):
+            check('default', 'ip:127.0.0.1')
+
+    def spread(n):
+        check = limiter.check
+        for i in range(n):
+            check('default', clients[i % len(clients)])
+
+    measure('check, one client', hot, args.checks)
+    measure(f'check, {args.clients} clients', spread, args.checks)
+
+    live = app.extensions['ratelimit']
+    with app.app_context():
+        token = encode_auth_token(1, 'user')
+
+    def request_check(headers):
+        def run(n):
+            with app.test_request_context('/checkUser/1', headers=headers):
+                rule = live.rule_for('user.check_user')
+                for _ in range(n):
+                    live.check(rule, client_key())
+        return run
+
+    live.set_limit('default', 10 ** 9, 1)
+    measure('request, by IP', request_check({}), args.checks // 10)
+    measure('request, by token', request_check({'Authorization': f'Bearer {token}'}), args.checks // 10)
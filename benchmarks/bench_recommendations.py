@@ -0,0 +1,108 @@
+"""
+Scoring latency of /recommendations for a large exercise catalog.
+
+Seeds --exercises exercises with random categories, body parts and equipment
+and one user with --sessions recent sessions in an in-memory database, then
+times building the term matrix, scoring plus ranking the catalog, and
+GET /recommendations with the per-user cache cleared before every request
+(cold) and kept (cached). Prints mean, p50 and p95 latency.
+
+    python benchmarks/bench_recommendations.py --exercises 10000 --requests 200
+"""
+
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DATABASE', 'memory:bench_recommendations')
+# one client issuing many requests
+os.environ.setdefault('RATE_LIMIT_ENABLED', '0')
+
+import recommendations  # noqa: E402
+from main import app, startup  # noqa: E402
+from security import encode_auth_token  # noqa: E402
+from storage import get_storage  # noqa: E402
+
+CATEGORIES = ['Core', 'Lower Body', 'Upper Body', 'Cardio', 'Full Body', 'Flexibility']
+BODY_PARTS = ['Abdominals', 'Back', 'Quads', 'Hamstrings', 'Glutes', 'Chest', 'Triceps', 'Biceps',
+              'Shoulders', 'Calves', 'Obliques', 'Hips', 'Forearms', 'Neck']
+EQUIPMENT = ['None', 'Dumbbells', 'Barbell', 'Kettlebell', 'Resistance Band', 'Mat', 'Bench', 'Treadmill']
+
+
+def seed(store, exercises, sessions, rng):
+    store.clear_exercises()
+    conn = store.connect()
+    conn.executemany(
+        "INSERT INTO exercise(name, category, targetedBodyParts, requiredEquipment) VALUES (?, ?, ?, ?)",
+        ((f'Exercise {i}', rng.choice(CATEGORIES), ', '.join(rng.sample(BODY_PARTS, rng.randint(1, 4))),
+          rng.choice(EQUIPMENT)) for i in range(exercises))
+    )
+    conn.commit()
+    conn.close()
+    user_id = store.create_user({'full_name': 'Bench', 'username': 'bench', 'password': 'x',
+                                 'email': 'bench@example.com', 'height': 180, 'weight': 75,
+                                 'fitness_goal': 'Build strength', 'activity_level': 'Moderate', 'isActive': 1})
+    now = datetime.now()
+    for _ in range(sessions):
+        date = (now - timedelta(days=rng.uniform(0, 60))).strftime('%Y-%m-%d %H:%M:%S')
+        store.create_session(user_id, date, '00:30:00', rng.random(), rng.randint(1, exercises))
+    return user_id
+
+
+def report(name, latencies):
+    latencies = sorted(latencies)
+    p95 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+    print(f"{name:<16} mean={statistics.mean(latencies) * 1000:7.2f}ms "
+          f"p50={statistics.median(latencies) * 1000:7.2f}ms p95={p95 * 1000:7.2f}ms")
+
+
+def timed(func, repeat):
+    latencies = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        latencies.append(time.perf_counter() - start)
+    return latencies
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--exercises', type=int, default=10000)
+    parser.add_argument('--sessions', type=int, default=200)
+    parser.add_argument('--requests', type=int, default=200)
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    startup(background_jobs=False)
+    with app.app_context():
+        store = get_storage()
+        user_id = seed(store, args.exercises, args.sessions, random.Random(args.seed))
+        token = encode_auth_token(user_id, 'user')
+
+        def build():
+            recommendations.invalidate_catalog()
+            return recommendations.get_catalog(store)
+
+        report('term matrix', timed(build, 5))
+        catalog = recommendations.get_catalog(store)
+        terms = recommendations.profile_terms('Build strength', 'Moderate', 180, 75)
+        history = store.recent_sessions(user_id, recommendations.RECENT_SESSIONS)
+        report('score + rank', timed(lambda: recommendations.rank(
+            catalog, recommendations.score(catalog, terms, history), recommendations.MAX_LIMIT), args.requests))
+
+    headers = {'Authorization': f'Bearer {token}'}
+    with app.test_client() as client:
+        def request():
+            assert client.get('/recommendations', headers=headers).status_code == 200
+
+        def cold():
+            recommendations.invalidate_user(user_id)
+            request()
+
+        report('request (cold)', timed(cold, args.requests))
+        report('request (cached)', timed(request, args.requests))
@@ -0,0 +1,62 @@
+"""
+Latency of POST /refresh compared with POST /login.
+
+Registers one user against an in-memory database and times sequential
+requests to each endpoint, printing mean, p50, p95 and p99 latency.
+
+    python benchmarks/bench_refresh.py --requests 200
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DATABASE', 'memory:bench_refresh')
+
+from main import app, startup  # noqa: E402
+
+USER = {
+    'full_name': 'Bench', 'username': 'bench', 'password': 'Passw0rd!', 'email': 'bench@example.com',
+    'gender': 'Male', 'height': 180, 'weight': 75, 'birth_date': '1990-01-01',
+    'fitness_goal': 'Strength', 'activity_level': 'High'
+}
+
+
+def report(name, latencies):
+    latencies = sorted(latencies)
+
+    def pct(p):
+        return latencies[min(len(latencies) - 1, int(len(latencies) * p / 100))] * 1000
+
+    print(f"{name:<9} mean={statistics.mean(latencies) * 1000:7.2f}ms p50={pct(50):7.2f}ms "
+          f"p95={pct(95):7.2f}ms p99={pct(99):7.2f}ms")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--requests', type=int, default=200)
+    args = parser.parse_args()
+
+    startup(background_jobs=False)
+    with app.test_client() as client:
+        refresh_token = client.post('/register', json=USER).get_json()['refreshToken']
+
+        login_latencies = []
+        for _ in range(args.requests):
+            start = time.perf_counter()
+            res = client.post('/login', json={'username': USER['username'], 'password': USER['password']})
+            login_latencies.append(time.perf_counter() - start)
+            assert res.status_code == 200
+
+        refresh_latencies = []
+        for _ in range(args.requests):
+            start = time.perf_counter()
+            res = client.post('/refresh', json={'refreshToken': refresh_token})
+            refresh_latencies.append(time.perf_counter() - start)
+            refresh_token = res.get_json()['refreshToken']
+
+    report('/login', login_latencies)
+    report('/refresh', refresh_latencies)
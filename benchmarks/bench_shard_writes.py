@@ -0,0 +1,56 @@
+"""
+Write-throughput benchmark for sharded storage.
+
+Runs concurrent workout-session inserts against 1, 2, 4 and 8 shard files in a
+temporary directory and prints the sustained writes per second for each.
+
+    python benchmarks/bench_shard_writes.py --threads 8 --writes 500
+"""
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sharding import ShardedStorage  # noqa: E402
+
+
+def run(shards, threads, writes, users):
+    with tempfile.TemporaryDirectory() as tmp:
+        store = ShardedStorage(os.path.join(tmp, "bench.db"), shards)
+        store.initialize()
+        user_ids = [
+            store.create_user({"full_name": f"u{i}", "username": f"u{i}", "password": "x",
+                               "email": f"u{i}@example.com", "isActive": 1})
+            for i in range(users)
+        ]
+
+        def worker(seed):
+            rng = random.Random(seed)
+            for _ in range(writes):
+                store.create_session(rng.choice(user_ids), "2024-01-01 10:00:00", "00:10:00", 0.0)
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=threads) as pool:
+            list(pool.map(worker, range(threads)))
+        elapsed = time.perf_counter() - start
+        store.close()
+    return threads * writes / elapsed
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--writes', type=int, default=500, help="inserts per thread")
+    parser.add_argument('--users', type=int, default=200)
+    parser.add_argument('--shards', type=int, nargs='+', default=[1, 2, 4, 8])
+    args = parser.parse_args()
+
+    for count in args.shards:
+        rate = run(count, args.threads, args.writes, args.users)
+        print(f"shards={count:<3} writes/s={rate:,.0f}")
@@ -0,0 +1,79 @@
+"""
+Peak memory of a large /workoutHistory response, materialized vs streamed.
+
+Seeds one user with --rows sessions in an in-memory database and measures the
+tracemalloc peak of building the response the old way (fetchall, list of
+dicts, jsonify) and of reading the streamed response chunk by chunk.
+
+    python benchmarks/bench_streaming.py --rows 100000
+"""
+
+import argparse
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DATABASE', 'memory:bench_streaming')
+
+from flask import jsonify  # noqa: E402
+from main import app, startup  # noqa: E402
+from security import encode_auth_token  # noqa: E402
+from storage import get_storage  # noqa: E402
+
+
+def seed(store, rows):
+    user_id = store.create_user({'full_name': 'Bench', 'username': 'bench', 'password': 'x',
+                                 'email': 'bench@example.com', 'isActive': 1})
+    conn = store.connect_for_user(user_id)
+    conn.executemany(
+        "INSERT INTO workoutSession(date, duration, postureAccuracy, userID) VALUES (?, ?, ?, ?)",
+        ((f"2030-01-01 {i // 3600 % 24:02d}:{i // 60 % 60:02d}:{i % 60:02d}", "00:30:00", 0.87, user_id)
+         for i in range(rows))
+    )
+    conn.commit()
+    conn.close()
+    return user_id
+
+
+def measure(name, func):
+    tracemalloc.start()
+    start = time.perf_counter()
+    size = func()
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    print(f"{name:<13} peak={peak / 2 ** 20:8.2f} MiB  time={elapsed:6.2f}s  body={size / 2 ** 20:6.2f} MiB")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--rows', type=int, default=100000)
+    args = parser.parse_args()
+
+    startup(background_jobs=False)
+    with app.app_context():
+        store = get_storage()
+        user_id = seed(store, args.rows)
+        token = encode_auth_token(user_id, 'user')
+
+        def materialized():
+            rows = store.list_sessions(user_id)
+            history = [
+                {'sessionID': sid, 'date': dt, 'duration': dur, 'postureAccuracy': pa}
+                for (sid, dt, dur, pa) in rows
+            ]
+            with app.test_request_context():
+                return len(jsonify({'userID': user_id, 'workoutHistory': history}).get_data())
+
+        def streamed():
+            with app.test_client() as client:
+                res = client.get('/workoutHistory', headers={'Authorization': f'Bearer {token}'},
+                                 buffered=False)
+                size = sum(len(chunk) for chunk in res.response)
+                res.close()
+                return size
+
+        measure('materialized', materialized)
+        measure('streamed', streamed)
@@ -0,0 +1,89 @@
+"""
+Load test for posture telemetry ingestion.
+
+Starts the app on a local port against an in-memory database, opens one
+workout session per stream and pushes float32 (or text) samples as chunked
+HTTP request bodies from concurrent clients. Prints sustained samples/s.
+
+    python benchmarks/bench_telemetry.py --streams 8 --samples 2000000
+"""
+
+import argparse
+import http.client
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DATABASE', 'memory:bench_telemetry')
+
+from werkzeug.serving import make_server  # noqa: E402
+from main import app, startup  # noqa: E402
+
+
+def call(port, method, path, body=None, headers=None):
+    conn = http.client.HTTPConnection('127.0.0.1', port)
+    conn.request(method, path, body=json.dumps(body) if body is not None else None,
+                 headers=dict({'Content-Type': 'application/json'}, **(headers or {})))
+    response = conn.getresponse()
+    data = json.loads(response.read())
+    conn.close()
+    return data
+
+
+def open_session(port, index):
+    user = call(port, 'POST', '/register', {
+        'full_name': f'Bench {index}', 'username': f'bench{index}', 'password': 'Passw0rd!',
+        'email': f'bench{index}@example.com', 'gender': 'Male', 'height': 180, 'weight': 75,
+        'birth_date': '1990-01-01', 'fitness_goal': 'Strength', 'activity_level': 'High'
+    })
+    headers = {'Authorization': f"Bearer {user['token']}"}
+    session = call(port, 'POST', '/startWorkout', {'exerciseID': 1, 'duration': '00:00:00'}, headers)
+    return session['sessionID'], headers
+
+
+def stream(port, session_id, headers, samples, chunk, text):
+    values = np.random.default_rng(session_id).random(chunk, dtype=np.float32)
+    payload = ('\n'.join(f'{v:.3f}' for v in values) + '\n').encode() if text else values.tobytes()
+    content_type = 'text/plain' if text else 'application/octet-stream'
+
+    def body():
+        for _ in range(samples // chunk):
+            yield payload
+
+    conn = http.client.HTTPConnection('127.0.0.1', port)
+    conn.request('POST', f'/workoutSession/{session_id}/posture', body=body(), encode_chunked=True,
+                 headers=dict(headers, **{'Content-Type': content_type, 'Transfer-Encoding': 'chunked'}))
+    result = json.loads(conn.getresponse().read())
+    conn.close()
+    return result['received']
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--streams', type=int, default=8, help="concurrent sessions")
+    parser.add_argument('--samples', type=int, default=2_000_000, help="samples per stream")
+    parser.add_argument('--chunk', type=int, default=4096, help="samples per HTTP chunk")
+    parser.add_argument('--text', action='store_true', help="send decimal text instead of float32")
+    args = parser.parse_args()
+
+    startup(background_jobs=False)
+    server = make_server('127.0.0.1', 0, app, threaded=True)
+    port = server.server_port
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    sessions = [open_session(port, i) for i in range(args.streams)]
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.streams) as pool:
+        received = sum(pool.map(lambda s: stream(port, s[0], s[1], args.samples, args.chunk, args.text),
+                                sessions))
+    elapsed = time.perf_counter() - start
+    server.shutdown()
+
+    print(f"streams={args.streams} samples={received:,} elapsed={elapsed:.2f}s "
+          f"rate={received / elapsed:,.0f} samples/s")
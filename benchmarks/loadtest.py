@@ -0,0 +1,298 @@
+"""
+Load test for the user, exercise and auth endpoints with latency percentiles.
+
+Seeds a synthetic database (users, their workout sessions and an exercise
+catalog), serves the app on a real local HTTP server and drives every route
+of `user_bp`, `exercise_bp` and `auth_bp` in turn with `--concurrency` client
+threads. Google ID token verification is stubbed so /google-auth runs without
+network access. Prints throughput and p50/p95/p99 latency per route and can
+save the results as JSON and compare them with an earlier run:
+
+    python benchmarks/loadtest.py --users 200 --sessions 50 --exercises 500 \\
+        --concurrency 8 --requests 400 --output results.json
+    python benchmarks/loadtest.py --compare results.json
+
+With --compare the exit status is 1 if any route's p95 got slower than the
+baseline by more than --tolerance. /resetWorkoutLibrary deletes the catalog
+and only runs with --include-destructive (as the last route). Rate limiting is
+off unless RATE_LIMIT_ENABLED=1 is set.
+"""
+
+import argparse
+import http.client
+import itertools
+import json
+import os
+import platform
+import random
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+BLUEPRINTS = ('user', 'exercise', 'auth')
+DESTRUCTIVE = {'exercise.reset_workout_library'}
+PASSWORD = 'Passw0rd!'
+
+
+def stub_google_verifier(client_id):
+    """Accept ID tokens of the form 'loadtest:<n>' without calling Google."""
+    from google.oauth2 import id_token
+
+    def verify(token, request=None, audience=None, **kwargs):
+        prefix, _, number = token.partition(':')
+        if prefix != 'loadtest':
+            raise ValueError('not a load test token')
+        return {'aud': client_id, 'sub': f'google-{number}', 'email': f'google{number}@example.com',
+                'name': f'Google User {number}'}
+
+    id_token.verify_oauth2_token = verify
+
+
+def seed(app, users, sessions, exercises, rng):
+    """Fill the database and return the data the request builders draw from."""
+    from passwords import get_hasher
+    from security import encode_auth_token
+    from storage import get_storage
+
+    with app.app_context():
+        store = get_storage()
+        conn = store.connect()
+        conn.executemany(
+            "INSERT INTO exercise(name, category, targetedBodyParts, requiredEquipment, videoURL) "
+            "VALUES (?, ?, ?, ?, ?)",
+            [(f"Exercise {i}", rng.choice(['Core', 'Upper Body', 'Lower Body', 'Full Body']),
+              rng.choice(['Abs', 'Chest, Triceps', 'Quads, Glutes', 'Back']),
+              rng.choice(['None', 'Dumbbell', 'Barbell']), f"https://example.com/{i}.mp4")
+             for i in range(exercises)]
+        )
+        conn.commit()
+        exercise_ids = [row[0] for row in conn.execute("SELECT exerciseID FROM exercise")]
+        conn.close()
+
+        password = get_hasher().hash(PASSWORD)
+        start = datetime.now() - timedelta(days=90)
+        accounts = []
+        for i in range(users):
+            user_id = store.create_user({
+                'full_name': f'Load User {i}', 'username': f'load{i}', 'password': password,
+                'email': f'load{i}@example.com', 'gender': 'Other', 'height': 175.0, 'weight': 70.0,
+                'birth_date': '1990-01-01', 'fitness_goal': 'Strength', 'activity_level': 'High', 'isActive': 1
+            })
+            for _ in range(sessions):
+                date = start + timedelta(minutes=rng.randrange(90 * 24 * 60))
+                store.create_session(user_id, date.strftime('%Y-%m-%d %H:%M:%S'), '00:30:00',
+                                     round(rng.random(), 3), rng.choice(exercise_ids))
+            accounts.append({'userID': user_id, 'username': f'load{i}',
+                             'token': encode_auth_token(user_id, 'user')})
+    return {'accounts': accounts, 'exercises': exercise_ids, 'counter': itertools.count()}
+
+
+def auth(account):
+    return {'Authorization': f"Bearer {account['token']}"}
+
+
+# endpoint -> function(data, rng) returning (method, path, headers, json body or None)
+SCENARIOS = {
+    'auth.google_auth': lambda d, r: (
+        'POST', '/google-auth', {}, {'id_token': f"loadtest:{r.randrange(len(d['accounts']))}"}),
+    'user.register': lambda d, r: (
+        'POST', '/register', {}, dict(
+            full_name='New User', username=f"new{next(d['counter'])}", password=PASSWORD,
+            email=f"new{next(d['counter'])}@example.com", gender='Other', height=180, weight=80,
+            birth_date='1995-05-05', fitness_goal='Endurance', activity_level='Medium')),
+    'user.login': lambda d, r: (
+        'POST', '/login', {}, {'username': r.choice(d['accounts'])['username'], 'password': PASSWORD}),
+    'user.update_user_profile': lambda d, r: (
+        'PUT', '/updateUserProfile', auth(r.choice(d['accounts'])), {'weight': round(r.uniform(50, 100), 1)}),
+    'user.workout_history': lambda d, r: (
+        'GET', '/workoutHistory', auth(r.choice(d['accounts'])), None),
+    'user.exercise_history': lambda d, r: (
+        'GET', f"/exerciseHistory/{r.choice(d['exercises'])}", auth(r.choice(d['accounts'])), None),
+    'user.workout_stats': lambda d, r: (
+        'GET', '/workoutStats', auth(r.choice(d['accounts'])), None),
+    'user.get_user_profile': lambda d, r: (
+        'GET', '/userProfile', auth(r.choice(d['accounts'])), None),
+    'user.check_user': lambda d, r: (
+        'GET', f"/checkUser/{r.choice(d['accounts'])['userID']}", auth(r.choice(d['accounts'])), None),
+    'exercise.workout_library': lambda d, r: (
+        'GET', '/workoutLibrary', auth(r.choice(d['accounts'])), None),
+    'exercise.start_workout': lambda d, r: (
+        'POST', '/startWorkout', auth(r.choice(d['accounts'])),
+        {'exerciseID': r.choice(d['exercises']), 'duration': '00:20:00'}),
+    'exercise.popular_exercises': lambda d, r: (
+        'GET', '/exercises/popular', auth(r.choice(d['accounts'])), None),
+    'exercise.exercise_videos': lambda d, r: (
+        'GET', '/exerciseVideos', auth(r.choice(d['accounts'])), None),
+    'exercise.reset_workout_library': lambda d, r: (
+        'POST', '/resetWorkoutLibrary', auth(r.choice(d['accounts'])), None),
+}
+
+
+def percentile(latencies, p):
+    return latencies[min(len(latencies) - 1, int(len(latencies) * p / 100))]
+
+
+def run_endpoint(port, build, data, requests, concurrency, seed):
+    """Send `requests` requests from `concurrency` threads; return the route's stats."""
+    latencies, errors = [], []
+    lock = threading.Lock()
+    remaining = itertools.count()
+
+    def worker(index):
+        rng = random.Random(seed * 1000 + index)
+        conn = http.client.HTTPConnection('127.0.0.1', port, timeout=60)
+        while next(remaining) < requests:
+            method, path, headers, body = build(data, rng)
+            payload = json.dumps(body) if body is not None else None
+            if payload is not None:
+                headers = dict(headers, **{'Content-Type': 'application/json'})
+            start = time.perf_counter()
+            try:
+                conn.request(method, path, body=payload, headers=headers)
+                response = conn.getresponse()
+                response.read()
+                status = response.status
+            except (OSError, http.client.HTTPException):
+                conn.close()
+                conn = http.client.HTTPConnection('127.0.0.1', port, timeout=60)
+                status = None
+            elapsed = time.perf_counter() - start
+            with lock:
+                latencies.append(elapsed)
+                if status is None or status >= 400:
+                    errors.append(status)
+        conn.close()
+
+    start = time.perf_counter()
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    wall = time.perf_counter() - start
+
+    latencies.sort()
+    return {
+        'requests': len(latencies),
+        'errors': len(errors),
+        'throughput': round(len(latencies) / wall, 1),
+        'mean_ms': round(sum(latencies) / len(latencies) * 1000, 2),
+        'p50_ms': round(percentile(latencies, 50) * 1000, 2),
+        'p95_ms': round(percentile(latencies, 95) * 1000, 2),
+        'p99_ms': round(percentile(latencies, 99) * 1000, 2),
+        'max_ms': round(latencies[-1] * 1000, 2),
+    }
+
+
+def compare(results, baseline, tolerance):
+    """Print the p95 change per route against a baseline; return the regressed routes."""
+    regressed = []
+    print(f"\n{'route':<32}{'base p95':>10}{'p95':>10}{'change':>9}")
+    for name, stats in results['endpoints'].items():
+        base = baseline['endpoints'].get(name)
+        if not base:
+            continue
+        change = stats['p95_ms'] / base['p95_ms'] - 1 if base['p95_ms'] else 0.0
+        # ignore sub-millisecond noise
+        slower = change > tolerance and stats['p95_ms'] - base['p95_ms'] > 1
+        if slower:
+            regressed.append(name)
+        print(f"{name:<32}{base['p95_ms']:>10.2f}{stats['p95_ms']:>10.2f}{change:>+9.0%}"
+              + ("  REGRESSION" if slower else ""))
+    return regressed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--users', type=int, default=100)
+    parser.add_argument('--sessions', type=int, default=20, help="workout sessions per user")
+    parser.add_argument('--exercises', type=int, default=200)
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--requests', type=int, default=200, help="requests per route")
+    parser.add_argument('--routes', nargs='+', help="only these endpoints (e.g. user.login)")
+    parser.add_argument('--include-destructive', action='store_true')
+    parser.add_argument('--database', help="database to seed (default: a temporary file)")
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--output', help="write the results to this JSON file")
+    parser.add_argument('--compare', help="baseline JSON file to compare against")
+    parser.add_argument('--tolerance', type=float, default=0.2, help="allowed p95 slowdown (0.2 = 20%%)")
+    args = parser.parse_args()
+
+    tmp = tempfile.TemporaryDirectory()
+    os.environ['DATABASE'] = args.database or os.path.join(tmp.name, 'loadtest.db')
+    # every client thread shares one IP and would drain the per-IP login buckets at once
+    os.environ.setdefault('RATE_LIMIT_ENABLED', '0')
+
+    from werkzeug.serving import make_server, WSGIRequestHandler
+    from main import app, startup
+    import auth
+
+    class KeepAliveHandler(WSGIRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def log_request(self, *args, **kwargs):
+            pass
+
+    stub_google_verifier(auth.GOOGLE_CLIENT_ID)
+    startup(background_jobs=False)
+    rng = random.Random(args.seed)
+    start = time.perf_counter()
+    data = seed(app, args.users, args.sessions, args.exercises, rng)
+    print(f"seeded {args.users} users, {args.users * args.sessions} sessions, "
+          f"{args.exercises} exercises in {time.perf_counter() - start:.1f}s")
+
+    endpoints = sorted(rule.endpoint for rule in app.url_map.iter_rules()
+                       if rule.endpoint.split('.')[0] in BLUEPRINTS)
+    missing = [name for name in endpoints if name not in SCENARIOS]
+    if missing:
+        parser.error(f"no load scenario for {', '.join(missing)}")
+    if args.routes:
+        endpoints = [name for name in endpoints if name in args.routes]
+    endpoints = [name for name in endpoints if name not in DESTRUCTIVE]
+    if args.include_destructive:
+        endpoints += sorted(DESTRUCTIVE)
+
+    server = make_server('127.0.0.1', 0, app, threaded=True, request_handler=KeepAliveHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    results = {
+        'meta': {
+            'timestamp': datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'sqlite': sqlite3.sqlite_version,
+            'cpus': os.cpu_count(),
+            'args': {key: value for key, value in vars(args).items() if key not in ('output', 'compare')},
+        },
+        'endpoints': {}
+    }
+    print(f"\n{'route':<32}{'req/s':>9}{'p50':>9}{'p95':>9}{'p99':>9}{'errors':>8}")
+    try:
+        for index, name in enumerate(endpoints):
+            stats = run_endpoint(server.server_port, SCENARIOS[name], data,
+                                 args.requests, args.concurrency, args.seed + index)
+            results['endpoints'][name] = stats
+            print(f"{name:<32}{stats['throughput']:>9.1f}{stats['p50_ms']:>9.2f}"
+                  f"{stats['p95_ms']:>9.2f}{stats['p99_ms']:>9.2f}{stats['errors']:>8}")
+    finally:
+        server.shutdown()
+        tmp.cleanup()
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"\nresults written to {args.output}")
+    if args.compare:
+        with open(args.compare) as f:
+            regressed = compare(results, json.load(f), args.tolerance)
+        if regressed:
+            print(f"\n{len(regressed)} route(s) regressed: {', '.join(regressed)}")
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,68 @@
+"""
+In-process caches
+
+A Cache is a bounded, thread-safe dict with an optional TTL. Entries are
+dropped explicitly through `invalidate` by the write paths that change the
+underlying data; the TTL is only a safety net. Hits and misses are counted
+under `cache.<name>.*` in /metrics.
+"""
+
+import threading
+import time
+
+from metrics import metrics
+
+_caches = []
+
+
+class Cache:
+    def __init__(self, name, max_entries=1024, ttl=None):
+        self.name = name
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = {}
+        self._lock = threading.Lock()
+        _caches.append(self)
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and (self.ttl is None or entry[1] > time.monotonic()):
+                metrics.incr(f'cache.{self.name}.hits')
+                return entry[0]
+        metrics.incr(f'cache.{self.name}.misses')
+        return default
+
+    def set(self, key, value):
+        expires = time.monotonic() + self.ttl if self.ttl is not None else None
+        with self._lock:
+            self._entries.pop(key, None)
+            if len(self._entries) >= self.max_entries:
+                # evict the oldest entry (dicts keep insertion order)
+                self._entries.pop(next(iter(self._entries)))
+            self._entries[key] = (value, expires)
+        return value
+
+    def get_or_set(self, key, func):
+        value = self.get(key)
+        if value is None:
+            value = self.set(key, func())
+        return value
+
+    def invalidate(self, key=None):
+        """Drop one entry, or every entry when `key` is None."""
+        with self._lock:
+            if key is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(key, None)
+        metrics.incr(f'cache.{self.name}.invalidations')
+
+    def __len__(self):
+        return len(self._entries)
+
+
+def clear_all():
+    """Empty every cache, e.g. after the database was reset."""
+    for cache in _caches:
+        cache.invalidate()
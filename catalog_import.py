@@ -0,0 +1,191 @@
+"""
+Bulk exercise-catalog import
+
+Streams exercises from CSV (header row with the exercise column names) or
+NDJSON (one JSON object per line), validates each row and upserts them by
+name in chunked `executemany` transactions. Rows whose values did not change
+are left alone, so re-running an import is cheap. Catalog caches are
+invalidated once, after the last chunk, or after the last committed chunk
+when the input cannot be read to its end (bad UTF-8, malformed CSV): the
+import then stops with ImportAborted, whose summary names the failing line.
+
+Command line:
+
+    python catalog_import.py exercises.csv --chunk-size 1000
+
+Admins can also POST the file to /admin/exercises/import (see import_bp).
+"""
+
+import argparse
+import csv
+import io
+import json
+import os
+import re
+import time
+from flask import Blueprint, request, jsonify
+
+from metrics import metrics
+from search import invalidate_catalog
+from security import token_required, admin_required
+from storage import get_storage
+
+import_bp = Blueprint('catalog_import', __name__)
+
+REQUIRED = ('name', 'category', 'targetedBodyParts', 'requiredEquipment')
+URL_FORMAT = re.compile(r'^https?://\S+$')
+MAX_REPORTED_ERRORS = 20
+
+UPDATE_SQL = (
+    "UPDATE exercise SET category=?, targetedBodyParts=?, requiredEquipment=?, videoURL=? "
+    "WHERE name=? AND (category IS NOT ? OR targetedBodyParts IS NOT ? "
+    "OR requiredEquipment IS NOT ? OR videoURL IS NOT ?)"
+)
+INSERT_SQL = (
+    "INSERT INTO exercise(name, category, targetedBodyParts, requiredEquipment, videoURL) "
+    "SELECT ?, ?, ?, ?, ? WHERE NOT EXISTS (SELECT 1 FROM exercise WHERE name=?)"
+)
+
+
+def read_csv(lines):
+    return csv.DictReader(lines)
+
+
+def read_ndjson(lines):
+    for line in lines:
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError:
+            yield None
+            continue
+        yield row if isinstance(row, dict) else None
+
+
+READERS = {'csv': read_csv, 'ndjson': read_ndjson}
+
+
+class ImportAborted(Exception):
+    """The input could not be read any further; the rows before summary['failedLine'] were imported."""
+
+    def __init__(self, summary):
+        super().__init__(summary['error'])
+        self.summary = summary
+
+
+def validate(row):
+    """Return a normalized (name, category, targetedBodyParts, requiredEquipment, videoURL) tuple."""
+    if row is None:
+        raise ValueError('not a JSON object')
+    values = []
+    for field in REQUIRED:
+        value = str(row.get(field) or '').strip()
+        if not value:
+            raise ValueError(f'missing {field}')
+        values.append(value)
+    url = str(row.get('videoURL') or '').strip() or None
+    if url and not URL_FORMAT.match(url):
+        raise ValueError('videoURL must be an http(s) URL')
+    return tuple(values) + (url,)
+
+
+def import_catalog(storage, lines, fmt='csv', chunk_size=1000, progress=None):
+    """Upsert exercises from an iterable of text lines. Returns a summary dict."""
+    start = time.perf_counter()
+    summary = {'processed': 0, 'inserted': 0, 'updated': 0, 'invalid': 0, 'errors': []}
+    conn = storage.connect()
+    chunk = []
+
+    def flush():
+        with conn:
+            summary['updated'] += conn.executemany(
+                UPDATE_SQL, [(c, t, r, v, n, c, t, r, v) for (n, c, t, r, v) in chunk]).rowcount
+            summary['inserted'] += conn.executemany(
+                INSERT_SQL, [(n, c, t, r, v, n) for (n, c, t, r, v) in chunk]).rowcount
+        chunk.clear()
+        metrics.set_gauge('catalog_import.processed', summary['processed'])
+        if progress:
+            progress(summary['processed'], time.perf_counter() - start)
+
+    # header is line 1 for CSV
+    first_line = 2 if fmt == 'csv' else 1
+    try:
+        try:
+            for number, row in enumerate(READERS[fmt](lines), start=first_line):
+                summary['processed'] += 1
+                try:
+                    chunk.append(validate(row))
+                except ValueError as e:
+                    summary['invalid'] += 1
+                    if len(summary['errors']) < MAX_REPORTED_ERRORS:
+                        summary['errors'].append({'line': number, 'error': str(e)})
+                    continue
+                if len(chunk) >= chunk_size:
+                    flush()
+        except (UnicodeDecodeError, csv.Error) as e:
+            # the rows read so far are still imported below
+            summary['failedLine'] = first_line + summary['processed']
+            summary['error'] = f"cannot read line {summary['failedLine']}: {e}"
+        if chunk:
+            flush()
+    finally:
+        conn.close()
+        # chunks are committed one by one: whatever was written must show up
+        invalidate_catalog()
+        elapsed = time.perf_counter() - start
+        summary['seconds'] = round(elapsed, 3)
+        summary['rowsPerSecond'] = round(summary['processed'] / elapsed) if elapsed else 0
+        metrics.incr('catalog_import.rows', summary['processed'])
+
+    if 'failedLine' in summary:
+        metrics.incr('catalog_import.aborted')
+        raise ImportAborted(summary)
+    return summary
+
+
+def detect_format(name, content_type=None):
+    if content_type and 'ndjson' in content_type or (name or '').endswith(('.ndjson', '.jsonl')):
+        return 'ndjson'
+    return 'csv'
+
+
+@import_bp.route('/admin/exercises/import', methods=['POST'])
+@token_required
+@admin_required
+def import_exercises(current_user_id):
+    """Stream a CSV or NDJSON exercise catalog into the library (admins only)."""
+    fmt = request.args.get('format') or detect_format(None, request.content_type)
+    if fmt not in READERS:
+        return jsonify({'error': 'format must be csv or ndjson'}), 400
+    chunk_size = request.args.get('chunk_size', 1000, type=int)
+    lines = io.TextIOWrapper(request.stream, encoding='utf-8', newline='')
+    try:
+        summary = import_catalog(get_storage(), lines, fmt, max(chunk_size, 1))
+    except ImportAborted as e:
+        return jsonify(e.summary), 400
+    return jsonify(summary), 200
+
+
+if __name__ == '__main__':
+    from storage import create_storage
+
+    parser = argparse.ArgumentParser(description="Import an exercise catalog from CSV or NDJSON.")
+    parser.add_argument('path')
+    parser.add_argument('--database', default=os.getenv('DATABASE', 'fitness.db'))
+    parser.add_argument('--format', choices=sorted(READERS))
+    parser.add_argument('--chunk-size', type=int, default=1000)
+    args = parser.parse_args()
+
+    store = create_storage(args.database)
+    store.initialize()
+    with open(args.path, encoding='utf-8', newline='') as f:
+        try:
+            result = import_catalog(
+                store, f, args.format or detect_format(args.path), args.chunk_size,
+                progress=lambda done, secs: print(f"{done:,} rows ({done / secs:,.0f} rows/s)")
+            )
+        except ImportAborted as e:
+            raise SystemExit(json.dumps(e.summary, indent=2))
+    print(json.dumps(result, indent=2))
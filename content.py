@@ -0,0 +1,127 @@
+"""
+Content feed
+
+GET /content serves the tips and articles of the `content` table, newest
+first, optionally only those of one `type`. Pages are keyset-paginated:
+pass the returned `next` contentID back as `before`; each page is a range
+scan of the primary key, or of idx_content_type_id with a type.
+
+Every client loads the first page on launch. First pages (per type, and of
+all types) are kept in memory as the serialized JSON body together with its
+ETag, so a launch request is answered from memory, or with 304 when the
+client's copy is current, without touching SQLite. The admin write
+endpoints drop the cached pages; PAGE_TTL bounds how long another worker
+process can serve a page that changed.
+"""
+
+import hashlib
+import json
+from flask import Blueprint, current_app, request, jsonify
+
+from cache import Cache
+from security import token_required, admin_required
+from storage import get_storage
+
+content_bp = Blueprint('content', __name__)
+
+PAGE_SIZE = 20
+MAX_LIMIT = 100
+PAGE_TTL = 300
+FIELDS = ('type', 'title', 'description')
+COLUMNS = ('contentID',) + FIELDS
+
+# type (None = every type) -> (JSON body, ETag) of the first page
+pages = Cache('content_pages', max_entries=64, ttl=PAGE_TTL)
+
+
+def invalidate_content():
+    """Call after any change to the content table."""
+    pages.invalidate()
+
+
+def list_content(storage, content_type=None, before=None, limit=PAGE_SIZE):
+    rows = storage.list_content(content_type, before, limit)
+    return {
+        'content': [dict(zip(COLUMNS, row)) for row in rows],
+        'next': rows[-1][0] if len(rows) == limit else None
+    }
+
+
+def serialize(page):
+    """(body, ETag) of a page."""
+    body = json.dumps(page, separators=(',', ':')).encode('utf-8')
+    return body, hashlib.sha1(body).hexdigest()
+
+
+def first_page(storage, content_type=None):
+    return pages.get_or_set(content_type, lambda: serialize(list_content(storage, content_type)))
+
+
+def _fields(data, partial=False):
+    """The content fields of a request body; raises ValueError if one is missing or not a non-empty string."""
+    fields = {}
+    for name in FIELDS:
+        if name not in data and partial:
+            continue
+        value = data.get(name)
+        if not isinstance(value, str) or not value.strip():
+            raise ValueError(f'{name} must be a non-empty string')
+        fields[name] = value.strip()
+    if not fields:
+        raise ValueError(f"Provide at least one of {', '.join(FIELDS)}")
+    return fields
+
+
+@content_bp.route('/content', methods=['GET'])
+@token_required
+def get_content(current_user_id):
+    content_type = request.args.get('type') or None
+    limit = request.args.get('limit', PAGE_SIZE, type=int)
+    if not 1 <= limit <= MAX_LIMIT:
+        return jsonify({'error': f'limit must be between 1 and {MAX_LIMIT}'}), 400
+    before = request.args.get('before', type=int)
+    if before is None and limit == PAGE_SIZE:
+        body, etag = first_page(get_storage(), content_type)
+    else:
+        body, etag = serialize(list_content(get_storage(), content_type, before, limit))
+    response = current_app.response_class(body, mimetype='application/json')
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response.make_conditional(request)
+
+
+@content_bp.route('/admin/content', methods=['POST'])
+@token_required
+@admin_required
+def create_content(current_user_id):
+    try:
+        fields = _fields(request.json or {})
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    content_id = get_storage().create_content(fields)
+    invalidate_content()
+    return jsonify(dict(fields, contentID=content_id)), 201
+
+
+@content_bp.route('/admin/content/<int:content_id>', methods=['PUT'])
+@token_required
+@admin_required
+def update_content(current_user_id, content_id):
+    try:
+        fields = _fields(request.json or {}, partial=True)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    if not get_storage().update_content(content_id, fields):
+        return jsonify({'error': 'Content not found'}), 404
+    invalidate_content()
+    return jsonify({'message': 'Content updated'}), 200
+
+
+@content_bp.route('/admin/content/<int:content_id>', methods=['DELETE'])
+@token_required
+@admin_required
+def delete_content(current_user_id, content_id):
+    if not get_storage().delete_content(content_id):
+        return jsonify({'error': 'Content not found'}), 404
+    invalidate_content()
+    return jsonify({'message': 'Content deleted'}), 200
@@ -1,12 +1,26 @@
+import argparse
+import os
 import sqlite3
 import re
-import pandas as pd
+
+
+# Next value of the sync change sequence: one more than the last, but never behind the
+# current time in milliseconds
+NEXT_SEQ = "seq = MAX(seq + 1, CAST((julianday('now') - 2440587.5) * 86400000 AS INTEGER))"
+
+
+def connect(dbname):
+    """Open a connection to `dbname`, which may be a file path or a `file:` URI."""
+    return sqlite3.connect(dbname, uri=True)
 
 
 def createDB(dbname):
-    conn = sqlite3.connect(dbname)
+    conn = connect(dbname)
     c = conn.cursor()
 
+    # Let the maintenance job give freed pages back to the OS (only takes effect on a new file)
+    c.execute("PRAGMA auto_vacuum = INCREMENTAL")
+
     # Drop old profile table to recreate merged schema
     c.execute("DROP TABLE IF EXISTS createProfile")
 
@@ -64,12 +78,15 @@ def createDB(dbname):
     columns = [col[1] for col in cursor.fetchall()]
     if 'role' not in columns:
         cursor.execute("ALTER TABLE user ADD COLUMN role TEXT DEFAULT 'user'")
+    if 'google_id' not in columns:
+        cursor.execute("ALTER TABLE user ADD COLUMN google_id TEXT")
 
     # Content table
     c.execute("CREATE TABLE IF NOT EXISTS content(contentID INTEGER PRIMARY KEY, "
               "type TEXT NOT NULL, "
               "description TEXT NOT NULL, "
               "title TEXT NOT NULL)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_content_type_id ON content(type, contentID)")
 
     # Exercise table
     c.execute("CREATE TABLE IF NOT EXISTS exercise("
@@ -79,6 +96,33 @@ def createDB(dbname):
         "targetedBodyParts TEXT NOT NULL, "
         "requiredEquipment TEXT NOT NULL, "
         "videoURL TEXT)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_exercise_name ON exercise(name)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_exercise_category ON exercise(category)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_exercise_equipment ON exercise(requiredEquipment)")
+
+    # Full-text index over the exercise library, kept in sync by triggers
+    c.execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name='exerciseSearch'")
+    search_exists = c.fetchone()
+    c.execute("CREATE VIRTUAL TABLE IF NOT EXISTS exerciseSearch USING fts5("
+              "name, category, targetedBodyParts, requiredEquipment, "
+              "content='exercise', content_rowid='exerciseID')")
+    c.execute("CREATE TRIGGER IF NOT EXISTS exercise_search_insert AFTER INSERT ON exercise BEGIN "
+              "INSERT INTO exerciseSearch(rowid, name, category, targetedBodyParts, requiredEquipment) "
+              "VALUES (new.exerciseID, new.name, new.category, new.targetedBodyParts, new.requiredEquipment); "
+              "END")
+    c.execute("CREATE TRIGGER IF NOT EXISTS exercise_search_delete AFTER DELETE ON exercise BEGIN "
+              "INSERT INTO exerciseSearch(exerciseSearch, rowid, name, category, targetedBodyParts, requiredEquipment) "
+              "VALUES ('delete', old.exerciseID, old.name, old.category, old.targetedBodyParts, old.requiredEquipment); "
+              "END")
+    c.execute("CREATE TRIGGER IF NOT EXISTS exercise_search_update AFTER UPDATE ON exercise BEGIN "
+              "INSERT INTO exerciseSearch(exerciseSearch, rowid, name, category, targetedBodyParts, requiredEquipment) "
+              "VALUES ('delete', old.exerciseID, old.name, old.category, old.targetedBodyParts, old.requiredEquipment); "
+              "INSERT INTO exerciseSearch(rowid, name, category, targetedBodyParts, requiredEquipment) "
+              "VALUES (new.exerciseID, new.name, new.category, new.targetedBodyParts, new.requiredEquipment); "
+              "END")
+    if not search_exists:
+        # index exercises that predate the search table
+        c.execute("INSERT INTO exerciseSearch(exerciseSearch) VALUES ('rebuild')")
 
     # Workout Session table
     c.execute("CREATE TABLE IF NOT EXISTS workoutSession(sessionID INTEGER PRIMARY KEY, "
@@ -87,6 +131,118 @@ def createDB(dbname):
               "postureAccuracy DOUBLE NOT NULL, "
               "userID INTEGER NOT NULL, "
               "FOREIGN KEY(userID) REFERENCES user(userID))")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_workoutSession_user_date ON workoutSession(userID, date)")
+    c.execute("PRAGMA table_info(workoutSession)")
+    session_columns = [col[1] for col in c.fetchall()]
+    if 'exerciseID' not in session_columns:
+        c.execute("ALTER TABLE workoutSession ADD COLUMN exerciseID INTEGER")
+    # set when the posture telemetry of the session was closed
+    if 'closedAt' not in session_columns:
+        c.execute("ALTER TABLE workoutSession ADD COLUMN closedAt DATETIME")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_workoutSession_user_exercise_date "
+              "ON workoutSession(userID, exerciseID, date)")
+
+    # Sessions started per exercise and week ('YYYY-WW'), counted when a session is created
+    c.execute("CREATE TABLE IF NOT EXISTS exercisePopularity(week TEXT NOT NULL, "
+              "exerciseID INTEGER NOT NULL, "
+              "sessionCount INTEGER NOT NULL, "
+              "PRIMARY KEY(week, exerciseID))")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_exercisePopularity_week_count "
+              "ON exercisePopularity(week, sessionCount)")
+
+    # Change sequence for delta sync: every insert or update of a session stamps it with the next
+    # value of syncState.seq, deletes leave a tombstone. The sequence follows the wall clock in
+    # milliseconds, so tokens stay comparable when a user moves to another shard.
+    c.execute("CREATE TABLE IF NOT EXISTS syncState(id INTEGER PRIMARY KEY CHECK (id = 0), "
+              "seq INTEGER NOT NULL, "
+              "purgedSeq INTEGER NOT NULL DEFAULT 0)")
+    c.execute("INSERT OR IGNORE INTO syncState(id, seq) VALUES (0, 0)")
+    c.execute("CREATE TABLE IF NOT EXISTS workoutTombstone(sessionID INTEGER PRIMARY KEY, "
+              "userID INTEGER NOT NULL, "
+              "changeSeq INTEGER NOT NULL)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_workoutTombstone_user_seq ON workoutTombstone(userID, changeSeq)")
+    c.execute("PRAGMA table_info(workoutSession)")
+    if 'changeSeq' not in [col[1] for col in c.fetchall()]:
+        c.execute("ALTER TABLE workoutSession ADD COLUMN changeSeq INTEGER")
+        c.execute(f"UPDATE syncState SET {NEXT_SEQ}")
+        c.execute("SELECT seq FROM syncState")
+        base = c.fetchone()[0]
+        c.execute("SELECT sessionID FROM workoutSession ORDER BY sessionID")
+        rows = [(base + number, sid) for number, (sid,) in enumerate(c.fetchall())]
+        c.executemany("UPDATE workoutSession SET changeSeq=? WHERE sessionID=?", rows)
+        c.execute("UPDATE syncState SET seq=?", (base + len(rows),))
+    c.execute("CREATE INDEX IF NOT EXISTS idx_workoutSession_user_seq ON workoutSession(userID, changeSeq)")
+    c.execute("CREATE TRIGGER IF NOT EXISTS workout_session_insert AFTER INSERT ON workoutSession BEGIN "
+              f"UPDATE syncState SET {NEXT_SEQ}; "
+              "UPDATE workoutSession SET changeSeq = (SELECT seq FROM syncState) WHERE sessionID = new.sessionID; "
+              "DELETE FROM workoutTombstone WHERE sessionID = new.sessionID; "
+              "END")
+    c.execute("CREATE TRIGGER IF NOT EXISTS workout_session_update "
+              "AFTER UPDATE OF date, duration, postureAccuracy, userID ON workoutSession BEGIN "
+              f"UPDATE syncState SET {NEXT_SEQ}; "
+              "UPDATE workoutSession SET changeSeq = (SELECT seq FROM syncState) WHERE sessionID = new.sessionID; "
+              "END")
+    c.execute("CREATE TRIGGER IF NOT EXISTS workout_session_delete AFTER DELETE ON workoutSession BEGIN "
+              f"UPDATE syncState SET {NEXT_SEQ}; "
+              "INSERT OR REPLACE INTO workoutTombstone(sessionID, userID, changeSeq) "
+              "VALUES (old.sessionID, old.userID, (SELECT seq FROM syncState)); "
+              "END")
+
+    # Archived workout sessions: one compressed segment per user and month
+    c.execute("CREATE TABLE IF NOT EXISTS workoutArchive(userID INTEGER NOT NULL, "
+              "month TEXT NOT NULL, "
+              "sessionCount INTEGER NOT NULL, "
+              "totalDuration DOUBLE NOT NULL, "
+              "postureAccuracySum DOUBLE NOT NULL, "
+              "data BLOB NOT NULL, "
+              "PRIMARY KEY(userID, month), "
+              "FOREIGN KEY(userID) REFERENCES user(userID))")
+
+    # Refresh tokens, stored as SHA-256 hashes; rotated tokens share a familyID
+    c.execute("CREATE TABLE IF NOT EXISTS refreshToken(tokenHash TEXT PRIMARY KEY, "
+              "userID INTEGER NOT NULL, "
+              "familyID TEXT NOT NULL, "
+              "expiresAt DATETIME NOT NULL, "
+              "revokedAt DATETIME)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_refreshToken_family ON refreshToken(familyID)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_refreshToken_user ON refreshToken(userID)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_refreshToken_expires ON refreshToken(expiresAt)")
+
+    # Responses of requests sent with an Idempotency-Key; status is NULL while the first one runs
+    c.execute("CREATE TABLE IF NOT EXISTS idempotencyKey(scope TEXT PRIMARY KEY, "
+              "fingerprint TEXT NOT NULL, "
+              "status INTEGER, "
+              "body BLOB, "
+              "mimetype TEXT, "
+              "expiresAt DATETIME NOT NULL)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_idempotencyKey_expires ON idempotencyKey(expiresAt)")
+
+    # Profile picture thumbnails per size, generated in the background from user.profilepic
+    c.execute("CREATE TABLE IF NOT EXISTS profileThumbnail(userID INTEGER NOT NULL, "
+              "size TEXT NOT NULL, "
+              "sourceHash TEXT NOT NULL, "
+              "image BLOB NOT NULL, "
+              "PRIMARY KEY(userID, size), "
+              "FOREIGN KEY(userID) REFERENCES user(userID))")
+
+    # Weekly leaderboard scores ('YYYY-WW' as in exercisePopularity), kept up to date by the
+    # session write path; avgAccuracy only counts sessions with a posture score
+    c.execute("CREATE TABLE IF NOT EXISTS leaderboardScore(week TEXT NOT NULL, "
+              "userID INTEGER NOT NULL, "
+              "totalDuration INTEGER NOT NULL DEFAULT 0, "
+              "accuracySum REAL NOT NULL DEFAULT 0, "
+              "scoredSessions INTEGER NOT NULL DEFAULT 0, "
+              "avgAccuracy REAL, "
+              "PRIMARY KEY(week, userID))")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_leaderboardScore_duration "
+              "ON leaderboardScore(week, totalDuration DESC)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_leaderboardScore_accuracy "
+              "ON leaderboardScore(week, avgAccuracy DESC)")
+
+    # Partly drained rate limit buckets ('<route> <client>'), saved so limits survive restarts
+    c.execute("CREATE TABLE IF NOT EXISTS rateLimitBucket(bucket TEXT PRIMARY KEY, "
+              "tokens REAL NOT NULL, "
+              "updatedAt REAL NOT NULL)")
 
     # Issue Form table
     c.execute("CREATE TABLE IF NOT EXISTS issueForm(issueID INTEGER PRIMARY KEY, "
@@ -96,13 +252,19 @@ def createDB(dbname):
               "adminID INTEGER NOT NULL, "
               "FOREIGN KEY(userID) REFERENCES user(userID), "
               "FOREIGN KEY(adminID) REFERENCES admin(adminID))")
+    # Issue queue pages (see issues.py); adminID 0 = unassigned
+    c.execute("CREATE INDEX IF NOT EXISTS idx_issueForm_status_issue ON issueForm(status, issueID)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_issueForm_admin_status ON issueForm(adminID, status)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_issueForm_user_issue ON issueForm(userID, issueID)")
 
     conn.commit()
     conn.close()
 
 
 def view_data_with_pandas(dbname):
-    conn = sqlite3.connect(dbname)
+    import pandas as pd
+
+    conn = connect(dbname)
     df = pd.read_sql_query(
         "SELECT userID, full_name, username, password, role, email FROM user", conn
     )
@@ -113,14 +275,22 @@ def view_data_with_pandas(dbname):
 
 
 def reset_database(dbname):
-    conn = sqlite3.connect(dbname)
+    conn = connect(dbname)
     c = conn.cursor()
     try:
         tables = [
             "user",
+            "profileThumbnail",
             "content",
             "exercise",
             "workoutSession",
+            "workoutTombstone",
+            "workoutArchive",
+            "exercisePopularity",
+            "leaderboardScore",
+            "refreshToken",
+            "idempotencyKey",
+            "rateLimitBucket",
             "issueForm"
         ]
         c.execute("PRAGMA foreign_keys = OFF;")
@@ -136,7 +306,7 @@ def reset_database(dbname):
 
 def register(dbname, fullname=None, username=None, password=None, email=None,
              google_register=False):
-    conn = sqlite3.connect(dbname)
+    conn = connect(dbname)
     c = conn.cursor()
     if google_register:
         # For Google registration only email and password are needed
@@ -186,7 +356,7 @@ def register(dbname, fullname=None, username=None, password=None, email=None,
 
 
 def login(dbname, username, password):
-    conn = sqlite3.connect(dbname)
+    conn = connect(dbname)
     c = conn.cursor()
     try:
         c.execute("SELECT password FROM user WHERE username = ?", (username,))
@@ -206,7 +376,7 @@ def login(dbname, username, password):
 
 # Updating user profile details
 def updateUserprofile(dbname, userID):
-    conn = sqlite3.connect(dbname)
+    conn = connect(dbname)
     c = conn.cursor()
     try:
         c.execute("SELECT * FROM user WHERE userID = ?", (userID,))
@@ -334,7 +504,7 @@ def updateUserprofile(dbname, userID):
 
 
 def workoutHistory(dbname, userID):
-    conn = sqlite3.connect(dbname)
+    conn = connect(dbname)
     c = conn.cursor()
     try:
         c.execute("SELECT * FROM user WHERE userID = ?", (userID,))
@@ -358,7 +528,7 @@ def workoutHistory(dbname, userID):
 
 
 def accessWorkoutLibrary(dbname):
-    conn = sqlite3.connect(dbname)
+    conn = connect(dbname)
     c = conn.cursor()
     try:
         c.execute("SELECT * FROM exercise")
@@ -382,7 +552,7 @@ def accessWorkoutLibrary(dbname):
 
 
 def insert_exercise_sets(dbname):
-    conn = sqlite3.connect(dbname)
+    conn = connect(dbname)
     c = conn.cursor()
     exercises = [
         ("Planks", "Core", "Abdominals, Back", "None"),
@@ -403,7 +573,7 @@ def insert_exercise_sets(dbname):
 def initialize_database(dbname='fitness.db'):
     createDB(dbname)
 
-    conn = sqlite3.connect(dbname)
+    conn = connect(dbname)
     c = conn.cursor()
     c.execute("SELECT COUNT(*) FROM exercise")
     exercise_count = c.fetchone()[0]
@@ -417,5 +587,21 @@ def initialize_database(dbname='fitness.db'):
 
 
 if __name__ == '__main__':
-    initialize_database()
+    from storage import create_storage
+
+    parser = argparse.ArgumentParser(description="Create the database schema and seed the default exercises.")
+    parser.add_argument('--database', default=os.getenv('DATABASE', 'fitness.db'))
+    parser.add_argument('--shards', type=int, default=int(os.getenv('DATABASE_SHARDS', 0)))
+    parser.add_argument('--grant-admin', metavar='USERNAME', help="make an existing user an admin")
+    parser.add_argument('--revoke-admin', metavar='USERNAME', help="make an admin a regular user again")
+    args = parser.parse_args()
+
+    store = create_storage(args.database, args.shards)
+    store.initialize()
     print("Database initialized successfully.")
+    for username, role in ((args.grant_admin, 'admin'), (args.revoke_admin, 'user')):
+        if username:
+            if not store.set_role(username, role):
+                raise SystemExit(f"No user named {username!r}")
+            # tokens carry the role: it takes effect on the user's next login or refresh
+            print(f"{username} is now {role}.")
@@ -0,0 +1,217 @@
+"""
+Server-Sent Events change feed
+
+GET /events keeps a text/event-stream open and pushes the changes of the
+signed-in user as they happen, so dashboards and companion devices no longer
+poll /workoutHistory and /userProfile:
+
+    id: 42
+    event: session.created
+    data: {"sessionID": 7, "exerciseID": 1}
+
+Write paths publish to an in-process EventBus (`bus`) after their commit.
+Event types are `session.created`, `session.updated` and `profile.updated`;
+the payload only names what changed, clients fetch the rows themselves (e.g.
+through /workoutHistory/changes).
+
+The bus keeps the last REPLAY_SIZE events of each user, so a client that
+reconnects with a Last-Event-ID header receives what it missed. When the
+events it missed are no longer retained it gets a `reset` event and should
+reload its data. A comment line is sent every EVENTS_HEARTBEAT seconds to
+keep proxies from closing idle streams.
+
+Each open stream holds one worker thread, so serve the app with a threaded or
+gevent worker when many clients subscribe. Idle subscribers themselves are
+cheap, a few hundred bytes each.
+"""
+
+import itertools
+import json
+import threading
+import time
+from collections import OrderedDict, deque
+
+from flask import Blueprint, Response, request, jsonify, current_app
+
+from metrics import metrics
+from security import token_required
+
+events_bp = Blueprint('events', __name__)
+
+# Events retained per user for Last-Event-ID replay
+REPLAY_SIZE = 64
+# Users whose replay buffer is kept (least recently published dropped first)
+MAX_REPLAY_USERS = 10000
+# Undelivered events a subscriber may hold before it is told to reset
+QUEUE_SIZE = 64
+
+
+class Subscriber:
+    """One open event stream of a user.
+
+    Idle subscribers are kept small: the queue is created on the first event
+    and the wake-up signal is a bare lock that is held while nothing is
+    pending (push runs under the bus lock, so only one thread releases it).
+    """
+
+    __slots__ = ('user_id', 'queue', 'lagged', 'ready')
+
+    def __init__(self, user_id):
+        self.user_id = user_id
+        self.queue = None
+        self.lagged = False
+        self.ready = threading.Lock()
+        self.ready.acquire()
+
+    def push(self, event):
+        if self.queue is None:
+            self.queue = deque()
+        if len(self.queue) >= QUEUE_SIZE:
+            # the client is not keeping up: drop the backlog and make it reload
+            self.queue.clear()
+            self.lagged = True
+        else:
+            self.queue.append(event)
+        if self.ready.locked():
+            self.ready.release()
+
+    def wait(self, timeout):
+        """Return the pending events, waiting up to `timeout` seconds for one."""
+        if self.queue or self.lagged:
+            self.ready.acquire(blocking=False)
+        else:
+            self.ready.acquire(timeout=timeout)
+        events = []
+        while self.queue:
+            events.append(self.queue.popleft())
+        return events
+
+
+class EventBus:
+    def __init__(self, replay_size=REPLAY_SIZE, max_replay_users=MAX_REPLAY_USERS):
+        self.replay_size = replay_size
+        self.max_replay_users = max_replay_users
+        # ids follow the clock so that they keep increasing across restarts
+        first_id = int(time.time() * 1000)
+        self._ids = itertools.count(first_id)
+        # events up to this id may have been lost (earlier process, evicted replay buffers)
+        self._lost = first_id - 1
+        self._subscribers = {}
+        self._open = 0
+        # user_id -> [deque of (id, type, data), id of the last event dropped from it]
+        self._replay = OrderedDict()
+        self._lock = threading.Lock()
+
+    def publish(self, user_id, event_type, data):
+        """Deliver an event to every open stream of a user. Returns the event id."""
+        with self._lock:
+            event = (next(self._ids), event_type, json.dumps(data))
+            entry = self._replay.pop(user_id, None)
+            if entry is None:
+                if len(self._replay) >= self.max_replay_users:
+                    _, (oldest, _) = self._replay.popitem(last=False)
+                    self._lost = max(self._lost, oldest[-1][0])
+                entry = [deque(maxlen=self.replay_size), self._lost]
+            ring = entry[0]
+            if len(ring) == ring.maxlen:
+                entry[1] = ring[0][0]
+            ring.append(event)
+            self._replay[user_id] = entry
+            for subscriber in self._subscribers.get(user_id, ()):
+                subscriber.push(event)
+        metrics.incr('events.published')
+        return event[0]
+
+    def subscribe(self, user_id, last_event_id=None):
+        """Open a stream. Returns (subscriber, missed events, complete).
+
+        `complete` is False when some events after `last_event_id` are no
+        longer retained and the client has to reload instead.
+        """
+        subscriber = Subscriber(user_id)
+        with self._lock:
+            self._subscribers.setdefault(user_id, set()).add(subscriber)
+            self._open += 1
+            missed, complete = [], True
+            if last_event_id is not None:
+                ring, dropped = self._replay.get(user_id, ((), self._lost))
+                missed = [event for event in ring if event[0] > last_event_id]
+                complete = last_event_id >= dropped
+            count = self._open
+        metrics.set_gauge('events.subscribers', count)
+        return subscriber, missed, complete
+
+    def unsubscribe(self, subscriber):
+        with self._lock:
+            subscribers = self._subscribers.get(subscriber.user_id)
+            if subscribers is not None and subscriber in subscribers:
+                subscribers.discard(subscriber)
+                self._open -= 1
+                if not subscribers:
+                    del self._subscribers[subscriber.user_id]
+            count = self._open
+        metrics.set_gauge('events.subscribers', count)
+
+    def subscriber_count(self):
+        return self._open
+
+    def clear(self):
+        with self._lock:
+            self._subscribers.clear()
+            self._replay.clear()
+            self._open = 0
+
+
+bus = EventBus()
+
+
+def publish(user_id, event_type, **data):
+    return bus.publish(user_id, event_type, data)
+
+
+def format_event(event):
+    event_id, event_type, data = event
+    return f"id: {event_id}\nevent: {event_type}\ndata: {data}\n\n"
+
+
+def stream(subscriber, missed, complete, heartbeat):
+    """Yield the SSE text of a subscription until the client disconnects."""
+    try:
+        yield f"retry: {int(heartbeat * 1000)}\n\n"
+        if not complete:
+            yield "event: reset\ndata: {}\n\n"
+        for event in missed:
+            yield format_event(event)
+        while True:
+            events = subscriber.wait(heartbeat)
+            if subscriber.lagged:
+                subscriber.lagged = False
+                yield "event: reset\ndata: {}\n\n"
+            elif not events:
+                yield ": keep-alive\n\n"
+            for event in events:
+                yield format_event(event)
+    finally:
+        bus.unsubscribe(subscriber)
+
+
+@events_bp.route('/events', methods=['GET'])
+@token_required
+def events(current_user_id):
+    """Stream the current user's change events (text/event-stream)."""
+    last_event_id = request.headers.get('Last-Event-ID') or request.args.get('lastEventId')
+    try:
+        last_event_id = int(last_event_id) if last_event_id else None
+    except ValueError:
+        return jsonify({'error': 'Last-Event-ID must be an event id'}), 400
+
+    if bus.subscriber_count() >= current_app.config.get('EVENTS_MAX_SUBSCRIBERS', 10000):
+        return jsonify({'error': 'Too many open event streams'}), 503, {'Retry-After': '5'}
+
+    subscriber, missed, complete = bus.subscribe(current_user_id, last_event_id)
+    heartbeat = current_app.config.get('EVENTS_HEARTBEAT', 15)
+    return Response(
+        stream(subscriber, missed, complete, heartbeat),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
@@ -0,0 +1,217 @@
+"""
+Idempotency keys
+
+Clients on flaky networks retry POST requests. When such a request carries an
+`Idempotency-Key` header, the first response for that key is stored and every
+retry gets the same response back (with `Idempotent-Replayed: true`) instead
+of executing the write again. A retry that arrives while the first request is
+still running waits for it rather than racing it.
+
+Responses are kept in memory (a bounded Cache) and in the `idempotencyKey`
+table of the main database, so they survive restarts and are shared between
+worker processes. A key is claimed with a pending row before the request runs;
+another process seeing that row answers 409 with Retry-After. Keys are scoped
+per endpoint and user (per client IP address for anonymous requests), expire
+after IDEMPOTENCY_TTL seconds and may not be reused with a different body
+(422). Responses with a 5xx status are not stored, so those requests can be
+retried.
+
+Credentials (CREDENTIAL_FIELDS) are removed from a JSON body before it is
+stored. Endpoints that hand out tokens pass `reissue`, which mints fresh ones
+for a replay, so a replay never returns a token that may have been rotated
+or revoked since. `reissue` returns None when the account no longer allows
+that (deactivated, password or role changed); the replay is then answered
+with 409 and no credentials.
+"""
+
+import hashlib
+import json
+import threading
+from datetime import datetime, timedelta
+from functools import wraps
+from flask import request, jsonify, current_app
+
+from cache import Cache
+from metrics import metrics
+from ratelimit import client_key
+from storage import get_storage
+
+HEADER = 'Idempotency-Key'
+MAX_KEY_LENGTH = 255
+DATE_FORMAT = '%Y-%m-%d %H:%M:%S'
+# How long a claim may stay pending before another request may take it over
+CLAIM_TIMEOUT = 60
+# Fields of a JSON response that are never stored for replay
+CREDENTIAL_FIELDS = ('token', 'refreshToken')
+
+
+class Pending:
+    """A request holding a key in this process; duplicates wait on `done`."""
+
+    def __init__(self, fingerprint):
+        self.fingerprint = fingerprint
+        # set once the key is claimed in the database, i.e. the request is running
+        self.claimed = False
+        self.done = threading.Event()
+
+
+class IdempotencyStore:
+    def __init__(self, ttl=86400, max_entries=10000):
+        self.ttl = ttl
+        self.responses = Cache('idempotency', max_entries=max_entries, ttl=ttl)
+        self._pending = {}
+        self._lock = threading.Lock()
+
+    def begin(self, storage, scope, fingerprint, wait=10):
+        """Claim a key or find its response.
+
+        Returns ('claimed', None), ('replay', (status, body, mimetype)),
+        ('mismatch', None) or ('busy', None).
+
+        `_lock` only guards the dict of keys held in this process: the
+        database lookup runs outside it, so requests with other keys never
+        wait for it. Between processes the conditional INSERT of the claim
+        decides.
+        """
+        while True:
+            with self._lock:
+                pending = self._pending.get(scope)
+                if pending is None:
+                    pending = self._pending[scope] = Pending(fingerprint)
+                    break
+            if pending.claimed and pending.fingerprint != fingerprint:
+                return 'mismatch', None
+            # a duplicate of a request in this process: wait for its lookup or its response
+            metrics.incr('idempotency.waits')
+            if not pending.done.wait(wait):
+                return 'busy', None
+
+        try:
+            state = self._lookup(storage, scope, fingerprint)
+        except BaseException:
+            self._release(scope)
+            raise
+        if state[0] == 'claimed':
+            pending.claimed = True
+        else:
+            self._release(scope)
+        return state
+
+    def _lookup(self, storage, scope, fingerprint):
+        record = self.responses.get(scope)
+        now = datetime.utcnow()
+        if record is None:
+            stamp = now.strftime(DATE_FORMAT)
+            row = storage.get_idempotency_key(scope)
+            if row is None or row[4] <= stamp:
+                expires = (now + timedelta(seconds=CLAIM_TIMEOUT)).strftime(DATE_FORMAT)
+                if storage.claim_idempotency_key(scope, fingerprint, expires, stamp):
+                    return 'claimed', None
+                return 'busy', None
+            if row[1] is None:
+                # claimed by another worker process that has not finished yet
+                return ('busy' if row[0] == fingerprint else 'mismatch'), None
+            record = self.responses.set(scope, tuple(row[:4]))
+        if record[0] != fingerprint:
+            return 'mismatch', None
+        return 'replay', record[1:]
+
+    def finish(self, storage, scope, response):
+        """Store the response of a claimed key and wake up waiting duplicates."""
+        status, body, mimetype = response.status_code, redact(response), response.mimetype
+        pending = self._pending[scope]
+        expires = (datetime.utcnow() + timedelta(seconds=self.ttl)).strftime(DATE_FORMAT)
+        storage.save_idempotent_response(scope, status, body, mimetype, expires)
+        self.responses.set(scope, (pending.fingerprint, status, body, mimetype))
+        self._release(scope)
+
+    def abort(self, storage, scope):
+        """Give up a claimed key (the request failed), letting a retry run it again."""
+        storage.release_idempotency_key(scope)
+        self._release(scope)
+
+    def _release(self, scope):
+        with self._lock:
+            pending = self._pending.pop(scope)
+        pending.done.set()
+
+
+def redact(response):
+    """The body of a response to store, without any CREDENTIAL_FIELDS."""
+    data = response.get_json(silent=True) if response.is_json else None
+    if not isinstance(data, dict) or not any(field in data for field in CREDENTIAL_FIELDS):
+        return response.get_data()
+    data = {name: value for name, value in data.items() if name not in CREDENTIAL_FIELDS}
+    return json.dumps(data).encode('utf-8')
+
+
+def purge_idempotency_keys(storage, now=None):
+    """Delete expired keys. Returns the number of rows removed."""
+    return storage.purge_idempotency_keys((now or datetime.utcnow()).strftime(DATE_FORMAT))
+
+
+def fingerprint_request():
+    return hashlib.sha256(request.method.encode() + b' ' + request.get_data()).hexdigest()
+
+
+def idempotent(f=None, reissue=None):
+    """Replay the stored response of requests that repeat an Idempotency-Key.
+
+    Place below @token_required so that keys are scoped per user. Views that
+    return credentials use @idempotent(reissue=func): func(stored body) returns
+    the fresh credential fields merged into a replayed 2xx response, or None
+    to refuse them.
+    """
+    if f is None:
+        return lambda view: idempotent(view, reissue)
+
+    @wraps(f)
+    def decorated(*args, **kwargs):
+        key = request.headers.get(HEADER)
+        if not key:
+            return f(*args, **kwargs)
+        if len(key) > MAX_KEY_LENGTH:
+            return jsonify({'error': f'{HEADER} must be at most {MAX_KEY_LENGTH} characters'}), 400
+
+        user = args[0] if args else client_key()
+        scope = f"{request.endpoint}:{user}:{key}"
+        store = current_app.extensions['idempotency']
+        storage = get_storage()
+        state, record = store.begin(storage, scope, fingerprint_request(),
+                                    current_app.config.get('IDEMPOTENCY_WAIT', 10))
+        if state == 'replay':
+            metrics.incr('idempotency.replays')
+            status, body, mimetype = record
+            if reissue is not None and 200 <= status < 300:
+                data = json.loads(body)
+                credentials = reissue(data)
+                if credentials is None:
+                    metrics.incr('idempotency.reissue_refused')
+                    return jsonify({'error': 'Already completed and the account has changed since; '
+                                             'sign in instead'}), 409
+                body = json.dumps(dict(data, **credentials))
+            return current_app.response_class(body, status=status, mimetype=mimetype,
+                                              headers={'Idempotent-Replayed': 'true'})
+        if state == 'mismatch':
+            return jsonify({'error': f'{HEADER} was already used with a different request'}), 422
+        if state == 'busy':
+            return jsonify({'error': 'A request with this key is still in progress'}), 409, {'Retry-After': '1'}
+
+        try:
+            response = current_app.make_response(f(*args, **kwargs))
+        except BaseException:
+            store.abort(storage, scope)
+            raise
+        if response.status_code >= 500:
+            store.abort(storage, scope)
+        else:
+            store.finish(storage, scope, response)
+        return response
+    return decorated
+
+
+def init_app(app):
+    app.extensions['idempotency'] = IdempotencyStore(
+        ttl=app.config.get('IDEMPOTENCY_TTL', 86400),
+        max_entries=app.config.get('IDEMPOTENCY_MAX_KEYS', 10000)
+    )
@@ -0,0 +1,146 @@
+"""
+Issue queue
+
+Users report problems with POST /issues; admins triage them in a queue on
+the `issueForm` table. An issue moves through STATUSES along TRANSITIONS.
+`adminID` is NOT NULL, so 0 marks an unassigned issue; taking an issue into
+progress assigns it to the admin doing so.
+
+Pages use keyset pagination: pass the returned `next` issueID back as
+`after` (or `before` for a user's own issues). Each page is one range scan
+of an index, whatever the queue length:
+
+- status queue:    idx_issueForm_status_issue (status, issueID)
+- per assignee:    idx_issueForm_admin_status (adminID, status); the issueID
+                   rowid is the implicit last column, so pages come in order
+- a user's issues: idx_issueForm_user_issue (userID, issueID)
+
+PATCH /admin/issues changes the status of many issues in one UPDATE; issues
+whose current status cannot make that transition are left alone and
+reported as skipped. Reporters get an `issue.updated` event.
+"""
+
+from flask import Blueprint, request, jsonify
+
+import events
+from security import token_required, admin_required
+from storage import get_storage
+
+issues_bp = Blueprint('issues', __name__)
+
+STATUSES = ('open', 'in_progress', 'resolved', 'closed')
+# target status -> statuses it can be reached from
+TRANSITIONS = {
+    'open': ('in_progress', 'resolved'),
+    'in_progress': ('open',),
+    'resolved': ('open', 'in_progress'),
+    'closed': ('open', 'in_progress', 'resolved'),
+}
+UNASSIGNED = 0
+MAX_DESCRIPTION = 5000
+MAX_PAGE = 100
+MAX_BULK = 500
+COLUMNS = ('issueID', 'description', 'status', 'userID', 'adminID')
+
+
+def _limit():
+    limit = request.args.get('limit', 20, type=int)
+    if not 1 <= limit <= MAX_PAGE:
+        raise ValueError(f'limit must be between 1 and {MAX_PAGE}')
+    return limit
+
+
+def _page(rows, limit):
+    return {
+        'issues': [dict(zip(COLUMNS, row)) for row in rows],
+        'next': rows[-1][0] if len(rows) == limit else None
+    }
+
+
+def list_queue(storage, status, assignee=None, after=0, limit=20):
+    """Issues of one status, oldest first, optionally only those of one admin (0 = unassigned)."""
+    return storage.list_issues(status, assignee, after, limit)
+
+
+def transition(storage, issue_ids, status, admin_id):
+    """Move issues to `status` in one statement. Returns [(issueID, userID)] of the issues that moved."""
+    # taking an issue into progress assigns it; reopening it puts it back in the shared queue
+    return storage.set_issue_status(
+        issue_ids, status, TRANSITIONS[status],
+        assign=UNASSIGNED if status == 'open' else None,
+        take=admin_id if status == 'in_progress' else None
+    )
+
+
+@issues_bp.route('/issues', methods=['POST'])
+@token_required
+def submit_issue(current_user_id):
+    description = ((request.json or {}).get('description') or '').strip()
+    if not description:
+        return jsonify({'error': 'description is required'}), 400
+    if len(description) > MAX_DESCRIPTION:
+        return jsonify({'error': f'description must be at most {MAX_DESCRIPTION} characters'}), 400
+    issue_id = get_storage().create_issue(description, current_user_id, UNASSIGNED)
+    return jsonify({'issueID': issue_id, 'status': 'open'}), 201
+
+
+@issues_bp.route('/issues', methods=['GET'])
+@token_required
+def my_issues(current_user_id):
+    """The caller's issues, newest first. Pass `next` back as ?before= for the next page."""
+    try:
+        limit = _limit()
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    rows = get_storage().list_user_issues(current_user_id, request.args.get('before', type=int), limit)
+    return jsonify(_page(rows, limit)), 200
+
+
+@issues_bp.route('/admin/issues', methods=['GET'])
+@token_required
+@admin_required
+def issue_queue(current_user_id):
+    """Issues of a status (default open), oldest first; `assignee` is me, unassigned or an adminID."""
+    status = request.args.get('status', 'open')
+    if status not in STATUSES:
+        return jsonify({'error': f"status must be one of {', '.join(STATUSES)}"}), 400
+    assignee = request.args.get('assignee')
+    if assignee == 'me':
+        assignee = current_user_id
+    elif assignee == 'unassigned':
+        assignee = UNASSIGNED
+    elif assignee is not None:
+        if not assignee.isdigit():
+            return jsonify({'error': 'assignee must be me, unassigned or an adminID'}), 400
+        assignee = int(assignee)
+    try:
+        limit = _limit()
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    rows = list_queue(get_storage(), status, assignee, request.args.get('after', 0, type=int), limit)
+    return jsonify(dict(_page(rows, limit), status=status)), 200
+
+
+@issues_bp.route('/admin/issues', methods=['PATCH'])
+@token_required
+@admin_required
+def update_issues(current_user_id):
+    """Move up to MAX_BULK issues to a new status: {"issueIDs": [...], "status": "resolved"}."""
+    data = request.json or {}
+    status = data.get('status')
+    issue_ids = data.get('issueIDs')
+    if status not in TRANSITIONS:
+        return jsonify({'error': f"status must be one of {', '.join(STATUSES)}"}), 400
+    if (not isinstance(issue_ids, list) or not issue_ids or len(issue_ids) > MAX_BULK
+            or not all(isinstance(i, int) and not isinstance(i, bool) for i in issue_ids)):
+        return jsonify({'error': f'issueIDs must be a list of 1 to {MAX_BULK} integers'}), 400
+
+    moved = transition(get_storage(), sorted(set(issue_ids)), status, current_user_id)
+    for issue_id, user_id in moved:
+        events.publish(user_id, 'issue.updated', issueID=issue_id, status=status)
+    updated = sorted(issue_id for issue_id, _ in moved)
+    return jsonify({
+        'status': status,
+        'updated': updated,
+        'skipped': sorted(set(issue_ids) - set(updated))
+    }), 200
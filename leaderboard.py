@@ -0,0 +1,220 @@
+"""
+Weekly leaderboards
+
+Two boards per week ('YYYY-WW', weeks starting on Monday):
+
+- duration: total workout time of the week in seconds
+- accuracy: mean postureAccuracy of the week's sessions that have a posture
+  score, for users with at least MIN_SCORED_SESSIONS of them
+
+Scores are never computed from workoutSession on a request. The session
+write path (/startWorkout and closing a telemetry session) applies the change
+to the user's row in `leaderboardScore` with one upsert. Each board is read
+from that table once along its index into a sorted in-memory list; later
+writes in this process update it in place, and writes committed while a board
+is being read are applied to it before it is cached. Top N is a slice and "my
+rank" a bisect, O(log n). Boards are re-read after BOARD_TTL seconds to pick
+up writes of other worker processes.
+
+An hourly job notices when a new week starts: it recomputes the finished
+week from workoutSession (catching deleted sessions and any missed writes),
+drops weeks older than LEADERBOARD_KEEP_WEEKS and clears the boards.
+"""
+
+import bisect
+import threading
+from datetime import datetime, timedelta
+from flask import Blueprint, request, jsonify
+
+from cache import Cache
+from security import token_required
+from storage import get_storage
+
+leaderboard_bp = Blueprint('leaderboard', __name__)
+
+METRICS = ('duration', 'accuracy')
+MAX_LIMIT = 100
+MIN_SCORED_SESSIONS = 3
+BOARD_TTL = 300
+WEEK_FORMAT = '%Y-%W'
+DATE_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+# (week, metric) -> Board
+boards = Cache('leaderboards', max_entries=16, ttl=BOARD_TTL)
+# week -> one list per board of that week being read, collecting (userID, scores) written meanwhile
+_loading = {}
+_loading_lock = threading.Lock()
+_current_week = None
+
+
+def parse_duration(value):
+    """Seconds of an 'HH:MM:SS' (or 'MM:SS', or plain seconds) duration; 0 if unreadable."""
+    try:
+        seconds = 0
+        for part in str(value or 0).split(':'):
+            seconds = seconds * 60 + float(part)
+        return max(int(seconds), 0)
+    except ValueError:
+        return 0
+
+
+class Board:
+    """Scores of one week and metric, sorted best first."""
+
+    def __init__(self, rows):
+        self.scores = dict(rows)
+        # (-score, userID) ascending = best first, ties by userID
+        self.keys = sorted((-score, user_id) for user_id, score in self.scores.items())
+        self._lock = threading.Lock()
+
+    def update(self, user_id, score):
+        """Set a user's score; None removes the user from the board."""
+        with self._lock:
+            old = self.scores.pop(user_id, None)
+            if old is not None:
+                del self.keys[bisect.bisect_left(self.keys, (-old, user_id))]
+            if score is not None:
+                self.scores[user_id] = score
+                bisect.insort(self.keys, (-score, user_id))
+
+    def top(self, limit):
+        """[(rank, userID, score)] of the best `limit` users; equal scores share a rank."""
+        with self._lock:
+            entries = self.keys[:limit]
+            return [(bisect.bisect_left(self.keys, (key[0],)) + 1, key[1], -key[0]) for key in entries]
+
+    def rank(self, user_id):
+        """(rank, score) of a user, or None if the user is not on the board."""
+        with self._lock:
+            score = self.scores.get(user_id)
+            if score is None:
+                return None
+            return bisect.bisect_left(self.keys, (-score,)) + 1, score
+
+    def __len__(self):
+        return len(self.keys)
+
+
+def board_score(metric, total_duration, avg_accuracy, scored_sessions):
+    if metric == 'duration':
+        return total_duration if total_duration > 0 else None
+    return avg_accuracy if scored_sessions >= MIN_SCORED_SESSIONS else None
+
+
+def get_board(storage, week, metric):
+    board = boards.get((week, metric))
+    if board is not None:
+        return board
+    writes = []
+    with _loading_lock:
+        _loading.setdefault(week, []).append(writes)
+    board = None
+    try:
+        if metric == 'duration':
+            rows = storage.leaderboard_durations(week)
+        else:
+            rows = storage.leaderboard_accuracies(week, MIN_SCORED_SESSIONS)
+        board = Board(rows)
+    finally:
+        with _loading_lock:
+            _loading[week].remove(writes)
+            if not _loading[week]:
+                del _loading[week]
+            if board is not None:
+                # the rows may predate these writes; their scores are absolute, so re-applying is harmless
+                for user_id, scores in writes:
+                    board.update(user_id, board_score(metric, *scores))
+                boards.set((week, metric), board)
+    return board
+
+
+def record_session(storage, user_id, date, duration, accuracy, previous=None):
+    """Apply a new session, or an update of one from `previous` = (duration, postureAccuracy), to its week.
+
+    Only sessions with a postureAccuracy above 0 count towards the accuracy board.
+    """
+    old_duration, old_accuracy = previous or (0, 0.0)
+    old_accuracy = old_accuracy or 0.0
+    accuracy = accuracy or 0.0
+    duration_delta = parse_duration(duration) - parse_duration(old_duration)
+    accuracy_delta = (accuracy if accuracy > 0 else 0.0) - (old_accuracy if old_accuracy > 0 else 0.0)
+    scored_delta = (accuracy > 0) - (old_accuracy > 0)
+    if not (duration_delta or accuracy_delta or scored_delta):
+        return
+    week, total_duration, avg_accuracy, scored = storage.add_leaderboard_score(
+        date, user_id, duration_delta, accuracy_delta, scored_delta
+    )
+    with _loading_lock:
+        for writes in _loading.get(week, ()):
+            writes.append((user_id, (total_duration, avg_accuracy, scored)))
+        for metric in METRICS:
+            board = boards.get((week, metric))
+            if board is not None:
+                board.update(user_id, board_score(metric, total_duration, avg_accuracy, scored))
+
+
+def rebuild_weeks(storage, start, end):
+    """Recompute the scores of the weeks covered by [start, end) (datetimes) from workoutSession.
+
+    Returns the number of user rows written.
+    """
+    scores = {}
+    for partition in storage.partitions():
+        for week, user_id, duration, accuracy in partition.iter_sessions_between(
+                start.strftime(DATE_FORMAT), end.strftime(DATE_FORMAT)):
+            row = scores.setdefault((week, user_id), [0, 0.0, 0])
+            row[0] += parse_duration(duration)
+            if accuracy and accuracy > 0:
+                row[1] += accuracy
+                row[2] += 1
+    # a week crossing New Year is split into two, e.g. 2025-52 and 2026-00
+    weeks = {start.strftime(WEEK_FORMAT), (end - timedelta(seconds=1)).strftime(WEEK_FORMAT)}
+    storage.replace_leaderboard_weeks(weeks, scores)
+    return len(scores)
+
+
+def rollover(storage, keep_weeks, now=None):
+    """Finish the previous week once a new one has started. Returns the new week, or None if unchanged."""
+    global _current_week
+    now = now or datetime.now()
+    week = now.strftime(WEEK_FORMAT)
+    if week == _current_week:
+        return None
+    monday = datetime(now.year, now.month, now.day) - timedelta(days=now.weekday())
+    # the finished week (the one before on the first run) gets its exact standings
+    rebuild_weeks(storage, monday - timedelta(weeks=1), monday)
+    oldest = (monday - timedelta(weeks=keep_weeks)).strftime(WEEK_FORMAT)
+    storage.purge_leaderboard_weeks(oldest)
+    boards.invalidate()
+    _current_week = week
+    return week
+
+
+@leaderboard_bp.route('/leaderboard', methods=['GET'])
+@token_required
+def get_leaderboard(current_user_id):
+    metric = request.args.get('metric', 'duration')
+    if metric not in METRICS:
+        return jsonify({'error': f"metric must be one of {', '.join(METRICS)}"}), 400
+    week = request.args.get('week') or datetime.now().strftime(WEEK_FORMAT)
+    try:
+        datetime.strptime(week + '-1', '%Y-%W-%w')
+    except ValueError:
+        return jsonify({'error': 'week must be YYYY-WW'}), 400
+    limit = request.args.get('limit', 10, type=int)
+    if not 1 <= limit <= MAX_LIMIT:
+        return jsonify({'error': f'limit must be between 1 and {MAX_LIMIT}'}), 400
+
+    store = get_storage()
+    board = get_board(store, week, metric)
+    top = board.top(limit)
+    names = store.usernames(user_id for _, user_id, _ in top)
+    mine = board.rank(current_user_id)
+    return jsonify({
+        'week': week,
+        'metric': metric,
+        'participants': len(board),
+        'entries': [{'rank': rank, 'userID': user_id, 'username': names.get(user_id), 'score': score}
+                    for rank, user_id, score in top],
+        'me': {'rank': mine[0], 'score': mine[1]} if mine else None
+    }), 200
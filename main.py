@@ -1,30 +1,166 @@
+import itertools
 import os
-import sqlite3
-import hashlib
 from datetime import datetime
 from flask import Flask, request, jsonify, Blueprint
 from flask_swagger_ui import get_swaggerui_blueprint
 
-from db import initialize_database
+import storage
+import archive
+import telemetry
+import metrics
+import maintenance
+import passwords
+import tokens
+import sync
+import events
+import idempotency
+import profiling
+import admission
+import ratelimit
+import thumbnails
+import recommendations
+import leaderboard
+from storage import get_storage
+from passwords import get_hasher
+from scheduler import Scheduler
 from auth import auth_bp
+from telemetry import telemetry_bp
+from tokens import tokens_bp, issue_refresh_token
+from search import search_bp, invalidate_catalog
+from catalog_import import import_bp
+from sync import sync_bp
+from events import events_bp
+from thumbnails import thumbnails_bp
+from recommendations import recommendations_bp
+from leaderboard import leaderboard_bp
+from issues import issues_bp
+from content import content_bp
 from security import encode_auth_token, token_required
+from streaming import stream_json
+from idempotency import idempotent
 
 # --------------------------------------------------
 # App Initialization
 # --------------------------------------------------
 app = Flask(__name__)
 app.config['SECRET_KEY'] = os.getenv('SECRET_KEY', 'your_secret_key_here')
-
-# Initialize database once
-with app.app_context():
-    initialize_database('fitness.db')
+app.config['DATABASE'] = os.getenv('DATABASE', 'fitness.db')
+app.config['DATABASE_SHARDS'] = int(os.getenv('DATABASE_SHARDS', '0'))
+app.config['ARCHIVE_HORIZON_DAYS'] = int(os.getenv('ARCHIVE_HORIZON_DAYS', '180'))
+app.config['ARCHIVE_INTERVAL'] = int(os.getenv('ARCHIVE_INTERVAL', '3600'))
+app.config['TELEMETRY_IDLE_TIMEOUT'] = int(os.getenv('TELEMETRY_IDLE_TIMEOUT', '900'))
+# Maintenance intervals in seconds (0 disables a task)
+app.config['MAINTENANCE_OPTIMIZE_INTERVAL'] = int(os.getenv('MAINTENANCE_OPTIMIZE_INTERVAL', '3600'))
+app.config['MAINTENANCE_ANALYZE_INTERVAL'] = int(os.getenv('MAINTENANCE_ANALYZE_INTERVAL', '86400'))
+app.config['MAINTENANCE_VACUUM_INTERVAL'] = int(os.getenv('MAINTENANCE_VACUUM_INTERVAL', '3600'))
+app.config['MAINTENANCE_CHECKPOINT_INTERVAL'] = int(os.getenv('MAINTENANCE_CHECKPOINT_INTERVAL', '300'))
+app.config['MAINTENANCE_MAX_INFLIGHT'] = int(os.getenv('MAINTENANCE_MAX_INFLIGHT', '4'))
+# Password hashing pool: scrypt cost, worker threads and how many hashes may queue before 503s
+app.config['PASSWORD_SCRYPT_N'] = int(os.getenv('PASSWORD_SCRYPT_N', str(2 ** 14)))
+app.config['PASSWORD_HASH_WORKERS'] = int(os.getenv('PASSWORD_HASH_WORKERS', str(os.cpu_count() or 4)))
+app.config['PASSWORD_HASH_QUEUE'] = int(os.getenv('PASSWORD_HASH_QUEUE', '64'))
+# Token lifetimes in seconds
+app.config['ACCESS_TOKEN_TTL'] = int(os.getenv('ACCESS_TOKEN_TTL', '900'))
+app.config['REFRESH_TOKEN_TTL'] = int(os.getenv('REFRESH_TOKEN_TTL', str(30 * 86400)))
+# Days a deleted session is remembered for delta sync; older sync tokens get a full resync
+app.config['SYNC_TOMBSTONE_DAYS'] = int(os.getenv('SYNC_TOMBSTONE_DAYS', '30'))
+# Server-Sent Events: seconds between keep-alive comments, and the cap on open streams
+app.config['EVENTS_HEARTBEAT'] = int(os.getenv('EVENTS_HEARTBEAT', '15'))
+app.config['EVENTS_MAX_SUBSCRIBERS'] = int(os.getenv('EVENTS_MAX_SUBSCRIBERS', '10000'))
+# Idempotency-Key responses: seconds they are kept, and how long a retry waits for the original
+app.config['IDEMPOTENCY_TTL'] = int(os.getenv('IDEMPOTENCY_TTL', '86400'))
+app.config['IDEMPOTENCY_WAIT'] = int(os.getenv('IDEMPOTENCY_WAIT', '10'))
+# Request profiling: header secret and/or sample rate (both off by default), output ring
+app.config['PROFILE_TOKEN'] = os.getenv('PROFILE_TOKEN')
+app.config['PROFILE_SAMPLE_RATE'] = float(os.getenv('PROFILE_SAMPLE_RATE', '0'))
+app.config['PROFILE_DIR'] = os.getenv('PROFILE_DIR', 'profiles')
+app.config['PROFILE_KEEP'] = int(os.getenv('PROFILE_KEEP', '50'))
+# Secret that lets a metrics scraper read /metrics without an admin token (unset = admins only)
+app.config['METRICS_TOKEN'] = os.getenv('METRICS_TOKEN')
+# Admission control: per-pool limits ('pool=concurrency:queue,...'), route to pool overrides and queue wait
+app.config['ADMISSION_LIMITS'] = os.getenv('ADMISSION_LIMITS', '')
+app.config['ADMISSION_ROUTES'] = os.getenv('ADMISSION_ROUTES', '')
+app.config['ADMISSION_TIMEOUT'] = float(os.getenv('ADMISSION_TIMEOUT', '5'))
+# Rate limiting: per-route token buckets ('route=capacity/period,...'), in-memory bucket cap
+# and seconds between snapshots to the database (0 disables them)
+app.config['RATE_LIMIT_ENABLED'] = os.getenv('RATE_LIMIT_ENABLED', '1') == '1'
+app.config['RATE_LIMITS'] = os.getenv('RATE_LIMITS', '')
+app.config['RATE_LIMIT_MAX_KEYS'] = int(os.getenv('RATE_LIMIT_MAX_KEYS', '100000'))
+app.config['RATE_LIMIT_SNAPSHOT_INTERVAL'] = int(os.getenv('RATE_LIMIT_SNAPSHOT_INTERVAL', '60'))
+# Background threads scaling uploaded profile pictures into thumbnails
+app.config['THUMBNAIL_WORKERS'] = int(os.getenv('THUMBNAIL_WORKERS', '1'))
+# Weeks of leaderboard scores kept after the weekly rollover
+app.config['LEADERBOARD_KEEP_WEEKS'] = int(os.getenv('LEADERBOARD_KEEP_WEEKS', '12'))
+
+# Background jobs, started by startup()
+scheduler = Scheduler()
+scheduler.add_job(
+    'archive_sessions',
+    lambda: archive.archive_sessions(app.extensions['storage'], app.config['ARCHIVE_HORIZON_DAYS']),
+    app.config['ARCHIVE_INTERVAL']
+)
+scheduler.add_job(
+    'close_idle_telemetry',
+    lambda: telemetry.close_idle_sessions(app.extensions['storage'], app.config['TELEMETRY_IDLE_TIMEOUT']),
+    60
+)
+scheduler.add_job(
+    'purge_refresh_tokens',
+    lambda: tokens.purge_refresh_tokens(app.extensions['storage']),
+    86400
+)
+scheduler.add_job(
+    'purge_idempotency_keys',
+    lambda: idempotency.purge_idempotency_keys(app.extensions['storage']),
+    3600
+)
+scheduler.add_job(
+    'leaderboard_rollover',
+    lambda: leaderboard.rollover(app.extensions['storage'], app.config['LEADERBOARD_KEEP_WEEKS']),
+    3600
+)
+scheduler.add_job(
+    'purge_sync_tombstones',
+    lambda: sync.purge_tombstones(app.extensions['storage'], app.config['SYNC_TOMBSTONE_DAYS']),
+    86400
+)
+if app.config['RATE_LIMIT_ENABLED'] and app.config['RATE_LIMIT_SNAPSHOT_INTERVAL'] > 0:
+    scheduler.add_job(
+        'snapshot_rate_limits',
+        lambda: app.extensions['ratelimit'].snapshot(app.extensions['storage']),
+        app.config['RATE_LIMIT_SNAPSHOT_INTERVAL']
+    )
+maintenance.schedule(scheduler, lambda: app.extensions['storage'], app.config)
 
 # --------------------------------------------------
 # User Blueprint
 # --------------------------------------------------
 user_bp = Blueprint('user', __name__)
 
+def issue_tokens(user_id, role):
+    """Access token, its lifetime and a new refresh token for a signed-in user."""
+    return {
+        'token': encode_auth_token(user_id, role),
+        'expiresIn': app.config['ACCESS_TOKEN_TTL'],
+        'refreshToken': issue_refresh_token(get_storage(), user_id)
+    }
+
+def reissue_registration(body):
+    """Fresh tokens for a replayed registration, or None once the account changed since.
+
+    The replayed request carries the original password, which must still match:
+    after a password change, a deactivation or a new role the old request no
+    longer signs anyone in.
+    """
+    user = get_storage().find_user(userID=body['userID'])
+    if not user or not user['isActive'] or user['role'] != 'user':
+        return None
+    matches, _ = get_hasher().verify(str((request.json or {}).get('password', '')), user['password'])
+    return issue_tokens(body['userID'], 'user') if matches else None
+
 @user_bp.route('/register', methods=['POST'])
+# a replayed registration gets fresh tokens: stored responses never keep them
+@idempotent(reissue=reissue_registration)
 def register():
     """Register a new user with both account and profile info, and issue a JWT."""
     data = request.json or {}
@@ -40,11 +176,11 @@ def register():
             'error': f'Missing required fields: {missing}'
         }), 400
 
+    # a client-supplied `role` is ignored: admins are only made with `python db.py --grant-admin`
     full_name     = data['full_name']
     username      = data['username']
     raw_password  = data['password']
     email         = data['email']
-    role          = data.get('role', 'user')
     gender        = data['gender']
     try:
         height    = float(data['height'])
@@ -66,46 +202,34 @@ def register():
         except Exception:
             return jsonify({'error': 'Invalid base64 for profilepic'}), 400
 
-    hashed_password = hashlib.md5(raw_password.encode('utf-8')).hexdigest()
-
-    conn = sqlite3.connect('fitness.db')
-    c    = conn.cursor()
+    store = get_storage()
 
-    # uniqueness checks
-    c.execute("SELECT 1 FROM user WHERE username=?", (username,))
-    if c.fetchone():
-        conn.close()
+    # uniqueness checks, before paying for the password hash
+    if store.username_exists(username):
         return jsonify({'error': 'Username already exists'}), 400
 
-    c.execute("SELECT 1 FROM user WHERE email=?", (email,))
-    if c.fetchone():
-        conn.close()
+    if store.email_exists(email):
         return jsonify({'error': 'Email already registered'}), 400
 
+    hashed_password = get_hasher().hash(raw_password)
+
     # insert everything in one shot
-    c.execute("""
-        INSERT INTO user
-          (full_name, username, password, role, email,
-           gender, height, weight, profilepic,
-           birth_date, fitness_goal, activity_level,
-           isActive)
-        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, 1)
-    """, (
-        full_name, username, hashed_password, role, email,
-        gender, height, weight, profilepic,
-        birth_date, fitness_goal, activity_level
-    ))
-    conn.commit()
-    user_id = c.lastrowid
-    conn.close()
+    user_id = store.create_user({
+        'full_name': full_name, 'username': username, 'password': hashed_password,
+        'role': 'user', 'email': email,
+        'gender': gender, 'height': height, 'weight': weight, 'profilepic': profilepic,
+        'birth_date': birth_date, 'fitness_goal': fitness_goal, 'activity_level': activity_level,
+        'isActive': 1
+    })
+
+    if profilepic:
+        thumbnails.schedule(user_id)
 
     # Issue JWT
-    token = encode_auth_token(user_id, role)
-    return jsonify({
+    return jsonify(dict({
         'message':   'User registered successfully',
-        'userID':    user_id,
-        'token':     token
-    }), 201
+        'userID':    user_id
+    }, **issue_tokens(user_id, 'user'))), 201
 
 @user_bp.route('/login', methods=['POST'])
 def login():
@@ -116,26 +240,29 @@ def login():
     if not username or not password:
         return jsonify({'error': 'username and password are required'}), 400
 
-    conn = sqlite3.connect('fitness.db')
-    c = conn.cursor()
-    c.execute("SELECT password, role, isActive, userID FROM user WHERE username=?", (username,))
-    row = c.fetchone()
-    conn.close()
+    row = get_storage().get_login(username)
 
     if not row:
         return jsonify({'error': 'Username not found'}), 404
 
     stored_hash, role, is_active, user_id = row
-    if hashlib.md5(password.encode('utf-8')).hexdigest() != stored_hash:
+    hasher = get_hasher()
+    matches, needs_rehash = hasher.verify(password, stored_hash)
+    if not matches:
         return jsonify({'error': 'Incorrect password'}), 401
     if not is_active:
         return jsonify({'error': 'Account inactive'}), 403
+    if needs_rehash:
+        # upgrade legacy MD5 (or outdated scrypt parameters) now that we know the password
+        get_storage().update_user(user_id, {'password': hasher.hash(password)})
 
     token = encode_auth_token(user_id, role)
     return jsonify({
         'message': f'Welcome, {username}!',
         'userID': user_id,
-        'token': token
+        'token': token,
+        'expiresIn': app.config['ACCESS_TOKEN_TTL'],
+        'refreshToken': issue_refresh_token(get_storage(), user_id)
     }), 200
 
 
@@ -152,9 +279,8 @@ def update_user_profile(current_user_id):
         'birth_date': str, 'fitness_goal': str, 'activity_level': str,
         'isActive': bool
     }
-    updates, params = [], []
-    conn = sqlite3.connect('fitness.db')
-    c = conn.cursor()
+    updates = {}
+    store = get_storage()
 
     # Process each field
     for field, typ in allowed.items():
@@ -168,73 +294,98 @@ def update_user_profile(current_user_id):
                         raise ValueError
                     val = fv
                 except:
-                    conn.close()
                     return jsonify({'error': f'{field} must be a positive number'}), 400
             elif typ is bool:
                 if not isinstance(val, bool):
-                    conn.close()
                     return jsonify({'error': 'isActive must be boolean'}), 400
                 val = 1 if val else 0
             elif field == 'password':
-                val = hashlib.md5(val.encode('utf-8')).hexdigest()
+                val = get_hasher().hash(val)
 
-            updates.append(f"{field} = ?")
-            params.append(val)
+            updates[field] = val
 
     if not updates:
-        conn.close()
         return jsonify({'error': 'No valid fields to update'}), 400
 
     # Uniqueness checks
-    if 'username' in data:
-        c.execute("SELECT 1 FROM user WHERE username=? AND userID!=?", (data['username'], current_user_id))
-        if c.fetchone():
-            conn.close()
-            return jsonify({'error': 'Username taken'}), 400
-    if 'email' in data:
-        c.execute("SELECT 1 FROM user WHERE email=? AND userID!=?", (data['email'], current_user_id))
-        if c.fetchone():
-            conn.close()
-            return jsonify({'error': 'Email in use'}), 400
+    if 'username' in data and store.username_exists(data['username'], exclude_user_id=current_user_id):
+        return jsonify({'error': 'Username taken'}), 400
+    if 'email' in data and store.email_exists(data['email'], exclude_user_id=current_user_id):
+        return jsonify({'error': 'Email in use'}), 400
 
     # Execute update
-    sql = f"UPDATE user SET {', '.join(updates)} WHERE userID=?"
-    c.execute(sql, params + [current_user_id])
-    conn.commit()
-    conn.close()
+    store.update_user(current_user_id, updates)
+    if 'password' in updates:
+        # a stolen refresh token must not outlive the old password
+        tokens.revoke_user_tokens(store, current_user_id)
+    if 'profilepic' in updates:
+        thumbnails.schedule(current_user_id)
+    recommendations.invalidate_user(current_user_id)
+    events.publish(current_user_id, 'profile.updated', fields=sorted(set(updates) - {'password'}))
     return jsonify({'message': 'Profile updated successfully'}), 200
 
 
 @user_bp.route('/workoutHistory', methods=['GET'])
 @token_required
 def workout_history(current_user_id):
-    conn = sqlite3.connect('fitness.db')
-    c = conn.cursor()
-    c.execute(
-        "SELECT sessionID, date, duration, postureAccuracy FROM workoutSession WHERE userID=?",
-        (current_user_id,)
+    """List sessions, optionally limited to ?since=YYYY-MM-DD (inclusive) and ?until=YYYY-MM-DD (exclusive)."""
+    since = request.args.get('since')
+    until = request.args.get('until')
+    for value in (since, until):
+        if value:
+            try:
+                datetime.strptime(value, '%Y-%m-%d')
+            except ValueError:
+                return jsonify({'error': 'since and until must be dates in YYYY-MM-DD format'}), 400
+
+    store = get_storage()
+    rows = store.iter_sessions(current_user_id, since, until)
+    # archived months are only read when the requested range reaches them
+    if archive.reaches_archive(since, app.config['ARCHIVE_HORIZON_DAYS']):
+        rows = itertools.chain(archive.iter_archived_sessions(store, current_user_id, since, until), rows)
+    history = (
+        {'sessionID': sid, 'date': dt, 'duration': dur, 'postureAccuracy': pa}
+        for (sid, dt, dur, pa) in rows
     )
-    rows = c.fetchall()
-    conn.close()
-    history = [
+    return stream_json('workoutHistory', history, {'userID': current_user_id})
+
+@user_bp.route('/exerciseHistory/<int:exercise_id>', methods=['GET'])
+@token_required
+def exercise_history(current_user_id, exercise_id):
+    """Latest sessions of one exercise, newest first. Pass the fields of `next` back as query
+    parameters (?before=<date>&beforeID=<sessionID>) for the next page."""
+    before = request.args.get('before')
+    before_id = request.args.get('beforeID', type=int)
+    try:
+        limit = int(request.args.get('limit', 10))
+        if not 1 <= limit <= 100:
+            raise ValueError
+    except ValueError:
+        return jsonify({'error': 'limit must be between 1 and 100'}), 400
+
+    rows = get_storage().list_exercise_sessions(current_user_id, exercise_id, before, limit, before_id)
+    sessions = [
         {'sessionID': sid, 'date': dt, 'duration': dur, 'postureAccuracy': pa}
         for (sid, dt, dur, pa) in rows
     ]
-    return jsonify({'userID': current_user_id, 'workoutHistory': history}), 200
+    return jsonify({
+        'userID': current_user_id,
+        'exerciseID': exercise_id,
+        'sessions': sessions,
+        'next': {'before': rows[-1][1], 'beforeID': rows[-1][0]} if len(rows) == limit else None
+    }), 200
+
+@user_bp.route('/workoutStats', methods=['GET'])
+@token_required
+def workout_stats(current_user_id):
+    """Totals over the whole workout history, archived months included."""
+    stats = archive.workout_stats(get_storage(), current_user_id)
+    return jsonify(dict(stats, userID=current_user_id)), 200
 
 @user_bp.route('/userProfile', methods=['GET'])
 @token_required
 def get_user_profile(current_user_id):
-    conn = sqlite3.connect('fitness.db')
-    c = conn.cursor()
-    c.execute(
-        "SELECT full_name, username, email, gender, height, weight, profilepic,"
-        " birth_date, fitness_goal, activity_level, isActive, role"
-        " FROM user WHERE userID=?",
-        (current_user_id,)
-    )
-    row = c.fetchone()
-    conn.close()
+    row = get_storage().get_profile(current_user_id)
     if not row:
         return jsonify({'error': 'User not found'}), 404
 
@@ -243,6 +394,7 @@ def get_user_profile(current_user_id):
         'profilepic', 'birth_date', 'fitness_goal', 'activity_level', 'isActive', 'role'
     ]
     profile = dict(zip(keys, row), userID=current_user_id)
+    profile['profilePicThumbnails'] = thumbnails.thumbnail_urls(current_user_id, profile['profilepic'])
     return jsonify(profile), 200
 
 
@@ -250,16 +402,12 @@ def get_user_profile(current_user_id):
 @token_required
 def check_user(current_user_id, user_id):
 
-    conn = sqlite3.connect('fitness.db')
-    c = conn.cursor()
-    c.execute("SELECT isActive FROM user WHERE userID = ?", (user_id,))
-    row = c.fetchone()
-    conn.close()
+    is_active = get_storage().get_user_active(user_id)
 
-    if not row:
+    if is_active is None:
         return jsonify({'exists': False, 'active': False}), 200
 
-    return jsonify({'exists': True, 'active': bool(row[0])}), 200
+    return jsonify({'exists': True, 'active': bool(is_active)}), 200
 
 
 # --------------------------------------------------
@@ -270,34 +418,29 @@ exercise_bp = Blueprint('exercise', __name__)
 @exercise_bp.route('/workoutLibrary', methods=['GET'])
 @token_required
 def workout_library(current_user_id):
-    conn = sqlite3.connect('fitness.db')
-    c = conn.cursor()
-    c.execute("SELECT exerciseID, name, category, targetedBodyParts, requiredEquipment, videoURL FROM exercise")
-    rows = c.fetchall()
-    conn.close()
-    exercises = [
+    rows = get_storage().iter_exercises()
+    exercises = (
         {
             'exerciseID': eid, 'name': name, 'category': cat,
             'targetedBodyParts': tb, 'requiredEquipment': req, 'videoURL': url
         }
         for (eid, name, cat, tb, req, url) in rows
-    ]
-    return jsonify({'exercises': exercises}), 200
+    )
+    return stream_json('exercises', exercises)
 
 @exercise_bp.route('/resetWorkoutLibrary', methods=['POST'])
 @token_required
 
 #will be DELETE endpoint
 def reset_workout_library(current_user_id):
-    conn = sqlite3.connect('fitness.db')
-    c = conn.cursor()
-    c.execute("DELETE FROM exercise")
-    conn.commit()
-    conn.close()
+    get_storage().clear_exercises()
+    invalidate_catalog()
+    scheduler.wake('maintenance.vacuum')
     return jsonify({'message': 'Workout library reset'}), 200
 
 @exercise_bp.route('/startWorkout', methods=['POST'])
 @token_required
+@idempotent
 def start_workout(current_user_id):
     """Start a new workout session for an exercise."""
     data = request.json or {}
@@ -306,43 +449,53 @@ def start_workout(current_user_id):
     if not all([exercise_id, duration]):
         return jsonify({'error': 'exerciseID and duration are required'}), 400
 
-    conn = sqlite3.connect('fitness.db')
-    c = conn.cursor()
+    store = get_storage()
     # Check account active
-    c.execute("SELECT isActive FROM user WHERE userID=?", (current_user_id,))
-    status = c.fetchone()
-    if not status or not status[0]:
-        conn.close()
+    if not store.get_user_active(current_user_id):
         return jsonify({'error': 'Account inactive or user not found'}), 403
     # Check exercise exists
-    c.execute("SELECT 1 FROM exercise WHERE exerciseID=?", (exercise_id,))
-    if not c.fetchone():
-        conn.close()
+    if not store.exercise_exists(exercise_id):
         return jsonify({'error': 'Exercise not found'}), 404
 
     session_date = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-    c.execute(
-        "INSERT INTO workoutSession(date, duration, postureAccuracy, userID) VALUES(?, ?, ?, ?)",
-        (session_date, duration, 0.0, current_user_id)
-    )
-    conn.commit()
-    conn.close()
-    return jsonify({'message': 'Workout started', 'exerciseID': exercise_id}), 201
+    session_id = store.create_session(current_user_id, session_date, duration, 0.0, exercise_id)
+    leaderboard.record_session(store, current_user_id, session_date, duration, 0.0)
+    recommendations.invalidate_user(current_user_id)
+    events.publish(current_user_id, 'session.created', sessionID=session_id, exerciseID=exercise_id)
+    return jsonify({'message': 'Workout started', 'exerciseID': exercise_id, 'sessionID': session_id}), 201
+
+@exercise_bp.route('/exercises/popular', methods=['GET'])
+@token_required
+def popular_exercises(current_user_id):
+    """Most started exercises of a week (?week=YYYY-WW, default the current week)."""
+    week = request.args.get('week') or datetime.now().strftime('%Y-%W')
+    try:
+        datetime.strptime(week + '-1', '%Y-%W-%w')
+        limit = int(request.args.get('limit', 10))
+        if not 1 <= limit <= 100:
+            raise ValueError
+    except ValueError:
+        return jsonify({'error': 'week must be YYYY-WW and limit between 1 and 100'}), 400
+
+    store = get_storage()
+    rows = store.popular_exercises(week, limit)
+    names = store.exercise_names(eid for eid, _ in rows)
+    exercises = [
+        {'exerciseID': eid, 'name': names.get(eid), 'sessionCount': count}
+        for (eid, count) in rows
+    ]
+    return jsonify({'week': week, 'exercises': exercises}), 200
 
 @exercise_bp.route('/exerciseVideos', methods=['GET'])
 @token_required
 def exercise_videos(current_user_id):
 
-    conn = sqlite3.connect('fitness.db')
-    c = conn.cursor()
-    c.execute("SELECT exerciseID, name, videoURL FROM exercise")
-    rows = c.fetchall()
-    conn.close()
-    videos = [
+    rows = get_storage().iter_exercise_videos()
+    videos = (
         {'exerciseID': eid, 'name': name, 'videoURL': url}
         for (eid, name, url) in rows
-    ]
-    return jsonify({'exerciseVideos': videos}), 200
+    )
+    return stream_json('exerciseVideos', videos)
 
 # --------------------------------------------------
 # Register Blueprints & Swagger UI
@@ -351,9 +504,43 @@ SWAGGER_URL = '/swagger'
 API_URL     = '/static/swagger.json'
 app.register_blueprint(get_swaggerui_blueprint(SWAGGER_URL, API_URL, config={'app_name': "Fitness API"}), url_prefix=SWAGGER_URL)
 
+metrics.init_app(app)
+profiling.init_app(app)
+ratelimit.init_app(app)
+admission.init_app(app)
+passwords.init_app(app)
+idempotency.init_app(app)
+thumbnails.init_app(app)
+
 app.register_blueprint(auth_bp)
 app.register_blueprint(user_bp)
 app.register_blueprint(exercise_bp)
+app.register_blueprint(telemetry_bp)
+app.register_blueprint(tokens_bp)
+app.register_blueprint(search_bp)
+app.register_blueprint(import_bp)
+app.register_blueprint(sync_bp)
+app.register_blueprint(events_bp)
+app.register_blueprint(thumbnails_bp)
+app.register_blueprint(recommendations_bp)
+app.register_blueprint(leaderboard_bp)
+app.register_blueprint(issues_bp)
+app.register_blueprint(content_bp)
+
+def startup(background_jobs=True):
+    """Initialize the database and start background jobs.
+
+    Call once per process before serving requests (see wsgi.py); importing
+    this module has no side effects on the database.
+    """
+    if 'storage' not in app.extensions:
+        storage.init_app(app)
+        if app.config['RATE_LIMIT_ENABLED'] and app.config['RATE_LIMIT_SNAPSHOT_INTERVAL'] > 0:
+            app.extensions['ratelimit'].restore(app.extensions['storage'])
+    if background_jobs:
+        scheduler.start()
+    return app
 
 if __name__ == '__main__':
+    startup()
     app.run(host='0.0.0.0', port=5000, debug=True)
@@ -0,0 +1,157 @@
+"""
+Database maintenance jobs
+
+Keeps planner statistics fresh and gives space freed by bulk deletes
+(reset_database, /resetWorkoutLibrary, session archival) back to the OS:
+
+- optimize:    PRAGMA optimize (cheap, re-analyzes tables whose stats drifted)
+- analyze:     full ANALYZE
+- vacuum:      PRAGMA incremental_vacuum
+- checkpoint:  PRAGMA wal_checkpoint(TRUNCATE) for databases in WAL mode
+
+Jobs run on the background scheduler and are deferred while more than
+`max_inflight` requests are being served. Runs, skips, time spent and bytes
+reclaimed are reported under `maintenance.<job>.*` in /metrics.
+
+Databases created before auto_vacuum=INCREMENTAL was the default are skipped
+by the vacuum job (counted as `maintenance.vacuum.unconverted`). Converting
+them takes a full VACUUM, which rewrites and locks the whole file, so it is a
+one-off step to run while the app is stopped:
+
+    python maintenance.py --database fitness.db convert
+"""
+
+import argparse
+import os
+import time
+
+import db
+from metrics import metrics, INFLIGHT
+from scheduler import JobDeferred
+
+AUTO_VACUUM_INCREMENTAL = 2
+
+
+def _file_size(conn):
+    page_count = conn.execute("PRAGMA page_count").fetchone()[0]
+    page_size = conn.execute("PRAGMA page_size").fetchone()[0]
+    return page_count * page_size
+
+
+def optimize(dbname):
+    conn = db.connect(dbname)
+    try:
+        conn.execute("PRAGMA optimize")
+    finally:
+        conn.close()
+    return 0
+
+
+def analyze(dbname):
+    conn = db.connect(dbname)
+    try:
+        conn.execute("ANALYZE")
+        conn.commit()
+    finally:
+        conn.close()
+    return 0
+
+
+def vacuum(dbname, max_pages=1000):
+    """Free up to `max_pages` unused pages. Returns the number of bytes reclaimed."""
+    conn = db.connect(dbname)
+    try:
+        before = _file_size(conn)
+        free_pages = conn.execute("PRAGMA freelist_count").fetchone()[0]
+        if not free_pages:
+            return 0
+        if conn.execute("PRAGMA auto_vacuum").fetchone()[0] != AUTO_VACUUM_INCREMENTAL:
+            # needs the one-off `convert`; a full VACUUM must not run next to live requests
+            metrics.incr('maintenance.vacuum.unconverted')
+            return 0
+        conn.execute(f"PRAGMA incremental_vacuum({int(max_pages)})").fetchall()
+        return before - _file_size(conn)
+    finally:
+        conn.close()
+
+
+def convert(dbname):
+    """Switch a database to auto_vacuum=INCREMENTAL. Returns the number of bytes reclaimed."""
+    conn = db.connect(dbname)
+    try:
+        if conn.execute("PRAGMA auto_vacuum").fetchone()[0] == AUTO_VACUUM_INCREMENTAL:
+            return 0
+        before = _file_size(conn)
+        # switching modes only takes effect through a full VACUUM
+        conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+        conn.execute("VACUUM")
+        return before - _file_size(conn)
+    finally:
+        conn.close()
+
+
+def checkpoint(dbname):
+    """Checkpoint and truncate the WAL. Returns the number of bytes the WAL shrank by."""
+    conn = db.connect(dbname)
+    try:
+        if conn.execute("PRAGMA journal_mode").fetchone()[0] != 'wal':
+            return 0
+        wal_file = conn.execute("PRAGMA database_list").fetchone()[2] + '-wal'
+        before = os.path.getsize(wal_file) if os.path.exists(wal_file) else 0
+        conn.execute("PRAGMA wal_checkpoint(TRUNCATE)").fetchone()
+        after = os.path.getsize(wal_file) if os.path.exists(wal_file) else 0
+        return before - after
+    finally:
+        conn.close()
+
+
+TASKS = {
+    'optimize': optimize,
+    'analyze': analyze,
+    'vacuum': vacuum,
+    'checkpoint': checkpoint,
+}
+
+
+def run_task(name, storage, max_inflight=None):
+    """Run one maintenance task over every database of `storage` and record metrics.
+
+    Raises JobDeferred when more than `max_inflight` requests are in flight.
+    Returns the total number of bytes reclaimed.
+    """
+    if max_inflight is not None and metrics.gauge(INFLIGHT) > max_inflight:
+        metrics.incr(f'maintenance.{name}.skipped')
+        raise JobDeferred()
+
+    start = time.perf_counter()
+    reclaimed = sum(TASKS[name](dbname) for dbname in storage.databases())
+    metrics.observe(f'maintenance.{name}.seconds', time.perf_counter() - start)
+    metrics.incr(f'maintenance.{name}.runs')
+    metrics.incr(f'maintenance.{name}.bytes_reclaimed', reclaimed)
+    return reclaimed
+
+
+def schedule(scheduler, get_storage, config):
+    """Register the maintenance tasks on a scheduler using MAINTENANCE_* config values."""
+    max_inflight = config['MAINTENANCE_MAX_INFLIGHT']
+    for name in TASKS:
+        interval = config[f'MAINTENANCE_{name.upper()}_INTERVAL']
+        if interval > 0:
+            scheduler.add_job(f'maintenance.{name}',
+                              lambda name=name: run_task(name, get_storage(), max_inflight),
+                              interval)
+
+
+if __name__ == '__main__':
+    from storage import create_storage
+
+    parser = argparse.ArgumentParser(description="Run a maintenance task once over every database file.")
+    parser.add_argument('task', choices=['convert'] + list(TASKS))
+    parser.add_argument('--database', default=os.getenv('DATABASE', 'fitness.db'))
+    parser.add_argument('--shards', type=int, default=int(os.getenv('DATABASE_SHARDS', 0)))
+    args = parser.parse_args()
+
+    store = create_storage(args.database, args.shards)
+    task = convert if args.task == 'convert' else TASKS[args.task]
+    for dbname in store.databases():
+        print(f"{args.task} {dbname}: {task(dbname)} bytes reclaimed")
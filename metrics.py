@@ -0,0 +1,104 @@
+"""
+In-process metrics for the Fitness Application
+
+Counters, gauges and timings kept in memory and served as JSON from
+GET /metrics to admins, or to scrapers that send `X-Metrics-Token:
+<METRICS_TOKEN>` (METRICS_TOKEN must be set). `init_app` also tracks the
+number of requests in flight, which background jobs use to stay out of the
+way under load.
+"""
+
+import hmac
+import threading
+from flask import Blueprint, current_app, jsonify, g, request
+
+from security import token_required, admin_required
+
+metrics_bp = Blueprint('metrics', __name__)
+
+INFLIGHT = 'http.inflight'
+TOKEN_HEADER = 'X-Metrics-Token'
+
+
+class Metrics:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counters = {}
+        self.gauges = {}
+        self.timings = {}
+
+    def incr(self, name, value=1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def set_gauge(self, name, value):
+        with self._lock:
+            self.gauges[name] = value
+
+    def add_gauge(self, name, delta):
+        with self._lock:
+            self.gauges[name] = self.gauges.get(name, 0) + delta
+
+    def gauge(self, name, default=0):
+        return self.gauges.get(name, default)
+
+    def observe(self, name, seconds):
+        """Record one duration under `name` (count, total, last and max seconds)."""
+        with self._lock:
+            timing = self.timings.setdefault(name, {'count': 0, 'total': 0.0, 'last': 0.0, 'max': 0.0})
+            timing['count'] += 1
+            timing['total'] += seconds
+            timing['last'] = seconds
+            timing['max'] = max(timing['max'], seconds)
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'counters': dict(self.counters),
+                'gauges': dict(self.gauges),
+                'timings': {name: dict(t) for name, t in self.timings.items()}
+            }
+
+    def reset(self):
+        with self._lock:
+            self.counters.clear()
+            self.gauges.clear()
+            self.timings.clear()
+
+
+metrics = Metrics()
+
+
+def scraper_authorized():
+    token = current_app.config.get('METRICS_TOKEN')
+    supplied = request.headers.get(TOKEN_HEADER)
+    return bool(token and supplied and hmac.compare_digest(supplied, token))
+
+
+@token_required
+@admin_required
+def _admin_metrics(current_user_id):
+    return jsonify(metrics.snapshot()), 200
+
+
+@metrics_bp.route('/metrics', methods=['GET'])
+def get_metrics():
+    if scraper_authorized():
+        return jsonify(metrics.snapshot()), 200
+    return _admin_metrics()
+
+
+def init_app(app):
+    """Register the /metrics endpoint and in-flight request tracking."""
+
+    @app.before_request
+    def _request_started():
+        metrics.add_gauge(INFLIGHT, 1)
+        g.metrics_inflight = True
+
+    @app.teardown_request
+    def _request_finished(exc):
+        if g.pop('metrics_inflight', False):
+            metrics.add_gauge(INFLIGHT, -1)
+
+    app.register_blueprint(metrics_bp)
@@ -0,0 +1,114 @@
+"""
+Password hashing service
+
+Passwords are hashed with scrypt. Each hash takes tens of milliseconds of CPU,
+so the work runs in a bounded thread pool (hashlib.scrypt releases the GIL)
+and at most `max_queue` hashes may wait for a worker. Beyond that requests
+fail fast with 503 and Retry-After instead of piling up behind the KDF.
+
+Stored format: scrypt$<n>$<r>$<p>$<salt>$<hash> (salt and hash base64).
+Legacy unsalted MD5 hex digests are still accepted and flagged for rehashing,
+which the login endpoint does on the next successful login.
+"""
+
+import base64
+import hashlib
+import hmac
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from flask import current_app, jsonify
+
+from metrics import metrics
+
+SALT_BYTES = 16
+KEY_BYTES = 32
+
+
+class Overloaded(Exception):
+    """Raised when the hashing queue is full."""
+
+
+class PasswordHasher:
+    def __init__(self, workers=4, max_queue=64, n=2 ** 14, r=8, p=1):
+        self.n, self.r, self.p = n, r, p
+        self.workers = workers
+        self.max_queue = max_queue
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='password-hash')
+        self._slots = threading.BoundedSemaphore(workers + max_queue)
+        self._pending = 0
+        self._lock = threading.Lock()
+
+    def _run(self, func, *args):
+        if not self._slots.acquire(blocking=False):
+            metrics.incr('passwords.rejected')
+            raise Overloaded()
+        self._track(1)
+        try:
+            return self._pool.submit(func, *args).result()
+        finally:
+            self._track(-1)
+            self._slots.release()
+
+    def _track(self, delta):
+        with self._lock:
+            self._pending += delta
+            metrics.set_gauge('passwords.pending', self._pending)
+
+    def _derive(self, password, salt, n, r, p):
+        return hashlib.scrypt(password.encode('utf-8'), salt=salt, n=n, r=r, p=p,
+                              maxmem=256 * n * r + 1024 * 1024, dklen=KEY_BYTES)
+
+    def _hash(self, password):
+        salt = os.urandom(SALT_BYTES)
+        key = self._derive(password, salt, self.n, self.r, self.p)
+        return "scrypt${}${}${}${}${}".format(
+            self.n, self.r, self.p,
+            base64.b64encode(salt).decode('ascii'), base64.b64encode(key).decode('ascii')
+        )
+
+    def _verify(self, password, stored):
+        if is_legacy_md5(stored):
+            digest = hashlib.md5(password.encode('utf-8')).hexdigest()
+            return hmac.compare_digest(digest, stored), True
+        try:
+            scheme, n, r, p, salt, key = stored.split('$')
+            n, r, p = int(n), int(r), int(p)
+        except ValueError:
+            return False, False
+        if scheme != 'scrypt':
+            return False, False
+        derived = self._derive(password, base64.b64decode(salt), n, r, p)
+        ok = hmac.compare_digest(derived, base64.b64decode(key))
+        return ok, (n, r, p) != (self.n, self.r, self.p)
+
+    def hash(self, password):
+        """Return the encoded scrypt hash of a password."""
+        return self._run(self._hash, password)
+
+    def verify(self, password, stored):
+        """Return (matches, needs_rehash) for a password and a stored hash."""
+        return self._run(self._verify, password, stored)
+
+    def shutdown(self):
+        self._pool.shutdown(wait=True)
+
+
+def is_legacy_md5(stored):
+    return len(stored) == 32 and all(ch in '0123456789abcdef' for ch in stored)
+
+
+def init_app(app):
+    app.extensions['passwords'] = PasswordHasher(
+        workers=app.config.get('PASSWORD_HASH_WORKERS', 4),
+        max_queue=app.config.get('PASSWORD_HASH_QUEUE', 64),
+        n=app.config.get('PASSWORD_SCRYPT_N', 2 ** 14)
+    )
+
+    @app.errorhandler(Overloaded)
+    def _overloaded(e):
+        return jsonify({'error': 'Server busy, please retry shortly'}), 503, {'Retry-After': '1'}
+
+
+def get_hasher():
+    return current_app.extensions['passwords']
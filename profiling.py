@@ -0,0 +1,113 @@
+"""
+Per-request profiling
+
+Profiles single requests with cProfile, from the first before_request hook to
+the response, so the time spent in Flask, token_required, jwt.decode and
+SQLite shows up per function. A request is profiled when
+
+- it sends `X-Profile: <PROFILE_TOKEN>` (PROFILE_TOKEN must be set), or
+- it is picked at random with probability PROFILE_SAMPLE_RATE (0.0 - 1.0).
+
+Each profile is written as a pstats file to PROFILE_DIR, which keeps only the
+newest PROFILE_KEEP files, and its name is returned in the X-Profile-Id
+response header. Open the files with `python -m pstats`, snakeviz or any
+pstats based flame graph tool, or print the top functions with
+
+    python profiling.py profiles/<file>.prof --top 25
+
+With neither setting configured the hooks return after one config lookup.
+Only one request is profiled at a time; others run unprofiled meanwhile.
+The body of streamed responses is produced after the profile ends.
+"""
+
+import argparse
+import cProfile
+import hmac
+import itertools
+import os
+import pstats
+import random
+import re
+import threading
+import time
+from flask import g, request, current_app
+
+from metrics import metrics
+
+HEADER = 'X-Profile'
+# cProfile can only be active once per process on newer Pythons
+_active = threading.Lock()
+_sequence = itertools.count(1)
+
+
+def should_profile(config):
+    token = config.get('PROFILE_TOKEN')
+    rate = config.get('PROFILE_SAMPLE_RATE', 0.0)
+    if not token and not rate:
+        return False
+    supplied = request.headers.get(HEADER)
+    if token and supplied and hmac.compare_digest(supplied, token):
+        return True
+    return rate > 0 and random.random() < rate
+
+
+def write_profile(profiler, directory, keep, endpoint, elapsed):
+    """Dump a profile into the ring directory, drop the oldest beyond `keep`; return its file name."""
+    os.makedirs(directory, exist_ok=True)
+    name = "{}-{}-{}-{}-{:.0f}ms.prof".format(
+        time.strftime('%Y%m%dT%H%M%S'), os.getpid(), next(_sequence),
+        re.sub(r'[^A-Za-z0-9_.]', '_', endpoint or 'unknown'), elapsed * 1000
+    )
+    profiler.dump_stats(os.path.join(directory, name))
+
+    files = sorted((entry for entry in os.scandir(directory) if entry.name.endswith('.prof')),
+                   key=lambda entry: entry.stat().st_mtime_ns)
+    for entry in files[:max(len(files) - keep, 0)]:
+        try:
+            os.remove(entry.path)
+        except OSError:
+            pass
+    return name
+
+
+def init_app(app):
+    """Install the profiling hooks."""
+
+    @app.before_request
+    def _start_profile():
+        if not should_profile(app.config) or not _active.acquire(blocking=False):
+            return
+        g.profiler = cProfile.Profile()
+        g.profile_started = time.perf_counter()
+        g.profiler.enable()
+
+    @app.after_request
+    def _finish_profile(response):
+        profiler = g.pop('profiler', None)
+        if profiler is None:
+            return response
+        profiler.disable()
+        _active.release()
+        elapsed = time.perf_counter() - g.pop('profile_started')
+        name = write_profile(profiler, current_app.config.get('PROFILE_DIR', 'profiles'),
+                             current_app.config.get('PROFILE_KEEP', 50), request.endpoint, elapsed)
+        metrics.incr('profiling.captured')
+        response.headers['X-Profile-Id'] = name
+        return response
+
+    @app.teardown_request
+    def _abandon_profile(exc):
+        # after_request does not run when the view raised
+        profiler = g.pop('profiler', None)
+        if profiler is not None:
+            profiler.disable()
+            _active.release()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Print the slowest functions of a request profile.")
+    parser.add_argument('path')
+    parser.add_argument('--top', type=int, default=25)
+    parser.add_argument('--sort', default='cumulative', help="pstats sort key (cumulative, tottime, calls)")
+    args = parser.parse_args()
+    pstats.Stats(args.path).strip_dirs().sort_stats(args.sort).print_stats(args.top)
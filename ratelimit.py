@@ -0,0 +1,197 @@
+"""
+Rate limiting
+
+Every client gets a token bucket per route: a bucket holds up to `capacity`
+requests and refills at `capacity / period` per second, so a client may burst
+to the capacity and then keeps the configured average rate. A request that
+finds its bucket empty is answered with 429 and a Retry-After header telling
+when the next token is due, before the view (and the database) is touched.
+
+Clients are identified by the `sub` of a valid bearer token, or by IP address
+for requests without one (/login, /register, /google-auth, ...). Routes map
+to limits by endpoint (`user.login`), then by blueprint (`auth`), then
+`default`; routes sharing a limit share the bucket. Both can be overridden
+from the environment:
+
+    RATE_LIMITS="user.login=5/60,default=300/60"   # route=capacity/period seconds
+
+A capacity of 0 leaves a route unlimited. A check is a dict lookup and a bit
+of arithmetic under a lock (see benchmarks/bench_ratelimit.py). Buckets live
+in memory, one process each; every RATE_LIMIT_SNAPSHOT_INTERVAL seconds the
+partly drained ones are written to the `rateLimitBucket` table and startup()
+loads them back, so a restart does not hand out fresh bursts. Full buckets
+are the same as no bucket and are dropped, keeping at most RATE_LIMIT_MAX_KEYS.
+
+Behind a reverse proxy, configure werkzeug's ProxyFix so that remote_addr is
+the client's address rather than the proxy's.
+"""
+
+import math
+import threading
+import time
+from flask import request, jsonify
+
+from metrics import metrics
+from security import bearer_payload
+
+# route -> (capacity, period in seconds)
+DEFAULT_LIMITS = {
+    'user.login': (10, 60),
+    'user.register': (10, 60),
+    'auth': (10, 60),
+    'tokens': (30, 60),
+    'issues.submit_issue': (10, 3600),
+    'default': (600, 60),
+}
+
+
+class RateLimited(Exception):
+    """Raised when a client's bucket is empty; carries the seconds until the next token."""
+
+    def __init__(self, retry_after):
+        super().__init__(retry_after)
+        self.retry_after = retry_after
+
+
+class RateLimiter:
+    def __init__(self, limits=None, max_keys=100000, clock=time.monotonic):
+        # route -> (capacity, refill rate per second), or None if unlimited
+        self.limits = {}
+        for route, (capacity, period) in (limits or DEFAULT_LIMITS).items():
+            self.set_limit(route, capacity, period)
+        self.limits.setdefault('default', None)
+        self.max_keys = max_keys
+        self.clock = clock
+        # (route, client) -> [tokens, last refill]
+        self._buckets = {}
+        self._lock = threading.Lock()
+        self._swept = 0.0
+
+    def set_limit(self, route, capacity, period):
+        self.limits[route] = (capacity, capacity / period) if capacity else None
+
+    def rule_for(self, endpoint):
+        if endpoint in self.limits:
+            return endpoint
+        blueprint = (endpoint or '').rpartition('.')[0]
+        return blueprint if blueprint in self.limits else 'default'
+
+    def check(self, rule, client):
+        """Take a token from the bucket of `client` under `rule`.
+
+        Returns 0 if the request may proceed, else the seconds until a token is available.
+        """
+        limit = self.limits[rule]
+        if limit is None:
+            return 0
+        capacity, rate = limit
+        key = (rule, client)
+        with self._lock:
+            now = self.clock()
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                if len(self._buckets) >= self.max_keys:
+                    self._evict(now)
+                self._buckets[key] = [capacity - 1, now]
+                return 0
+            tokens = min(capacity, bucket[0] + (now - bucket[1]) * rate)
+            bucket[1] = now
+            if tokens >= 1:
+                bucket[0] = tokens - 1
+                return 0
+            bucket[0] = tokens
+            return (1 - tokens) / rate
+
+    def _evict(self, now):
+        # Dropping a full bucket changes nothing. Scanning for them is O(n),
+        # so do it at most once a second and otherwise drop the oldest bucket.
+        if now - self._swept >= 1:
+            self._swept = now
+            for key, (tokens, stamp) in list(self._buckets.items()):
+                capacity, rate = self.limits[key[0]]
+                if tokens + (now - stamp) * rate >= capacity:
+                    del self._buckets[key]
+        if len(self._buckets) >= self.max_keys:
+            del self._buckets[next(iter(self._buckets))]
+            metrics.incr('ratelimit.evicted')
+
+    def reset(self):
+        with self._lock:
+            self._buckets.clear()
+
+    def __len__(self):
+        return len(self._buckets)
+
+    # ---------------- snapshots ----------------
+
+    def snapshot(self, storage):
+        """Replace the stored buckets with the partly drained ones. Returns how many were written."""
+        with self._lock:
+            now = self.clock()
+            wall = time.time()
+            rows = []
+            for (rule, client), (tokens, stamp) in self._buckets.items():
+                limit = self.limits.get(rule)
+                if limit and tokens + (now - stamp) * limit[1] < limit[0]:
+                    rows.append((f'{rule} {client}', tokens, wall - (now - stamp)))
+        storage.replace_rate_limit_buckets(rows)
+        metrics.set_gauge('ratelimit.buckets', len(self._buckets))
+        return len(rows)
+
+    def restore(self, storage):
+        """Load the buckets of the last snapshot. Returns how many were restored."""
+        rows = storage.list_rate_limit_buckets()
+        now = self.clock()
+        wall = time.time()
+        restored = 0
+        with self._lock:
+            for bucket, tokens, updated in rows:
+                rule, _, client = bucket.partition(' ')
+                if self.limits.get(rule) is None:
+                    continue
+                self._buckets[(rule, client)] = [tokens, now - max(wall - updated, 0)]
+                restored += 1
+        return restored
+
+
+def client_key():
+    """The `sub` of a valid bearer token, else the client's IP address."""
+    try:
+        payload = bearer_payload()
+    except ValueError:
+        payload = None
+    if payload and 'sub' in payload:
+        return f"user:{payload['sub']}"
+    return f"ip:{request.remote_addr}"
+
+
+def parse_limits(value):
+    """Parse 'route=capacity/period,...' into {route: (capacity, period)}."""
+    limits = {}
+    for item in filter(None, (part.strip() for part in (value or '').split(','))):
+        route, _, spec = item.partition('=')
+        capacity, _, period = spec.partition('/')
+        limits[route.strip()] = (int(capacity), float(period or 1))
+    return limits
+
+
+def init_app(app):
+    """Create the limiter from the app config and check every request against it."""
+    limits = dict(DEFAULT_LIMITS, **parse_limits(app.config.get('RATE_LIMITS')))
+    limiter = RateLimiter(limits, app.config.get('RATE_LIMIT_MAX_KEYS', 100000))
+    app.extensions['ratelimit'] = limiter
+    if not app.config.get('RATE_LIMIT_ENABLED', True):
+        return
+
+    @app.before_request
+    def _limit():
+        rule = limiter.rule_for(request.endpoint)
+        wait = limiter.check(rule, client_key())
+        if wait:
+            metrics.incr(f'ratelimit.{rule}.limited')
+            raise RateLimited(wait)
+
+    @app.errorhandler(RateLimited)
+    def _limited(e):
+        return jsonify({'error': 'Too many requests, please slow down'}), 429, \
+            {'Retry-After': str(math.ceil(e.retry_after))}
@@ -0,0 +1,228 @@
+"""
+Exercise recommendations
+
+GET /recommendations ranks the whole exercise catalog for the current user.
+Each exercise is a row of a normalized term matrix over its category, body
+parts and equipment. The user is a weighted term vector built from
+
+- the profile: keywords of `fitness_goal`, a low `activity_level` and a BMI
+  of 30 or more (from `height` and `weight`) favour matching terms,
+- recent sessions: exercises done recently and with good posture pull
+  similar ones up, with a weight halving every HISTORY_HALF_LIFE days,
+
+and an exercise scores its similarity to that vector, minus a penalty for
+muscles trained in the last RECOVERY_DAYS and for exercises repeated in the
+last week. Scoring is one matrix-vector product over the catalog.
+
+The matrix is built once and kept until the catalog changes
+(search.invalidate_catalog); CATALOG_TTL bounds how long a worker keeps one
+after another process, e.g. a CLI import, changed the catalog. Ranked results
+are cached per user for the matrix they were scored on, and dropped on profile
+updates and session writes (`invalidate_user`).
+"""
+
+import itertools
+
+from flask import Blueprint, request, jsonify
+
+from cache import Cache
+from security import token_required
+from storage import get_storage
+
+recommendations_bp = Blueprint('recommendations', __name__)
+
+MAX_LIMIT = 50
+CATALOG_TTL = 300
+# Sessions making up the history profile
+RECENT_SESSIONS = 50
+HISTORY_HALF_LIFE = 14
+RECOVERY_DAYS = 2
+REPEAT_DAYS = 7
+HISTORY_WEIGHT = 1.0
+# larger than HISTORY_WEIGHT, so muscles trained yesterday rest even if they are favourites
+RECOVERY_PENALTY = 1.5
+REPEAT_PENALTY = 0.3
+
+# keyword of fitness_goal -> catalog terms it favours
+GOAL_TERMS = {
+    'lose': {'cardio': 1.0, 'full body': 1.0, 'lower body': 0.5},
+    'fat': {'cardio': 1.0, 'full body': 1.0, 'lower body': 0.5},
+    'endurance': {'cardio': 1.0, 'full body': 0.5},
+    'strength': {'upper body': 1.0, 'lower body': 1.0, 'core': 0.5},
+    'muscle': {'upper body': 1.0, 'lower body': 1.0, 'core': 0.5},
+    'tone': {'core': 1.0, 'upper body': 0.5, 'lower body': 0.5},
+    'flexib': {'flexibility': 1.0, 'core': 0.5, 'back': 0.5},
+    'mobility': {'flexibility': 1.0, 'core': 0.5, 'back': 0.5},
+    'posture': {'core': 1.0, 'back': 1.0},
+}
+LOW_ACTIVITY = ('sedentary', 'low', 'light', 'beginner')
+LOW_ACTIVITY_TERMS = {'none': 0.5}
+HIGH_BMI_TERMS = {'none': 0.3, 'core': 0.3, 'cardio': 0.3}
+
+# 'catalog' -> (catalog generation, Catalog)
+catalog_cache = Cache('recommendation_catalog', max_entries=1, ttl=CATALOG_TTL)
+# userID -> (Catalog.version, ranked items)
+results = Cache('recommendations', max_entries=10000, ttl=3600)
+_generation = 0
+_versions = itertools.count(1)
+
+
+def _np():
+    """NumPy, imported on first use so that app start-up does not pay for it."""
+    import numpy
+    return numpy
+
+
+def invalidate_catalog():
+    """Drop the term matrix and, through its version, every cached ranking."""
+    global _generation
+    _generation += 1
+    catalog_cache.invalidate()
+
+
+def invalidate_user(user_id):
+    """Call after a user's profile or sessions changed."""
+    results.invalidate(user_id)
+
+
+def exercise_terms(category, body_parts, equipment):
+    terms = {part.strip().lower() for part in (body_parts or '').split(',')}
+    terms.update(value.strip().lower() for value in (category, equipment) if value)
+    terms.discard('')
+    return terms
+
+
+class Catalog:
+    """The exercise rows and their L2-normalized term matrix."""
+
+    def __init__(self, rows):
+        np = _np()
+        # tells the rankings scored on this matrix from those of a rebuilt one
+        self.version = next(_versions)
+        self.rows = rows
+        self.ids = np.array([row[0] for row in rows], dtype=np.int64)
+        self.position = {exercise_id: i for i, exercise_id in enumerate(self.ids.tolist())}
+        self.vocabulary = {}
+        cells_row, cells_col = [], []
+        for i, row in enumerate(rows):
+            for term in exercise_terms(row[2], row[3], row[4]):
+                cells_row.append(i)
+                cells_col.append(self.vocabulary.setdefault(term, len(self.vocabulary)))
+        self.features = np.zeros((len(rows), max(len(self.vocabulary), 1)), dtype=np.float32)
+        self.features[cells_row, cells_col] = 1.0
+        norms = np.linalg.norm(self.features, axis=1, keepdims=True)
+        self.features /= np.maximum(norms, 1e-9)
+
+    def term_vector(self, weights):
+        np = _np()
+        vector = np.zeros(self.features.shape[1], dtype=np.float32)
+        for term, weight in weights.items():
+            if term in self.vocabulary:
+                vector[self.vocabulary[term]] += weight
+        return vector
+
+
+def get_catalog(storage):
+    generation = _generation
+    cached = catalog_cache.get('catalog')
+    if cached is not None and cached[0] == generation:
+        return cached[1]
+    catalog = Catalog(list(storage.iter_exercises()))
+    # built while the catalog changed, it is stored under the old generation and never served
+    catalog_cache.set('catalog', (generation, catalog))
+    return catalog
+
+
+def profile_terms(fitness_goal, activity_level, height, weight):
+    """Term weights favoured by a user's profile."""
+    weights = {}
+
+    def add(terms):
+        for term, weight in terms.items():
+            weights[term] = weights.get(term, 0.0) + weight
+
+    goal = (fitness_goal or '').lower()
+    for keyword, terms in GOAL_TERMS.items():
+        if keyword in goal:
+            add(terms)
+    if any(word in (activity_level or '').lower() for word in LOW_ACTIVITY):
+        add(LOW_ACTIVITY_TERMS)
+    if height and weight and weight / (height / 100) ** 2 >= 30:
+        add(HIGH_BMI_TERMS)
+    return weights
+
+
+def _unit(vector):
+    norm = _np().linalg.norm(vector)
+    return vector / norm if norm else vector
+
+
+def score(catalog, terms, sessions):
+    """Score every exercise for a user; `sessions` are (exerciseID, age in days, postureAccuracy) rows."""
+    np = _np()
+    features = catalog.features
+    preference = _unit(catalog.term_vector(terms))
+    sessions = [row for row in sessions if row[0] in catalog.position]
+    if not sessions:
+        return features @ preference
+
+    index = np.array([catalog.position[row[0]] for row in sessions])
+    age = np.maximum(np.array([row[1] for row in sessions], dtype=np.float32), 0)
+    accuracy = np.array([row[2] or 0.0 for row in sessions], dtype=np.float32)
+
+    history_weight = 0.5 ** (age / HISTORY_HALF_LIFE) * (0.5 + accuracy)
+    history = _unit(history_weight @ features[index])
+    recovering = _unit(features[index[age < RECOVERY_DAYS]].sum(axis=0))
+    repeats = np.bincount(index[age < REPEAT_DAYS], minlength=len(catalog.ids))
+
+    return (features @ (preference + HISTORY_WEIGHT * history)
+            - RECOVERY_PENALTY * (features @ recovering)
+            - REPEAT_PENALTY * np.minimum(repeats, 3) / 3)
+
+
+def rank(catalog, scores, limit):
+    """The `limit` best exercises as dicts, best first (ties by exerciseID)."""
+    np = _np()
+    limit = min(limit, len(scores))
+    if not limit:
+        return []
+    best = np.argpartition(-scores, limit - 1)[:limit]
+    best = best[np.lexsort((catalog.ids[best], -scores[best]))]
+    items = []
+    for i in best.tolist():
+        exercise_id, name, category, body_parts, equipment, video = catalog.rows[i]
+        items.append({'exerciseID': exercise_id, 'name': name, 'category': category,
+                      'targetedBodyParts': body_parts, 'requiredEquipment': equipment,
+                      'videoURL': video, 'score': round(float(scores[i]), 4)})
+    return items
+
+
+def recommend(storage, user_id):
+    """Ranked recommendations (up to MAX_LIMIT) for a user, or None if the user does not exist.
+
+    Cached until the catalog, the user's profile or their sessions change.
+    """
+    catalog = get_catalog(storage)
+    cached = results.get(user_id)
+    if cached is not None and cached[0] == catalog.version:
+        return cached[1]
+    row = storage.get_profile(user_id)
+    if not row:
+        return None
+    # fitness_goal, activity_level, height, weight
+    terms = profile_terms(row[8], row[9], row[4], row[5])
+    items = rank(catalog, score(catalog, terms, storage.recent_sessions(user_id, RECENT_SESSIONS)), MAX_LIMIT)
+    results.set(user_id, (catalog.version, items))
+    return items
+
+
+@recommendations_bp.route('/recommendations', methods=['GET'])
+@token_required
+def get_recommendations(current_user_id):
+    limit = request.args.get('limit', 10, type=int)
+    if not 1 <= limit <= MAX_LIMIT:
+        return jsonify({'error': f'limit must be between 1 and {MAX_LIMIT}'}), 400
+    items = recommend(get_storage(), current_user_id)
+    if items is None:
+        return jsonify({'error': 'User not found'}), 404
+    return jsonify({'userID': current_user_id, 'recommendations': items[:limit]}), 200
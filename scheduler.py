@@ -0,0 +1,86 @@
+"""
+In-process background job scheduler
+
+Runs registered jobs on fixed intervals in a daemon thread so that
+housekeeping work never runs on the request path.
+"""
+
+import threading
+import time
+import traceback
+
+
+class JobDeferred(Exception):
+    """Raised by a job that decided not to run now; it is retried after `retry_after` seconds."""
+
+    def __init__(self, retry_after=60):
+        super().__init__(f"deferred for {retry_after}s")
+        self.retry_after = retry_after
+
+
+class Job:
+    def __init__(self, name, func, interval):
+        self.name = name
+        self.func = func
+        self.interval = interval
+        self.next_run = time.monotonic() + interval
+        self.last_result = None
+        self.last_error = None
+
+
+class Scheduler:
+    """Run jobs every `interval` seconds in a single background thread."""
+
+    def __init__(self, tick=1.0):
+        self.tick = tick
+        self.jobs = {}
+        self._stop = threading.Event()
+        self._thread = None
+
+    def add_job(self, name, func, interval):
+        self.jobs[name] = Job(name, func, interval)
+
+    def run_job(self, name):
+        """Run a job now, recording its result or error."""
+        job = self.jobs[name]
+        try:
+            job.last_result = job.func()
+            job.last_error = None
+        except JobDeferred as e:
+            job.next_run = time.monotonic() + min(e.retry_after, job.interval)
+            return None
+        except Exception as e:
+            job.last_error = e
+            print(f"Background job {name} failed: {e}")
+            traceback.print_exc()
+        job.next_run = time.monotonic() + job.interval
+        return job.last_result
+
+    def wake(self, name):
+        """Make a job due at the next tick, e.g. after a bulk delete."""
+        if name in self.jobs:
+            self.jobs[name].next_run = 0
+
+    def run_pending(self):
+        """Run every job whose interval has elapsed."""
+        now = time.monotonic()
+        for name, job in list(self.jobs.items()):
+            if job.next_run <= now:
+                self.run_job(name)
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._loop, name='scheduler', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+            self._thread = None
+
+    def _loop(self):
+        while not self._stop.wait(self.tick):
+            self.run_pending()
@@ -0,0 +1,149 @@
+"""
+Exercise library search
+
+GET /exercises/search runs ranked full-text search over the exercise library
+(FTS5 table `exerciseSearch`, kept in sync with `exercise` by triggers) and
+narrows it with facet filters:
+
+- q:          free text, every word must match (prefix match, bm25 ranking)
+- category:   exact category, uses idx_exercise_category
+- equipment:  exact requiredEquipment, uses idx_exercise_equipment
+- bodyPart:   word in targetedBodyParts, answered by the FTS index
+- page, per_page: pagination (per_page <= 100)
+
+The response carries facet counts (category, requiredEquipment,
+targetedBodyParts) over all matches. Counts and totals are cached per
+query until the catalog changes; FACET_TTL bounds how long another worker
+process can serve counts of a catalog it did not change.
+"""
+
+import re
+from flask import Blueprint, request, jsonify
+
+import recommendations
+from cache import Cache
+from security import token_required
+from storage import get_storage
+
+search_bp = Blueprint('search', __name__)
+
+MAX_PER_PAGE = 100
+FACET_TTL = 300
+TOKEN = re.compile(r'\w+', re.UNICODE)
+
+# (q, category, equipment, bodyPart) -> (catalog generation, facet counts and total)
+facet_cache = Cache('exercise_facets', max_entries=512, ttl=FACET_TTL)
+_generation = 0
+
+
+def invalidate_catalog():
+    """Call after any change to the exercise table."""
+    global _generation
+    # counted while the catalog changed, an entry is stored under the old generation and never served
+    _generation += 1
+    facet_cache.invalidate()
+    recommendations.invalidate_catalog()
+
+
+def fts_query(text, column=None):
+    """Turn user input into an FTS5 query of quoted prefix terms, or None if it has no words."""
+    terms = [f'"{term}"*' for term in TOKEN.findall(text or '')]
+    if not terms:
+        return None
+    query = ' '.join(terms)
+    return f'{column} : ({query})' if column else query
+
+
+def build_filter(q=None, category=None, equipment=None, body_part=None):
+    """Return (FROM/WHERE clause, params, ranked) for a search."""
+    match = [m for m in (fts_query(q), fts_query(body_part, 'targetedBodyParts')) if m]
+    clause = "FROM exercise e"
+    where, params = [], []
+    if match:
+        clause += " JOIN exerciseSearch ON exerciseSearch.rowid = e.exerciseID"
+        where.append("exerciseSearch MATCH ?")
+        params.append(' AND '.join(match))
+    if category:
+        where.append("e.category = ?")
+        params.append(category)
+    if equipment:
+        where.append("e.requiredEquipment = ?")
+        params.append(equipment)
+    if where:
+        clause += " WHERE " + " AND ".join(where)
+    return clause, params, bool(fts_query(q))
+
+
+def facet_counts(conn, clause, params):
+    facets = {}
+    for column in ('category', 'requiredEquipment'):
+        rows = conn.execute(
+            f"SELECT e.{column}, COUNT(*) {clause} GROUP BY e.{column} ORDER BY COUNT(*) DESC, e.{column}",
+            params
+        ).fetchall()
+        facets[column] = dict(rows)
+
+    # targetedBodyParts holds a comma separated list
+    parts = {}
+    for (value,) in conn.execute(f"SELECT e.targetedBodyParts {clause}", params):
+        for part in (value or '').split(','):
+            part = part.strip()
+            if part:
+                parts[part] = parts.get(part, 0) + 1
+    facets['targetedBodyParts'] = dict(sorted(parts.items(), key=lambda item: (-item[1], item[0])))
+    return facets
+
+
+def search_exercises(storage, q=None, category=None, equipment=None, body_part=None, page=1, per_page=20):
+    clause, params, ranked = build_filter(q, category, equipment, body_part)
+    order = "bm25(exerciseSearch), e.exerciseID" if ranked else "e.name, e.exerciseID"
+    conn = storage.connect()
+    try:
+        rows = conn.execute(
+            "SELECT e.exerciseID, e.name, e.category, e.targetedBodyParts, e.requiredEquipment, e.videoURL "
+            f"{clause} ORDER BY {order} LIMIT ? OFFSET ?",
+            params + [per_page, (page - 1) * per_page]
+        ).fetchall()
+        key = (q, category, equipment, body_part)
+        generation = _generation
+        cached = facet_cache.get(key)
+        if cached is not None and cached[0] == generation:
+            summary = cached[1]
+        else:
+            total = conn.execute(f"SELECT COUNT(*) {clause}", params).fetchone()[0]
+            summary = {'total': total, 'facets': facet_counts(conn, clause, params)}
+            facet_cache.set(key, (generation, summary))
+    finally:
+        conn.close()
+
+    exercises = [
+        {
+            'exerciseID': eid, 'name': name, 'category': cat,
+            'targetedBodyParts': tb, 'requiredEquipment': req, 'videoURL': url
+        }
+        for (eid, name, cat, tb, req, url) in rows
+    ]
+    return dict(summary, exercises=exercises, page=page, perPage=per_page)
+
+
+@search_bp.route('/exercises/search', methods=['GET'])
+@token_required
+def exercise_search(current_user_id):
+    try:
+        page = int(request.args.get('page', 1))
+        per_page = int(request.args.get('per_page', 20))
+        if page < 1 or not 1 <= per_page <= MAX_PER_PAGE:
+            raise ValueError
+    except ValueError:
+        return jsonify({'error': f'page must be >= 1 and per_page between 1 and {MAX_PER_PAGE}'}), 400
+
+    result = search_exercises(
+        get_storage(),
+        q=request.args.get('q'),
+        category=request.args.get('category'),
+        equipment=request.args.get('equipment'),
+        body_part=request.args.get('bodyPart'),
+        page=page,
+        per_page=per_page
+    )
+    return jsonify(result), 200
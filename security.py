@@ -1,12 +1,14 @@
 import jwt
 from jwt.exceptions import ExpiredSignatureError, InvalidTokenError, InvalidSubjectError
 from datetime import datetime, timedelta
-from flask import current_app, request, jsonify
+from flask import current_app, request, jsonify, g
 from functools import wraps
 
 def encode_auth_token(user_id, role):
+    """Issue a short-lived access token; clients renew it through /refresh."""
+    lifetime = current_app.config.get('ACCESS_TOKEN_TTL', 900)
     payload = {
-        'exp': datetime.utcnow() + timedelta(days=1),
+        'exp': datetime.utcnow() + timedelta(seconds=lifetime),
         'iat': datetime.utcnow(),
         'sub': str(user_id),
         'role': role
@@ -34,15 +36,35 @@ def decode_auth_token(token):
         raise ValueError('Invalid token, please login again.')
 
 
+def bearer_payload():
+    """Decode the request's bearer token once per request; None if there is none.
+
+    Raises ValueError like decode_auth_token for a bad token.
+    """
+    auth_header = request.headers.get('Authorization', None)
+    if not auth_header or not auth_header.startswith('Bearer '):
+        return None
+    token = auth_header.split(' ')[1]
+    # keyed by token: g outlives the request when an app context was already pushed
+    cached = g.get('bearer_payload')
+    if cached is None or cached[0] != token:
+        try:
+            cached = (token, decode_auth_token(token))
+        except ValueError as e:
+            cached = (token, e)
+        g.bearer_payload = cached
+    if isinstance(cached[1], ValueError):
+        raise cached[1]
+    return cached[1]
+
+
 def token_required(f):
     @wraps(f)
     def decorated(*args, **kwargs):
-        auth_header = request.headers.get('Authorization', None)
-        if not auth_header or not auth_header.startswith('Bearer '):
-            return jsonify({'error': 'Token is missing'}), 401
-        token = auth_header.split(' ')[1]
         try:
-            payload = decode_auth_token(token)
+            payload = bearer_payload()
+            if payload is None:
+                return jsonify({'error': 'Token is missing'}), 401
             user_id = payload['sub']
             request.user_role = payload.get('role')
         except ValueError as e:
@@ -50,3 +72,13 @@ def token_required(f):
 
         return f(user_id, *args, **kwargs)
     return decorated
+
+
+def admin_required(f):
+    """Place below @token_required: rejects tokens whose role is not admin."""
+    @wraps(f)
+    def decorated(*args, **kwargs):
+        if getattr(request, 'user_role', None) != 'admin':
+            return jsonify({'error': 'Admin privileges required'}), 403
+        return f(*args, **kwargs)
+    return decorated
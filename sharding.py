@@ -0,0 +1,411 @@
+"""
+Sharded storage for the Fitness Application
+
+User-owned rows (`user`, `workoutSession`) are spread over N shard databases
+so that writes for different users do not queue behind one SQLite writer lock.
+The main database keeps the global tables (exercise, content, issueForm) and a
+small `userDirectory` table that maps every userID to its shard and holds the
+globally unique username, email and google_id used for lookups.
+
+Shard files sit next to the main database: fitness.db -> fitness-shard0.db, ...
+(memory:<name> -> memory:<name>-shard0, ...).
+
+To move users onto the layout of a new shard count, stop the app and run:
+
+    python sharding.py --database fitness.db --shards 4
+
+Shard files dropped by a shrink are deleted once their users have moved.
+"""
+
+import argparse
+import os
+import threading
+
+import db
+from storage import Storage, SQLiteStorage, create_storage, MEMORY_PREFIX, SESSION_ID_SPAN
+
+# Tables whose rows belong to a single user and move with it. Tombstones move before the
+# sessions, whose own deletes on the source shard must not follow the user.
+USER_TABLES = ['user', 'profileThumbnail', 'workoutTombstone', 'workoutSession', 'workoutArchive']
+
+# User columns mirrored in the directory for global lookups
+DIRECTORY_COLUMNS = ('username', 'email', 'google_id')
+
+# Tables holding sessionIDs that must never be handed out again
+SESSION_ID_TABLES = ('workoutSession', 'workoutTombstone')
+
+
+def shard_name(database, index):
+    """Return the DATABASE value of shard `index` for a main database."""
+    if database.startswith(MEMORY_PREFIX):
+        return f"{database}-shard{index}"
+    root, ext = os.path.splitext(database)
+    return f"{root}-shard{index}{ext}"
+
+
+def create_directory(dbname):
+    conn = db.connect(dbname)
+    c = conn.cursor()
+    c.execute("CREATE TABLE IF NOT EXISTS userDirectory(userID INTEGER PRIMARY KEY, "
+              "shard INTEGER NOT NULL, "
+              "username TEXT, "
+              "email TEXT, "
+              "google_id TEXT)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_userDirectory_username ON userDirectory(username)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_userDirectory_email ON userDirectory(email)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_userDirectory_google_id ON userDirectory(google_id)")
+    conn.commit()
+    conn.close()
+
+
+class ShardedStorage(Storage):
+    """Storage that routes user and session rows to shards by userID.
+
+    New users go to shard `userID % shards`. The directory records the shard
+    of every user, so changing the shard count only affects new users until
+    `rebalance` is run.
+    """
+
+    def __init__(self, database, shards):
+        self.database = database
+        self.directory = create_storage(database)
+        super().__init__(self.directory.dbname)
+        self.shards = []
+        self._shard_of = {}
+        self._lock = threading.Lock()
+        for index in range(shards):
+            self._add_shard()
+
+    def _add_shard(self):
+        shard = create_storage(shard_name(self.database, len(self.shards)))
+        shard.session_id_base = len(self.shards) * SESSION_ID_SPAN
+        self.shards.append(shard)
+        return shard
+
+    def initialize(self):
+        result = self.directory.initialize()
+        create_directory(self.dbname)
+        for shard in self.shards:
+            db.createDB(shard.dbname)
+        self.reserve_session_ids()
+        return result
+
+    def reset(self):
+        self.directory.reset()
+        self.directory._execute("DELETE FROM userDirectory")
+        for shard in self.shards:
+            shard.reset()
+        with self._lock:
+            self._shard_of.clear()
+
+    def restore(self, snapshot):
+        super().restore(snapshot)
+        with self._lock:
+            self._shard_of.clear()
+
+    def close(self):
+        self.directory.close()
+        for shard in self.shards:
+            shard.close()
+
+    def partitions(self):
+        return list(self.shards)
+
+    def databases(self):
+        return [self.dbname] + [shard.dbname for shard in self.shards]
+
+    def connect_for_user(self, user_id):
+        return self._partition(user_id).connect()
+
+    def reserve_session_ids(self):
+        """Raise every shard's session_id_floor to the highest ID of its range stored on any shard.
+
+        A shard allocates sessionIDs from the range of its index, but users
+        keep their sessionIDs when they move. After a shrink and a grow, IDs
+        of a re-added shard's range can live on other shards (as sessions
+        or tombstones), and its own MAX(sessionID) no longer covers them.
+        """
+        for index, shard in enumerate(self.shards):
+            low = index * SESSION_ID_SPAN
+            highest = [low]
+            for other in self.shards:
+                for table in SESSION_ID_TABLES:
+                    row = other._fetchone(f"SELECT MAX(sessionID) FROM {table} "
+                                          "WHERE sessionID >= ? AND sessionID < ?", (low, low + SESSION_ID_SPAN))
+                    if row[0] is not None:
+                        highest.append(row[0])
+            shard.session_id_floor = max(highest)
+
+    # ---------------- routing ----------------
+
+    def shard_index(self, user_id):
+        """Return the shard index of a user, or None if it is not in the directory."""
+        with self._lock:
+            if user_id in self._shard_of:
+                return self._shard_of[user_id]
+        row = self.directory._fetchone("SELECT shard FROM userDirectory WHERE userID=?", (user_id,))
+        if not row:
+            return None
+        with self._lock:
+            self._shard_of[user_id] = row[0]
+        return row[0]
+
+    def _partition(self, user_id):
+        index = self.shard_index(user_id)
+        if index is None:
+            index = int(user_id) % len(self.shards)
+        return self.shards[index]
+
+    def _lookup(self, column, value):
+        row = self.directory._fetchone(f"SELECT userID FROM userDirectory WHERE {column}=?", (value,))
+        return row[0] if row else None
+
+    # ---------------- users ----------------
+
+    def username_exists(self, username, exclude_user_id=None):
+        user_id = self._lookup('username', username)
+        return user_id is not None and user_id != exclude_user_id
+
+    def email_exists(self, email, exclude_user_id=None):
+        user_id = self._lookup('email', email)
+        return user_id is not None and user_id != exclude_user_id
+
+    def create_user(self, fields):
+        conn = self.directory.connect()
+        try:
+            cursor = conn.execute(
+                "INSERT INTO userDirectory(shard, username, email, google_id) VALUES (0, ?, ?, ?)",
+                [fields.get(col) for col in DIRECTORY_COLUMNS]
+            )
+            user_id = cursor.lastrowid
+            index = user_id % len(self.shards)
+            conn.execute("UPDATE userDirectory SET shard=? WHERE userID=?", (index, user_id))
+            conn.commit()
+        finally:
+            conn.close()
+
+        try:
+            self.shards[index].create_user(dict(fields, userID=user_id))
+        except Exception:
+            self.directory._execute("DELETE FROM userDirectory WHERE userID=?", (user_id,))
+            raise
+        with self._lock:
+            self._shard_of[user_id] = index
+        return user_id
+
+    def update_user(self, user_id, fields):
+        self._partition(user_id).update_user(user_id, fields)
+        mirrored = {col: fields[col] for col in DIRECTORY_COLUMNS if col in fields}
+        if mirrored:
+            set_clause = ", ".join(f"{col} = ?" for col in mirrored)
+            self.directory._execute(f"UPDATE userDirectory SET {set_clause} WHERE userID=?",
+                                    list(mirrored.values()) + [user_id])
+
+    def get_login(self, username):
+        user_id = self._lookup('username', username)
+        if user_id is None:
+            return None
+        return self._partition(user_id).get_login(username)
+
+    def get_profile(self, user_id):
+        if self.shard_index(user_id) is None:
+            return None
+        return self._partition(user_id).get_profile(user_id)
+
+    def get_account(self, user_id):
+        if self.shard_index(user_id) is None:
+            return None
+        return self._partition(user_id).get_account(user_id)
+
+    def get_user_active(self, user_id):
+        if self.shard_index(user_id) is None:
+            return None
+        return self._partition(user_id).get_user_active(user_id)
+
+    def find_user(self, **criteria):
+        (column, value), = criteria.items()
+        if column == 'userID':
+            user_id = value
+        elif column in DIRECTORY_COLUMNS:
+            user_id = self._lookup(column, value)
+        else:
+            for shard in self.shards:
+                user = shard.find_user(**criteria)
+                if user:
+                    return user
+            return None
+        if user_id is None or self.shard_index(user_id) is None:
+            return None
+        return self._partition(user_id).find_user(userID=user_id)
+
+    def usernames(self, user_ids):
+        ids = list(user_ids)
+        if not ids:
+            return {}
+        placeholders = ", ".join("?" for _ in ids)
+        return dict(self.directory._fetchall(
+            f"SELECT userID, username FROM userDirectory WHERE userID IN ({placeholders})", ids
+        ))
+
+    def get_profilepic(self, user_id):
+        return self._partition(user_id).get_profilepic(user_id)
+
+    def get_thumbnail(self, user_id, size):
+        return self._partition(user_id).get_thumbnail(user_id, size)
+
+    def save_thumbnails(self, user_id, source_hash, images):
+        return self._partition(user_id).save_thumbnails(user_id, source_hash, images)
+
+    # ---------------- workout sessions ----------------
+
+    def create_session(self, user_id, date, duration, posture_accuracy, exercise_id=None):
+        return self._partition(user_id).create_session(user_id, date, duration, posture_accuracy, exercise_id)
+
+    def get_session(self, user_id, session_id):
+        return self._partition(user_id).get_session(user_id, session_id)
+
+    def get_session_start(self, user_id, session_id):
+        return self._partition(user_id).get_session_start(user_id, session_id)
+
+    def close_session(self, user_id, session_id, fields):
+        return self._partition(user_id).close_session(user_id, session_id, fields)
+
+    def update_session(self, user_id, session_id, fields):
+        self._partition(user_id).update_session(user_id, session_id, fields)
+
+    def delete_session(self, user_id, session_id):
+        return self._partition(user_id).delete_session(user_id, session_id)
+
+    def list_sessions(self, user_id, since=None, until=None):
+        return self._partition(user_id).list_sessions(user_id, since, until)
+
+    def iter_sessions(self, user_id, since=None, until=None):
+        return self._partition(user_id).iter_sessions(user_id, since, until)
+
+    def list_exercise_sessions(self, user_id, exercise_id, before=None, limit=10, before_id=None):
+        return self._partition(user_id).list_exercise_sessions(user_id, exercise_id, before, limit, before_id)
+
+    def recent_sessions(self, user_id, limit=50):
+        return self._partition(user_id).recent_sessions(user_id, limit)
+
+    def popular_exercises(self, week, limit=10):
+        # every shard counts the sessions it stores; a week has at most one row per exercise
+        totals = {}
+        for shard in self.shards:
+            for exercise_id, count in shard.popular_exercises(week, limit=-1):
+                totals[exercise_id] = totals.get(exercise_id, 0) + count
+        return sorted(totals.items(), key=lambda item: (-item[1], item[0]))[:limit]
+
+    # ---------------- rebalancing ----------------
+
+    def rebalance(self, shards):
+        """Move every user to shard `userID % shards` and drop shards left empty.
+
+        Must run while no requests are being served. The files of dropped
+        shards are deleted. Returns the number of users moved.
+        """
+        while len(self.shards) < shards:
+            db.createDB(self._add_shard().dbname)
+
+        rows = self.directory._fetchall("SELECT userID, shard FROM userDirectory")
+        moved = 0
+        for user_id, current in rows:
+            target = user_id % shards
+            if target == current:
+                continue
+            move_user(user_id, self.shards[current], self.shards[target])
+            self.directory._execute("UPDATE userDirectory SET shard=? WHERE userID=?", (target, user_id))
+            moved += 1
+
+        for shard in self.shards[shards:]:
+            merge_popularity(shard, self.shards[0])
+            shard.close()
+            if isinstance(shard, SQLiteStorage):
+                remove_database(shard.dbname)
+        del self.shards[shards:]
+        with self._lock:
+            self._shard_of.clear()
+        self.reserve_session_ids()
+        return moved
+
+
+def move_user(user_id, source, target):
+    """Move all rows of a user, and the exercisePopularity counts of their sessions, in one transaction."""
+    conn = source.connect()
+    try:
+        conn.execute("ATTACH DATABASE ? AS target", (target.dbname,))
+        with conn:
+            # the counts follow the sessions, so deleting one later decrements the shard that holds it
+            counts = conn.execute(
+                "SELECT COUNT(*), strftime('%Y-%W', date) AS week, exerciseID FROM main.workoutSession "
+                "WHERE userID=? AND exerciseID IS NOT NULL GROUP BY week, exerciseID", (user_id,)
+            ).fetchall()
+            conn.executemany(
+                "UPDATE main.exercisePopularity SET sessionCount = MAX(sessionCount - ?, 0) "
+                "WHERE week=? AND exerciseID=?", counts
+            )
+            conn.executemany(
+                "INSERT INTO target.exercisePopularity(sessionCount, week, exerciseID) VALUES (?, ?, ?) "
+                "ON CONFLICT(week, exerciseID) DO UPDATE SET sessionCount = sessionCount + excluded.sessionCount",
+                counts
+            )
+            for table in USER_TABLES:
+                columns = ", ".join(row[1] for row in conn.execute(f"PRAGMA main.table_info({table})"))
+                conn.execute(
+                    f"INSERT INTO target.{table}({columns}) SELECT {columns} FROM main.{table} WHERE userID=?",
+                    (user_id,)
+                )
+                conn.execute(f"DELETE FROM main.{table} WHERE userID=?", (user_id,))
+            conn.execute("DELETE FROM main.workoutTombstone WHERE userID=?", (user_id,))
+    finally:
+        conn.close()
+
+
+def merge_popularity(source, target):
+    """Add the exercise popularity counters of a shard that is being dropped to another shard."""
+    conn = source.connect()
+    try:
+        conn.execute("ATTACH DATABASE ? AS target", (target.dbname,))
+        with conn:
+            conn.execute(
+                "INSERT INTO target.exercisePopularity(week, exerciseID, sessionCount) "
+                "SELECT week, exerciseID, sessionCount FROM main.exercisePopularity WHERE true "
+                "ON CONFLICT(week, exerciseID) DO UPDATE SET sessionCount = sessionCount + excluded.sessionCount"
+            )
+            conn.execute("DELETE FROM main.exercisePopularity")
+    finally:
+        conn.close()
+
+
+def remove_database(path):
+    """Delete a database file together with its journal files."""
+    for name in (path, path + '-journal', path + '-wal', path + '-shm'):
+        if os.path.exists(name):
+            os.remove(name)
+
+
+def current_shard_count(dbname):
+    """Return the number of shards referenced by a main database's directory."""
+    create_directory(dbname)
+    conn = db.connect(dbname)
+    try:
+        row = conn.execute("SELECT MAX(shard) FROM userDirectory").fetchone()
+    finally:
+        conn.close()
+    return 0 if row[0] is None else row[0] + 1
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Rebalance users across shard databases.")
+    parser.add_argument('--database', default=os.getenv('DATABASE', 'fitness.db'))
+    parser.add_argument('--shards', type=int, required=True, help="new number of shards")
+    args = parser.parse_args()
+
+    existing = current_shard_count(args.database)
+    storage = ShardedStorage(args.database, max(existing, args.shards))
+    storage.initialize()
+    dropped = [shard.dbname for shard in storage.shards[args.shards:]]
+    moved = storage.rebalance(args.shards)
+    print(f"Moved {moved} users from {existing} to {args.shards} shards.")
+    for dbname in dropped:
+        print(f"Removed {dbname}")
@@ -0,0 +1,710 @@
+"""
+Storage backends for the Fitness Application
+
+All user, exercise and workout-session queries go through a Storage object
+instead of opening `fitness.db` directly. The backend is picked from the
+`DATABASE` config value:
+
+- a file path (default `fitness.db`) uses SQLiteStorage
+- `memory:<name>` uses MemoryStorage, a shared-cache in-memory database that
+  lives for as long as the storage object does (tests and benchmarks)
+
+Setting `DATABASE_SHARDS` to N > 0 wraps the backend in a ShardedStorage
+(see sharding.py) that spreads user-owned rows over N databases.
+"""
+
+import sqlite3
+from flask import current_app
+
+import db
+
+MEMORY_PREFIX = 'memory:'
+# Size of the sessionID range owned by each shard in sharded mode
+SESSION_ID_SPAN = 1 << 40
+# Rows fetched per batch by the iter_* methods
+ITER_BATCH_SIZE = 500
+
+
+class Storage:
+    """Base storage backend. Subclasses only decide where `dbname` points."""
+
+    # first sessionID of this database's range; only set on shards
+    session_id_base = None
+    # highest sessionID of that range held by any shard, see ShardedStorage.reserve_session_ids
+    session_id_floor = None
+
+    def __init__(self, dbname):
+        self.dbname = dbname
+
+    def connect(self):
+        """Return a new connection to the backing database."""
+        return db.connect(self.dbname)
+
+    def connect_for_user(self, user_id):
+        """Return a connection to the database holding `user_id`'s user and session rows."""
+        return self.connect()
+
+    def partitions(self):
+        """Return the storages that together hold every user and session row."""
+        return [self]
+
+    def databases(self):
+        """Return the names of every database file (or URI) behind this storage."""
+        return [self.dbname]
+
+    def initialize(self):
+        """Create the schema and seed the default exercises."""
+        return db.initialize_database(self.dbname)
+
+    def reset(self):
+        """Delete all rows from every table."""
+        db.reset_database(self.dbname)
+
+    def snapshot(self):
+        """Copy every database behind this storage into private in-memory databases.
+
+        Returns the open connections, to be passed to `restore`; close them
+        when done. Uses the SQLite online backup API, so schema, indexes and
+        triggers come along page by page without replaying migrations.
+        """
+        snapshot = []
+        for name in self.databases():
+            source = db.connect(name)
+            target = sqlite3.connect(':memory:', check_same_thread=False)
+            try:
+                source.backup(target)
+            finally:
+                source.close()
+            snapshot.append(target)
+        return snapshot
+
+    def restore(self, snapshot):
+        """Overwrite every database behind this storage with a `snapshot`."""
+        names = self.databases()
+        if len(names) != len(snapshot):
+            raise ValueError(f"snapshot has {len(snapshot)} databases, storage has {len(names)}")
+        for name, source in zip(names, snapshot):
+            target = db.connect(name)
+            try:
+                source.backup(target)
+            finally:
+                target.close()
+
+    def close(self):
+        pass
+
+    def _fetchone(self, query, params=()):
+        conn = self.connect()
+        try:
+            return conn.execute(query, params).fetchone()
+        finally:
+            conn.close()
+
+    def _fetchall(self, query, params=()):
+        conn = self.connect()
+        try:
+            return conn.execute(query, params).fetchall()
+        finally:
+            conn.close()
+
+    def _iterate(self, query, params=(), key=('rowid',), batch_size=ITER_BATCH_SIZE, connect=None):
+        """Yield the rows of a query in `key` order, reading `batch_size` rows per query.
+
+        `query` selects the (unique together) `key` columns first, has no
+        ORDER BY and joins its WHERE conditions with AND. Each batch is its
+        own short query on a fresh connection, continuing after the last key
+        read (keyset pagination), so no cursor or read transaction stays
+        open in between, e.g. while a streamed response waits on a slow
+        client and a writer needs the database.
+        """
+        connect = connect or self.connect
+        columns = ', '.join(key)
+        after = f"({columns}) > ({', '.join('?' for _ in key)})"
+        joiner = ' AND ' if ' WHERE ' in query else ' WHERE '
+        last = None
+        while True:
+            sql, args = query, list(params)
+            if last is not None:
+                sql += joiner + after
+                args += last
+            conn = connect()
+            try:
+                rows = conn.execute(f"{sql} ORDER BY {columns} LIMIT ?", args + [batch_size]).fetchall()
+            finally:
+                conn.close()
+            yield from rows
+            if len(rows) < batch_size:
+                return
+            last = list(rows[-1][:len(key)])
+
+    def _execute(self, query, params=()):
+        conn = self.connect()
+        try:
+            cursor = conn.execute(query, params)
+            conn.commit()
+            return cursor
+        finally:
+            conn.close()
+
+    # ---------------- users ----------------
+
+    def username_exists(self, username, exclude_user_id=None):
+        if exclude_user_id is None:
+            return self._fetchone("SELECT 1 FROM user WHERE username=?", (username,)) is not None
+        return self._fetchone("SELECT 1 FROM user WHERE username=? AND userID!=?",
+                              (username, exclude_user_id)) is not None
+
+    def email_exists(self, email, exclude_user_id=None):
+        if exclude_user_id is None:
+            return self._fetchone("SELECT 1 FROM user WHERE email=?", (email,)) is not None
+        return self._fetchone("SELECT 1 FROM user WHERE email=? AND userID!=?",
+                              (email, exclude_user_id)) is not None
+
+    def create_user(self, fields):
+        """Insert a user row from a column -> value dict and return its userID."""
+        columns = list(fields)
+        placeholders = ", ".join("?" for _ in columns)
+        cursor = self._execute(
+            f"INSERT INTO user ({', '.join(columns)}) VALUES ({placeholders})",
+            [fields[col] for col in columns]
+        )
+        return cursor.lastrowid
+
+    def update_user(self, user_id, fields):
+        """Update the given columns of a user row."""
+        set_clause = ", ".join(f"{col} = ?" for col in fields)
+        self._execute(f"UPDATE user SET {set_clause} WHERE userID=?",
+                      list(fields.values()) + [user_id])
+
+    def set_role(self, username, role):
+        """Set the role of an existing user; False if there is no such user.
+
+        Roles are only granted out of band (`python db.py --grant-admin`), never through the API.
+        """
+        user = self.find_user(username=username)
+        if not user:
+            return False
+        self.update_user(user['userID'], {'role': role})
+        return True
+
+    def get_login(self, username):
+        """Return (password, role, isActive, userID) for a username, or None."""
+        return self._fetchone(
+            "SELECT password, role, isActive, userID FROM user WHERE username=?", (username,)
+        )
+
+    def get_profile(self, user_id):
+        return self._fetchone(
+            "SELECT full_name, username, email, gender, height, weight, profilepic,"
+            " birth_date, fitness_goal, activity_level, isActive, role"
+            " FROM user WHERE userID=?",
+            (user_id,)
+        )
+
+    def get_account(self, user_id):
+        """Return (role, isActive) of a user, or None if the user does not exist."""
+        return self._fetchone("SELECT role, isActive FROM user WHERE userID=?", (user_id,))
+
+    def get_user_active(self, user_id):
+        """Return the isActive flag of a user, or None if the user does not exist."""
+        row = self._fetchone("SELECT isActive FROM user WHERE userID = ?", (user_id,))
+        return row[0] if row else None
+
+    def find_user(self, **criteria):
+        """Return the full user row matching one column (e.g. email=...) as a dict."""
+        (column, value), = criteria.items()
+        conn = self.connect()
+        conn.row_factory = sqlite3.Row
+        try:
+            row = conn.execute(f"SELECT * FROM user WHERE {column} = ?", (value,)).fetchone()
+            return dict(row) if row else None
+        finally:
+            conn.close()
+
+    def usernames(self, user_ids):
+        """Return {userID: username} for the given users."""
+        ids = list(user_ids)
+        if not ids:
+            return {}
+        placeholders = ", ".join("?" for _ in ids)
+        return dict(self._fetchall(f"SELECT userID, username FROM user WHERE userID IN ({placeholders})", ids))
+
+    def get_profilepic(self, user_id):
+        row = self._fetchone("SELECT profilepic FROM user WHERE userID=?", (user_id,))
+        return row[0] if row else None
+
+    # ---------------- profile picture thumbnails ----------------
+
+    def get_thumbnail(self, user_id, size):
+        """Return (image, sourceHash) of a user's thumbnail, or None."""
+        return self._fetchone("SELECT image, sourceHash FROM profileThumbnail WHERE userID=? AND size=?",
+                              (user_id, size))
+
+    def save_thumbnails(self, user_id, source_hash, images):
+        """Replace a user's thumbnails with {size: image bytes} made from the picture `source_hash`."""
+        conn = self.connect()
+        try:
+            with conn:
+                conn.execute("DELETE FROM profileThumbnail WHERE userID=?", (user_id,))
+                conn.executemany(
+                    "INSERT INTO profileThumbnail(userID, size, sourceHash, image) VALUES (?, ?, ?, ?)",
+                    [(user_id, size, source_hash, image) for size, image in images.items()]
+                )
+        finally:
+            conn.close()
+
+    def users_missing_thumbnails(self):
+        """Return the userIDs of users with a profile picture but no thumbnails."""
+        return [row[0] for row in self._fetchall(
+            "SELECT userID FROM user WHERE profilepic IS NOT NULL AND profilepic != '' "
+            "AND userID NOT IN (SELECT userID FROM profileThumbnail)"
+        )]
+
+    # ---------------- exercises ----------------
+
+    def list_exercises(self):
+        return self._fetchall(
+            "SELECT exerciseID, name, category, targetedBodyParts, requiredEquipment, videoURL FROM exercise"
+        )
+
+    def list_exercise_videos(self):
+        return self._fetchall("SELECT exerciseID, name, videoURL FROM exercise")
+
+    def iter_exercises(self):
+        """Like list_exercises, but yields the rows as they are read."""
+        return self._iterate(
+            "SELECT exerciseID, name, category, targetedBodyParts, requiredEquipment, videoURL FROM exercise",
+            key=('exerciseID',)
+        )
+
+    def iter_exercise_videos(self):
+        return self._iterate("SELECT exerciseID, name, videoURL FROM exercise", key=('exerciseID',))
+
+    def exercise_exists(self, exercise_id):
+        return self._fetchone("SELECT 1 FROM exercise WHERE exerciseID=?", (exercise_id,)) is not None
+
+    def exercise_names(self, exercise_ids):
+        """Return {exerciseID: name} for the given exercises."""
+        ids = list(exercise_ids)
+        if not ids:
+            return {}
+        placeholders = ", ".join("?" for _ in ids)
+        return dict(self._fetchall(f"SELECT exerciseID, name FROM exercise WHERE exerciseID IN ({placeholders})", ids))
+
+    def clear_exercises(self):
+        self._execute("DELETE FROM exercise")
+
+    # ---------------- workout sessions ----------------
+
+    def create_session(self, user_id, date, duration, posture_accuracy, exercise_id=None):
+        return self._insert_session({
+            'date': date, 'duration': duration, 'postureAccuracy': posture_accuracy, 'userID': user_id,
+            'exerciseID': exercise_id
+        })
+
+    def _insert_session(self, fields):
+        columns = ", ".join(fields)
+        placeholders = ", ".join("?" for _ in fields)
+        values = list(fields.values())
+        if self.session_id_base is None:
+            query = f"INSERT INTO workoutSession({columns}) VALUES({placeholders})"
+        else:
+            # allocate from this shard's own range so sessionIDs stay unique across shards, and above
+            # the IDs of that range that rebalancing moved to other shards
+            base = self.session_id_base
+            floor = self.session_id_floor or base
+            query = (f"INSERT INTO workoutSession(sessionID, {columns}) "
+                     f"SELECT MAX(COALESCE(MAX(sessionID), ?), ?) + 1, {placeholders} FROM workoutSession "
+                     "WHERE sessionID >= ? AND sessionID < ?")
+            values = [base, floor] + values + [base, base + SESSION_ID_SPAN]
+        conn = self.connect()
+        try:
+            with conn:
+                session_id = conn.execute(query, values).lastrowid
+                if fields.get('exerciseID') is not None:
+                    conn.execute(
+                        "INSERT INTO exercisePopularity(week, exerciseID, sessionCount) "
+                        "VALUES (strftime('%Y-%W', ?), ?, 1) "
+                        "ON CONFLICT(week, exerciseID) DO UPDATE SET sessionCount = sessionCount + 1",
+                        (fields['date'], fields['exerciseID'])
+                    )
+            return session_id
+        finally:
+            conn.close()
+
+    def get_session(self, user_id, session_id):
+        """Return (sessionID, date, duration, postureAccuracy) of a user's session, or None."""
+        return self._fetchone(
+            "SELECT sessionID, date, duration, postureAccuracy FROM workoutSession WHERE sessionID=? AND userID=?",
+            (session_id, user_id)
+        )
+
+    def get_session_start(self, user_id, session_id):
+        """Return (date, closedAt) of a user's session, or None."""
+        return self._fetchone(
+            "SELECT date, closedAt FROM workoutSession WHERE sessionID=? AND userID=?", (session_id, user_id)
+        )
+
+    def close_session(self, user_id, session_id, fields):
+        """Write the final `fields` (closedAt among them) of an open session.
+
+        Returns False if the session is missing or was already closed.
+        """
+        set_clause = ", ".join(f"{col} = ?" for col in fields)
+        return self._execute(
+            f"UPDATE workoutSession SET {set_clause} WHERE sessionID=? AND userID=? AND closedAt IS NULL",
+            list(fields.values()) + [session_id, user_id]
+        ).rowcount > 0
+
+    def update_session(self, user_id, session_id, fields):
+        set_clause = ", ".join(f"{col} = ?" for col in fields)
+        self._execute(f"UPDATE workoutSession SET {set_clause} WHERE sessionID=? AND userID=?",
+                      list(fields.values()) + [session_id, user_id])
+
+    def delete_session(self, user_id, session_id):
+        """Delete a user's session; delta sync reports it through a tombstone.
+
+        The session no longer counts towards exercisePopularity.
+        """
+        conn = self.connect()
+        try:
+            with conn:
+                row = conn.execute("DELETE FROM workoutSession WHERE sessionID=? AND userID=? "
+                                   "RETURNING date, exerciseID", (session_id, user_id)).fetchone()
+                if row and row[1] is not None:
+                    conn.execute(
+                        "UPDATE exercisePopularity SET sessionCount = sessionCount - 1 "
+                        "WHERE week=strftime('%Y-%W', ?) AND exerciseID=? AND sessionCount > 0", row
+                    )
+            return row is not None
+        finally:
+            conn.close()
+
+    def list_sessions(self, user_id, since=None, until=None):
+        """Return a user's live sessions, optionally limited to since <= date < until."""
+        return self._fetchall(*self._sessions_query(user_id, since, until))
+
+    def list_exercise_sessions(self, user_id, exercise_id, before=None, limit=10, before_id=None):
+        """Return a user's latest sessions of one exercise, newest first.
+
+        Keyset paginated on (date, sessionID): only sessions before the
+        `before` date, or on it with a sessionID below `before_id`.
+        """
+        query = ("SELECT sessionID, date, duration, postureAccuracy FROM workoutSession "
+                 "WHERE userID=? AND exerciseID=?")
+        params = [user_id, exercise_id]
+        if before and before_id is not None:
+            query += " AND (date < ? OR (date = ? AND sessionID < ?))"
+            params += [before, before, before_id]
+        elif before:
+            query += " AND date < ?"
+            params.append(before)
+        return self._fetchall(query + " ORDER BY date DESC, sessionID DESC LIMIT ?", params + [limit])
+
+    def recent_sessions(self, user_id, limit=50):
+        """Return (exerciseID, age in days, postureAccuracy) of a user's latest sessions with an exercise."""
+        # session dates are local time
+        return self._fetchall(
+            "SELECT exerciseID, julianday('now', 'localtime') - julianday(date), postureAccuracy "
+            "FROM workoutSession WHERE userID=? AND exerciseID IS NOT NULL ORDER BY date DESC LIMIT ?",
+            (user_id, limit)
+        )
+
+    def popular_exercises(self, week, limit=10):
+        """Return (exerciseID, sessionCount) of the most started exercises of a week ('YYYY-WW')."""
+        return self._fetchall(
+            "SELECT exerciseID, sessionCount FROM exercisePopularity WHERE week=? "
+            "ORDER BY sessionCount DESC, exerciseID LIMIT ?",
+            (week, limit)
+        )
+
+    def iter_sessions(self, user_id, since=None, until=None):
+        """Like list_sessions, but yields the rows as they are read, oldest first."""
+        # the keyset (date, sessionID) goes first; (userID, date) indexes it with the rowid
+        query, params = self._sessions_query(user_id, since, until, "date, sessionID, duration, postureAccuracy")
+        rows = self._iterate(query, params, key=('date', 'sessionID'))
+        return ((session_id, date, duration, accuracy) for date, session_id, duration, accuracy in rows)
+
+    def iter_sessions_between(self, since, until):
+        """Yield (week, userID, duration, postureAccuracy) of every session in [since, until), week as 'YYYY-WW'."""
+        rows = self._iterate(
+            "SELECT sessionID, strftime('%Y-%W', date), userID, duration, postureAccuracy FROM workoutSession "
+            "WHERE date >= ? AND date < ?", (since, until), key=('sessionID',)
+        )
+        return (row[1:] for row in rows)
+
+    def _sessions_query(self, user_id, since, until, columns="sessionID, date, duration, postureAccuracy"):
+        query = f"SELECT {columns} FROM workoutSession WHERE userID=?"
+        params = [user_id]
+        if since:
+            query += " AND date >= ?"
+            params.append(since)
+        if until:
+            query += " AND date < ?"
+            params.append(until)
+        return query, params
+
+    # ---------------- leaderboard ----------------
+
+    def leaderboard_durations(self, week):
+        """Return (userID, totalDuration) of a week's users with any duration, highest first."""
+        return self._fetchall("SELECT userID, totalDuration FROM leaderboardScore WHERE week=? AND totalDuration > 0 "
+                              "ORDER BY totalDuration DESC", (week,))
+
+    def leaderboard_accuracies(self, week, min_scored_sessions):
+        """Return (userID, avgAccuracy) of a week's users with enough scored sessions, highest first."""
+        return self._fetchall("SELECT userID, avgAccuracy FROM leaderboardScore WHERE week=? AND scoredSessions >= ? "
+                              "ORDER BY avgAccuracy DESC", (week, min_scored_sessions))
+
+    def add_leaderboard_score(self, date, user_id, duration, accuracy_sum, scored_sessions):
+        """Add deltas to a user's score for the week of `date`.
+
+        Returns the new (week, totalDuration, avgAccuracy, scoredSessions).
+        """
+        conn = self.connect()
+        try:
+            with conn:
+                return conn.execute(
+                    "INSERT INTO leaderboardScore(week, userID, totalDuration, accuracySum, scoredSessions, avgAccuracy) "
+                    "VALUES (strftime('%Y-%W', ?1), ?2, ?3, ?4, ?5, CASE WHEN ?5 > 0 THEN ?4 / ?5 END) "
+                    "ON CONFLICT(week, userID) DO UPDATE SET "
+                    "totalDuration = totalDuration + excluded.totalDuration, "
+                    "accuracySum = accuracySum + excluded.accuracySum, "
+                    "scoredSessions = scoredSessions + excluded.scoredSessions, "
+                    "avgAccuracy = CASE WHEN scoredSessions + excluded.scoredSessions > 0 "
+                    "THEN (accuracySum + excluded.accuracySum) / (scoredSessions + excluded.scoredSessions) END "
+                    "RETURNING week, totalDuration, avgAccuracy, scoredSessions",
+                    (date, user_id, duration, accuracy_sum, scored_sessions)
+                ).fetchone()
+        finally:
+            conn.close()
+
+    def replace_leaderboard_weeks(self, weeks, scores):
+        """Replace the scores of `weeks`; `scores` maps (week, userID) to (totalDuration, accuracySum, scoredSessions)."""
+        conn = self.connect()
+        try:
+            with conn:
+                conn.executemany("DELETE FROM leaderboardScore WHERE week=?", [(week,) for week in weeks])
+                conn.executemany(
+                    "INSERT INTO leaderboardScore(week, userID, totalDuration, accuracySum, scoredSessions, avgAccuracy) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    [(week, user_id, total, acc_sum, scored, acc_sum / scored if scored else None)
+                     for (week, user_id), (total, acc_sum, scored) in scores.items()]
+                )
+        finally:
+            conn.close()
+
+    def purge_leaderboard_weeks(self, oldest):
+        """Delete the scores of weeks before `oldest` ('YYYY-WW'). Returns the number of rows removed."""
+        return self._execute("DELETE FROM leaderboardScore WHERE week < ?", (oldest,)).rowcount
+
+    # ---------------- rate limit buckets ----------------
+
+    def replace_rate_limit_buckets(self, rows):
+        """Replace every stored bucket with `rows` of (bucket, tokens, updatedAt)."""
+        conn = self.connect()
+        try:
+            with conn:
+                conn.execute("DELETE FROM rateLimitBucket")
+                conn.executemany("INSERT INTO rateLimitBucket(bucket, tokens, updatedAt) VALUES (?, ?, ?)", rows)
+        finally:
+            conn.close()
+
+    def list_rate_limit_buckets(self):
+        """Return (bucket, tokens, updatedAt) of every stored bucket."""
+        return self._fetchall("SELECT bucket, tokens, updatedAt FROM rateLimitBucket")
+
+    # ---------------- content ----------------
+
+    def list_content(self, content_type=None, before=None, limit=20):
+        """Return (contentID, type, title, description) of content before `before`, newest first."""
+        query = "SELECT contentID, type, title, description FROM content"
+        where, params = [], []
+        if content_type:
+            where.append("type=?")
+            params.append(content_type)
+        if before:
+            where.append("contentID < ?")
+            params.append(before)
+        if where:
+            query += " WHERE " + " AND ".join(where)
+        return self._fetchall(query + " ORDER BY contentID DESC LIMIT ?", params + [limit])
+
+    def create_content(self, fields):
+        """Insert a content row from a column -> value dict and return its contentID."""
+        columns = list(fields)
+        return self._execute(
+            f"INSERT INTO content ({', '.join(columns)}) VALUES ({', '.join('?' for _ in columns)})",
+            [fields[col] for col in columns]
+        ).lastrowid
+
+    def update_content(self, content_id, fields):
+        """Update the given columns of a content row; False if there is no such row."""
+        set_clause = ", ".join(f"{col} = ?" for col in fields)
+        return self._execute(f"UPDATE content SET {set_clause} WHERE contentID=?",
+                             list(fields.values()) + [content_id]).rowcount > 0
+
+    def delete_content(self, content_id):
+        """Delete a content row; False if there is no such row."""
+        return self._execute("DELETE FROM content WHERE contentID=?", (content_id,)).rowcount > 0
+
+    # ---------------- issues ----------------
+
+    def create_issue(self, description, user_id, admin_id):
+        return self._execute("INSERT INTO issueForm(description, status, userID, adminID) VALUES (?, 'open', ?, ?)",
+                             (description, user_id, admin_id)).lastrowid
+
+    def list_issues(self, status, admin_id=None, after=0, limit=20):
+        """Return (issueID, description, status, userID, adminID) of issues of a status after `after`, oldest first."""
+        query = "SELECT issueID, description, status, userID, adminID FROM issueForm WHERE status=? AND issueID > ?"
+        params = [status, after]
+        if admin_id is not None:
+            query += " AND adminID=?"
+            params.append(admin_id)
+        return self._fetchall(query + " ORDER BY issueID LIMIT ?", params + [limit])
+
+    def list_user_issues(self, user_id, before=None, limit=20):
+        """Like list_issues, but a user's issues before `before`, newest first."""
+        query = "SELECT issueID, description, status, userID, adminID FROM issueForm WHERE userID=?"
+        params = [user_id]
+        if before:
+            query += " AND issueID < ?"
+            params.append(before)
+        return self._fetchall(query + " ORDER BY issueID DESC LIMIT ?", params + [limit])
+
+    def set_issue_status(self, issue_ids, status, sources, assign=None, take=None):
+        """Move the issues whose status is in `sources` to `status` in one statement.
+
+        `assign` sets adminID; `take` sets it only on unassigned (adminID 0) issues.
+        Returns [(issueID, userID)] of the issues that moved.
+        """
+        sets, params = ["status=?"], [status]
+        if assign is not None:
+            sets.append("adminID=?")
+            params.append(assign)
+        elif take is not None:
+            sets.append("adminID = CASE WHEN adminID = 0 THEN ? ELSE adminID END")
+            params.append(take)
+        id_marks = ", ".join("?" for _ in issue_ids)
+        status_marks = ", ".join("?" for _ in sources)
+        conn = self.connect()
+        try:
+            with conn:
+                return conn.execute(
+                    f"UPDATE issueForm SET {', '.join(sets)} "
+                    f"WHERE issueID IN ({id_marks}) AND status IN ({status_marks}) RETURNING issueID, userID",
+                    params + list(issue_ids) + list(sources)
+                ).fetchall()
+        finally:
+            conn.close()
+
+    # ---------------- refresh tokens ----------------
+
+    def save_refresh_token(self, token_hash, user_id, family_id, expires_at):
+        self._execute("INSERT INTO refreshToken(tokenHash, userID, familyID, expiresAt) VALUES (?, ?, ?, ?)",
+                      (token_hash, user_id, family_id, expires_at))
+
+    def get_refresh_token(self, token_hash):
+        """Return (userID, familyID, expiresAt, revokedAt) of a refresh token, or None."""
+        return self._fetchone("SELECT userID, familyID, expiresAt, revokedAt FROM refreshToken WHERE tokenHash=?",
+                              (token_hash,))
+
+    def revoke_refresh_token(self, token_hash, revoked_at):
+        """Revoke one token unless it already was. Returns False if it was, so concurrent uses have one winner."""
+        return self._execute("UPDATE refreshToken SET revokedAt=? WHERE tokenHash=? AND revokedAt IS NULL",
+                             (revoked_at, token_hash)).rowcount > 0
+
+    def revoke_refresh_token_family(self, revoked_at, family_id=None, token_hash=None):
+        """Revoke every live token of a family, given by its ID or by one of its tokens."""
+        if family_id is None:
+            self._execute("UPDATE refreshToken SET revokedAt=? WHERE revokedAt IS NULL AND familyID = "
+                          "(SELECT familyID FROM refreshToken WHERE tokenHash=?)", (revoked_at, token_hash))
+        else:
+            self._execute("UPDATE refreshToken SET revokedAt=? WHERE familyID=? AND revokedAt IS NULL",
+                          (revoked_at, family_id))
+
+    def revoke_user_refresh_tokens(self, user_id, revoked_at):
+        """Revoke every live token of a user. Returns the number revoked."""
+        return self._execute("UPDATE refreshToken SET revokedAt=? WHERE userID=? AND revokedAt IS NULL",
+                             (revoked_at, user_id)).rowcount
+
+    def purge_refresh_tokens(self, expired_at):
+        """Delete tokens that expired by `expired_at`. Returns the number removed."""
+        return self._execute("DELETE FROM refreshToken WHERE expiresAt <= ?", (expired_at,)).rowcount
+
+    # ---------------- idempotency keys ----------------
+
+    def get_idempotency_key(self, scope):
+        """Return (fingerprint, status, body, mimetype, expiresAt) of a key; status is None while pending."""
+        return self._fetchone("SELECT fingerprint, status, body, mimetype, expiresAt FROM idempotencyKey "
+                              "WHERE scope=?", (scope,))
+
+    def claim_idempotency_key(self, scope, fingerprint, expires_at, now):
+        """Insert a pending key, replacing one that expired by `now`. Returns False if another holds it."""
+        conn = self.connect()
+        try:
+            with conn:
+                conn.execute("DELETE FROM idempotencyKey WHERE scope=? AND expiresAt <= ?", (scope, now))
+                return conn.execute(
+                    "INSERT OR IGNORE INTO idempotencyKey(scope, fingerprint, expiresAt) VALUES (?, ?, ?)",
+                    (scope, fingerprint, expires_at)
+                ).rowcount > 0
+        finally:
+            conn.close()
+
+    def save_idempotent_response(self, scope, status, body, mimetype, expires_at):
+        self._execute("UPDATE idempotencyKey SET status=?, body=?, mimetype=?, expiresAt=? WHERE scope=?",
+                      (status, body, mimetype, expires_at, scope))
+
+    def release_idempotency_key(self, scope):
+        """Delete a key that is still pending."""
+        self._execute("DELETE FROM idempotencyKey WHERE scope=? AND status IS NULL", (scope,))
+
+    def purge_idempotency_keys(self, expired_at):
+        """Delete keys that expired by `expired_at`. Returns the number removed."""
+        return self._execute("DELETE FROM idempotencyKey WHERE expiresAt <= ?", (expired_at,)).rowcount
+
+
+class SQLiteStorage(Storage):
+    """Storage backed by a SQLite database file."""
+
+
+class MemoryStorage(Storage):
+    """Storage backed by a named shared-cache in-memory SQLite database.
+
+    SQLite drops a shared in-memory database once its last connection closes,
+    so an anchor connection is held open until `close()` is called.
+    """
+
+    def __init__(self, name):
+        super().__init__(f"file:{name}?mode=memory&cache=shared")
+        self._anchor = db.connect(self.dbname)
+
+    def close(self):
+        if self._anchor is not None:
+            self._anchor.close()
+            self._anchor = None
+
+
+def create_storage(database, shards=0):
+    """Build the storage backend described by a `DATABASE` config value."""
+    if shards:
+        from sharding import ShardedStorage
+        return ShardedStorage(database, shards)
+    if database.startswith(MEMORY_PREFIX):
+        return MemoryStorage(database[len(MEMORY_PREFIX):])
+    return SQLiteStorage(database)
+
+
+def init_app(app):
+    """Create the app's storage backend from its config and initialize the schema."""
+    storage = create_storage(app.config.get('DATABASE', 'fitness.db'),
+                             app.config.get('DATABASE_SHARDS', 0))
+    app.extensions['storage'] = storage
+    storage.initialize()
+    return storage
+
+
+def get_storage():
+    """Return the storage backend of the current Flask app."""
+    return current_app.extensions['storage']
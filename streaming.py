@@ -0,0 +1,44 @@
+"""
+Streaming JSON responses
+
+Large collections (workout history, the exercise library) are written to the
+client batch by batch as they are read instead of being materialized as a
+row list, a list of dicts and a full JSON string first. Peak memory per
+request stays at one batch regardless of the result size.
+
+    return stream_json('exercises', (to_dict(row) for row in storage.iter_exercises()))
+
+Rows are read lazily once the response starts, after the view returned, so
+generators must not rely on the request context. The storage iter_* methods
+read each batch with its own short keyset-paged query, so a client that
+stops reading holds no cursor or lock that would block writers.
+"""
+
+import json
+from flask import Response
+
+# Items serialized into one chunk of the response body
+CHUNK_ITEMS = 200
+
+
+def json_array_object(key, items, fields=None, chunk_items=CHUNK_ITEMS):
+    """Yield the compact JSON text of {**fields, key: [items...]} in chunks."""
+    dumps = json.JSONEncoder(separators=(',', ':')).encode
+    head = dumps(fields or {})
+    yield (head[:-1] + ',' if fields else '{') + dumps(key) + ':['
+    chunk = []
+    separator = ''
+    for item in items:
+        chunk.append(dumps(item))
+        if len(chunk) >= chunk_items:
+            yield separator + ','.join(chunk)
+            separator = ','
+            chunk = []
+    if chunk:
+        yield separator + ','.join(chunk)
+    yield ']}'
+
+
+def stream_json(key, items, fields=None, status=200):
+    """Return a streamed application/json response of {**fields, key: [items...]}."""
+    return Response(json_array_object(key, items, fields), status=status, mimetype='application/json')
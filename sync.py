@@ -0,0 +1,136 @@
+"""
+Delta sync for workout history
+
+Every insert or update of a `workoutSession` row stamps it with the next value
+of a per-database change sequence (`changeSeq`, maintained by triggers in
+db.createDB) and every delete leaves a row in `workoutTombstone`. Clients keep
+the opaque `token` of their last sync and call
+
+    GET /workoutHistory/changes?since=<token>
+
+to receive only the sessions inserted or modified since then plus the IDs of
+deleted sessions, served from the (userID, changeSeq) indexes. Without `since`
+(or with a token older than the retained tombstones) the full live history is
+returned with `reset: true` and the client replaces its copy.
+
+A full resync is pinned to the change sequence `high` at its start and pages
+through the sessions with changeSeq <= high on its own cursor; until it is
+done the token reads `high:after`. Its last page returns `high` (never below
+the purge horizon), so the next call is a delta that picks up whatever
+changed while the resync was paged.
+
+Archived sessions are not part of sync: a resync returns the live sessions
+only, and sessions moved to the archive are not reported as deleted either.
+Clients read them from /workoutHistory.
+"""
+
+import time
+from flask import Blueprint, request, jsonify
+
+from security import token_required
+from storage import get_storage
+
+sync_bp = Blueprint('sync', __name__)
+
+DEFAULT_LIMIT = 500
+MAX_LIMIT = 1000
+
+
+def parse_token(token):
+    """Return (change sequence, resync cursor) of a sync token: (0, None) for none.
+
+    The cursor is only set while a full resync is paged ('high:after').
+    """
+    if not token:
+        return 0, None
+    seq, resync, after = token.partition(':')
+    seq = int(seq)
+    after = int(after) if resync else None
+    if seq < 0 or (after is not None and after < 0):
+        raise ValueError(token)
+    return seq, after
+
+
+def list_changes(storage, user_id, since=0, limit=DEFAULT_LIMIT, after=None):
+    """Return the changes of a user's sessions after change sequence `since`.
+
+    The result holds `changes` (sessions as dicts), `deleted` (sessionIDs),
+    the `token` to pass as `since` next time, `hasMore` when the page was cut
+    at `limit`, and `reset` when the client has to drop its copy first.
+    With `after`, continue a full resync pinned at `since`.
+    """
+    conn = storage.connect_for_user(user_id)
+    try:
+        seq, purged = conn.execute("SELECT seq, purgedSeq FROM syncState").fetchone()
+        # a resync whose tombstone window was purged meanwhile starts over
+        reset = since == 0 or since < purged
+        resync = reset or after is not None
+        if resync:
+            # full sync: current rows only, deletes before it do not matter
+            if reset:
+                since, after = max(seq, purged), 0
+            rows = conn.execute(
+                "SELECT changeSeq, sessionID, date, duration, postureAccuracy, 0 FROM workoutSession "
+                "WHERE userID=? AND changeSeq > ? AND changeSeq <= ? ORDER BY changeSeq LIMIT ?",
+                (user_id, after, since, limit + 1)
+            ).fetchall()
+        else:
+            rows = conn.execute(
+                "SELECT changeSeq, sessionID, date, duration, postureAccuracy, 0 FROM workoutSession "
+                "WHERE userID=? AND changeSeq > ? "
+                "UNION ALL "
+                "SELECT changeSeq, sessionID, NULL, NULL, NULL, 1 FROM workoutTombstone "
+                "WHERE userID=? AND changeSeq > ? "
+                "ORDER BY 1 LIMIT ?",
+                (user_id, since, user_id, since, limit + 1)
+            ).fetchall()
+    finally:
+        conn.close()
+
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    changes = [
+        {'sessionID': sid, 'date': dt, 'duration': dur, 'postureAccuracy': pa}
+        for (seq, sid, dt, dur, pa, deleted) in rows if not deleted
+    ]
+    deleted = [sid for (seq, sid, dt, dur, pa, gone) in rows if gone]
+    if resync:
+        token = f'{since}:{rows[-1][0]}' if has_more else str(since)
+    else:
+        token = str(rows[-1][0] if rows else since)
+    return {'changes': changes, 'deleted': deleted, 'token': token,
+            'hasMore': has_more, 'reset': reset}
+
+
+def purge_tombstones(storage, retention_days, now=None):
+    """Delete tombstones older than `retention_days`. Returns the number removed.
+
+    Clients whose token is older than the purge horizon get a full resync.
+    """
+    cutoff = int(((now or time.time()) - retention_days * 86400) * 1000)
+    removed = 0
+    for partition in storage.partitions():
+        conn = partition.connect()
+        try:
+            with conn:
+                removed += conn.execute("DELETE FROM workoutTombstone WHERE changeSeq < ?", (cutoff,)).rowcount
+                conn.execute("UPDATE syncState SET purgedSeq = MAX(purgedSeq, ?)", (cutoff,))
+        finally:
+            conn.close()
+    return removed
+
+
+@sync_bp.route('/workoutHistory/changes', methods=['GET'])
+@token_required
+def workout_history_changes(current_user_id):
+    """Sessions changed or deleted since the client's last sync token."""
+    try:
+        since, after = parse_token(request.args.get('since'))
+        limit = int(request.args.get('limit', DEFAULT_LIMIT))
+        if not 1 <= limit <= MAX_LIMIT:
+            raise ValueError(limit)
+    except ValueError:
+        return jsonify({'error': f'since must be a sync token and limit between 1 and {MAX_LIMIT}'}), 400
+
+    result = list_changes(get_storage(), current_user_id, since, limit, after)
+    return jsonify(dict(result, userID=current_user_id)), 200
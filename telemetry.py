@@ -0,0 +1,285 @@
+"""
+Posture telemetry ingestion
+
+Clients stream the per-frame posture scores (0.0 - 1.0) of an open workout
+session to POST /workoutSession/<id>/posture, either as one long chunked
+request or as many small ones. Samples are aggregated in memory with NumPy
+and never stored individually. POST /workoutSession/<id>/close writes the
+mean score to `postureAccuracy`, the time since the session started to
+`duration` and marks the session closed (`closedAt`); later samples or
+closes of that session get 409.
+
+Request bodies are either little-endian float32 values
+(Content-Type: application/octet-stream) or decimal numbers separated by
+newlines, spaces or commas.
+"""
+
+import threading
+import time
+from datetime import datetime
+
+from flask import Blueprint, request, jsonify
+
+import events
+import leaderboard
+import recommendations
+from security import token_required
+from storage import get_storage
+
+telemetry_bp = Blueprint('telemetry', __name__)
+
+CHUNK_SIZE = 64 * 1024
+# Length of the downsampled series kept per session
+MAX_POINTS = 1024
+# Raw samples averaged into one point of the series before any compaction
+BUCKET_SIZE = 30
+
+
+def _np():
+    """NumPy, imported on first use so that app start-up does not pay for it."""
+    import numpy
+    return numpy
+
+
+class PostureAggregator:
+    """Running aggregate and bounded downsampled series of one session's samples."""
+
+    def __init__(self, user_id, started, bucket_size=BUCKET_SIZE, max_points=MAX_POINTS):
+        self.user_id = user_id
+        self.started = started
+        self.last_seen = time.monotonic()
+        self.count = 0
+        self.total = 0.0
+        self.minimum = None
+        self.maximum = None
+        self.bucket_size = bucket_size
+        self.max_points = max_points
+        self.series = _np().empty(0)
+        self._partial = _np().empty(0)
+        # set under `lock` once the session was written back; no samples are taken after that
+        self.closed = False
+        self.lock = threading.Lock()
+
+    def add(self, samples):
+        np = _np()
+        samples = np.asarray(samples, dtype=np.float64)
+        samples = np.clip(samples[np.isfinite(samples)], 0.0, 1.0)
+        self.last_seen = time.monotonic()
+        if not samples.size:
+            return 0
+        self.count += samples.size
+        self.total += float(samples.sum())
+        low, high = float(samples.min()), float(samples.max())
+        self.minimum = low if self.minimum is None else min(self.minimum, low)
+        self.maximum = high if self.maximum is None else max(self.maximum, high)
+        self._downsample(samples)
+        return samples.size
+
+    def _downsample(self, samples):
+        np = _np()
+        pending = np.concatenate((self._partial, samples)) if self._partial.size else samples
+        whole = pending.size // self.bucket_size * self.bucket_size
+        if whole:
+            means = pending[:whole].reshape(-1, self.bucket_size).mean(axis=1)
+            self.series = np.concatenate((self.series, means))
+        self._partial = pending[whole:].copy()
+        # halve the resolution whenever the series outgrows its budget
+        while self.series.size > self.max_points:
+            even = self.series.size // 2 * 2
+            halved = self.series[:even].reshape(-1, 2).mean(axis=1)
+            self.series = np.concatenate((halved, self.series[even:]))
+            self.bucket_size *= 2
+
+    @property
+    def accuracy(self):
+        return self.total / self.count if self.count else 0.0
+
+
+class TelemetryRegistry:
+    """Aggregators of the sessions that are currently receiving telemetry."""
+
+    def __init__(self):
+        self._sessions = {}
+        self._lock = threading.Lock()
+
+    def open(self, session_id, user_id, started, is_open):
+        """Return the session's aggregator, creating it if `is_open()` still says so; else None.
+
+        `is_open` is asked under the lock: a close pops the aggregator only after
+        writing closedAt, so a request that read the row before the close cannot
+        start a second aggregator for it.
+        """
+        with self._lock:
+            aggregator = self._sessions.get(session_id)
+            if aggregator is None:
+                if not is_open():
+                    return None
+                aggregator = self._sessions[session_id] = PostureAggregator(user_id, started)
+            return aggregator
+
+    def get(self, session_id):
+        with self._lock:
+            return self._sessions.get(session_id)
+
+    def pop(self, session_id):
+        with self._lock:
+            return self._sessions.pop(session_id, None)
+
+    def idle(self, timeout):
+        """Return the IDs of sessions that have not received samples for `timeout` seconds."""
+        cutoff = time.monotonic() - timeout
+        with self._lock:
+            return [sid for sid, agg in self._sessions.items() if agg.last_seen < cutoff]
+
+    def __len__(self):
+        return len(self._sessions)
+
+
+registry = TelemetryRegistry()
+
+
+def parse_binary(chunks):
+    """Yield float32 sample arrays from a stream of byte chunks."""
+    leftover = b''
+    for chunk in chunks:
+        data = leftover + chunk
+        usable = len(data) // 4 * 4
+        leftover = data[usable:]
+        if usable:
+            yield _np().frombuffer(data[:usable], dtype='<f4')
+    if leftover:
+        raise ValueError('Binary body length must be a multiple of 4 bytes')
+
+
+def parse_text(chunks):
+    """Yield sample arrays from a stream of whitespace/comma separated numbers."""
+    leftover = b''
+    for chunk in chunks:
+        data = (leftover + chunk).replace(b',', b' ')
+        # keep a possibly cut-off number for the next chunk
+        cut = max(data.rfind(b' '), data.rfind(b'\n'), data.rfind(b'\r'), data.rfind(b'\t')) + 1
+        leftover = data[cut:]
+        if cut:
+            yield _np().array(data[:cut].split(), dtype=float)
+    if leftover.strip():
+        yield _np().array(leftover.split(), dtype=float)
+
+
+def read_chunks(stream, size=CHUNK_SIZE):
+    while True:
+        chunk = stream.read(size)
+        if not chunk:
+            return
+        yield chunk
+
+
+def format_duration(seconds):
+    seconds = max(int(seconds), 0)
+    return f"{seconds // 3600:02d}:{seconds % 3600 // 60:02d}:{seconds % 60:02d}"
+
+
+def parse_started(value):
+    """Start time of a session from its `date`, which older rows hold without a time."""
+    try:
+        return datetime.strptime(value, '%Y-%m-%d %H:%M:%S')
+    except ValueError:
+        return datetime.strptime(value, '%Y-%m-%d')
+
+
+def finish_session(storage, session_id, aggregator=None, now=None):
+    """Write the aggregated accuracy and elapsed duration of a session back to its row and close it.
+
+    Returns None if the session is not open (or was closed meanwhile).
+    """
+    aggregator = aggregator or registry.get(session_id)
+    if aggregator is None:
+        return None
+    now = now or datetime.now()
+    # samples are added under the same lock, so none land between the write and the close
+    with aggregator.lock:
+        if aggregator.closed:
+            return None
+        result = {
+            'postureAccuracy': round(aggregator.accuracy, 4),
+            'duration': format_duration((now - aggregator.started).total_seconds())
+        }
+        previous = storage.get_session(aggregator.user_id, session_id)
+        written = storage.close_session(aggregator.user_id, session_id,
+                                        dict(result, closedAt=now.strftime('%Y-%m-%d %H:%M:%S')))
+        aggregator.closed = True
+        # only dropped once the row says closed, so a concurrent request cannot reopen it
+        registry.pop(session_id)
+    if not written:
+        # closed meanwhile through another aggregator: its values and scores stand
+        return None
+    if previous:
+        leaderboard.record_session(storage, aggregator.user_id, previous[1], result['duration'],
+                                   result['postureAccuracy'], previous=(previous[2], previous[3]))
+    recommendations.invalidate_user(aggregator.user_id)
+    events.publish(aggregator.user_id, 'session.updated', sessionID=session_id)
+    return dict(result, samples=aggregator.count, postureSeries=aggregator.series.round(4).tolist())
+
+
+def close_idle_sessions(storage, timeout):
+    """Finish sessions whose clients stopped sending samples without closing them."""
+    closed = 0
+    for session_id in registry.idle(timeout):
+        if finish_session(storage, session_id):
+            closed += 1
+    return closed
+
+
+def _open_session(current_user_id, session_id):
+    """Return (aggregator, None), or (None, error response) if the session is missing or closed."""
+    row = get_storage().get_session_start(current_user_id, session_id)
+    if not row:
+        return None, (jsonify({'error': 'Workout session not found'}), 404)
+    closed = (jsonify({'error': 'Workout session is closed'}), 409)
+    if row[1]:
+        return None, closed
+
+    def is_open():
+        current = get_storage().get_session_start(current_user_id, session_id)
+        return bool(current) and not current[1]
+
+    aggregator = registry.open(session_id, current_user_id, parse_started(row[0]), is_open)
+    return (aggregator, None) if aggregator else (None, closed)
+
+
+@telemetry_bp.route('/workoutSession/<int:session_id>/posture', methods=['POST'])
+@token_required
+def ingest_posture(current_user_id, session_id):
+    """Accept a (chunked) stream of posture samples for an open session."""
+    aggregator, error = _open_session(current_user_id, session_id)
+    if error:
+        return error
+
+    parse = parse_binary if request.mimetype == 'application/octet-stream' else parse_text
+    received = 0
+    try:
+        for samples in parse(read_chunks(request.stream)):
+            with aggregator.lock:
+                if aggregator.closed:
+                    return jsonify({'error': 'Workout session is closed', 'received': received}), 409
+                received += aggregator.add(samples)
+    except ValueError as e:
+        return jsonify({'error': f'Invalid posture samples: {e}', 'received': received}), 400
+
+    return jsonify({
+        'sessionID': session_id,
+        'received': received,
+        'totalSamples': aggregator.count
+    }), 202
+
+
+@telemetry_bp.route('/workoutSession/<int:session_id>/close', methods=['POST'])
+@token_required
+def close_session(current_user_id, session_id):
+    """Close a session and store its final posture accuracy and duration."""
+    aggregator, error = _open_session(current_user_id, session_id)
+    if error:
+        return error
+    result = finish_session(get_storage(), session_id, aggregator)
+    if result is None:
+        return jsonify({'error': 'Workout session is closed'}), 409
+    return jsonify(dict(result, sessionID=session_id)), 200
@@ -1,36 +1,49 @@
-import sqlite3
+import os
 import pytest
-import db as db_module
-from main import app as flask_app
+
+# run the app against a shared in-memory database instead of fitness.db,
+# one per pytest-xdist worker so parallel runs (-n auto) stay isolated
+os.environ.setdefault('DATABASE', f"memory:fitness_test_{os.getenv('PYTEST_XDIST_WORKER', 'main')}")
+# cheap scrypt parameters keep registration fast in tests
+os.environ.setdefault('PASSWORD_SCRYPT_N', '1024')
+
+from main import app as flask_app, startup
+import cache
+from storage import get_storage
+
+startup(background_jobs=False)
+
+@pytest.fixture
+def storage():
+    with flask_app.app_context():
+        yield get_storage()
 
 @pytest.fixture(scope='session')
-def test_db_path(tmp_path_factory):
-    # one SQLite file for the session
-    db_file = tmp_path_factory.mktemp("data") / "fitness_test.db"
-    # initialize tables + default exercises once
-    db_module.initialize_database(str(db_file))
-    return str(db_file)
+def template():
+    """
+    Snapshot of the freshly seeded database (schema + default exercises),
+    built once per run. Tests that need a bigger data set can seed one and
+    take their own `storage.snapshot()` in a module-scoped fixture.
+    """
+    with flask_app.app_context():
+        store = get_storage()
+        store.reset()
+        store.initialize()
+        snapshot = store.snapshot()
+    yield snapshot
+    for conn in snapshot:
+        conn.close()
 
 @pytest.fixture(autouse=True)
-def reset_db_between_tests(monkeypatch, test_db_path):
+def reset_db_between_tests(storage, template):
     """
-    Monkeypatch sqlite3.connect to always use our test_db_path,
-    then BEFORE each test wipe & re‐seed it, and AFTER each test wipe it again.
+    BEFORE each test restore the seeded template over the in-memory database
+    with the SQLite backup API (no migrations, no DELETEs), so nothing a
+    previous test wrote is left behind.
     """
-    # patch all sqlite3.connect calls to use our single file
-    orig = sqlite3.connect
-    def connect_override(path, *args, **kwargs):
-        return orig(test_db_path, *args, **kwargs)
-    monkeypatch.setattr(sqlite3, 'connect', connect_override)
-
-    # before test: clear everything & re‐insert default exercises
-    db_module.reset_database(test_db_path)
-    db_module.initialize_database(test_db_path)
-
-    yield
-
-    # after test: clear it so no data leaks into the next test
-    db_module.reset_database(test_db_path)
+    storage.restore(template)
+    cache.clear_all()
+    flask_app.extensions['ratelimit'].reset()
 
 @pytest.fixture
 def client():
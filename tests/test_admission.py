@@ -0,0 +1,64 @@
+import threading
+import pytest
+from admission import Admission, Pool, parse_limits, parse_routes
+from main import app as flask_app
+from metrics import metrics
+from test_api import register_and_get_token, REGISTER_PAYLOAD
+
+@pytest.fixture
+def admission():
+    return flask_app.extensions["admission"]
+
+def test_routes_map_to_pools(admission):
+    assert admission.pool_for("user.login").name == "passwords"
+    assert admission.pool_for("auth.google_auth").name == "google"
+    assert admission.pool_for("user.check_user").name == "default"
+    assert admission.pool_for(None).name == "default"
+
+def test_full_pool_sheds_load_without_starving_reads(client, admission):
+    user_id, token = register_and_get_token(client)
+    pool = admission.pools["passwords"]
+    held = [pool.acquire(0) for _ in range(pool.concurrency)]
+    saved_queue, pool.queue = pool.queue, 0
+    try:
+        res = client.post("/login", json={"username": REGISTER_PAYLOAD["username"],
+                                          "password": REGISTER_PAYLOAD["password"]})
+        assert res.status_code == 503
+        assert res.headers["Retry-After"] == "1"
+        assert metrics.snapshot()["counters"]["admission.passwords.rejected"] >= 1
+
+        # reads use their own pool
+        res = client.get(f"/checkUser/{user_id}", headers={"Authorization": f"Bearer {token}"})
+        assert res.status_code == 200
+    finally:
+        pool.queue = saved_queue
+        for admitted in held:
+            assert admitted
+            pool.release()
+    assert metrics.gauge("admission.passwords.active") == 0
+
+def test_queued_request_waits_for_a_slot():
+    pool = Pool("test", 1, 1)
+    assert pool.acquire(0)
+    results = []
+    waiter = threading.Thread(target=lambda: results.append(pool.acquire(5)))
+    waiter.start()
+    while pool.waiting == 0:
+        pass
+    # the queue is full now
+    assert not pool.acquire(0)
+    pool.release()
+    waiter.join()
+    assert results == [True]
+    pool.release()
+
+def test_queue_wait_times_out():
+    pool = Pool("slow", 1, 1)
+    assert pool.acquire(0)
+    assert not pool.acquire(0.01)
+    assert metrics.snapshot()["counters"]["admission.slow.timeouts"] >= 1
+
+def test_config_parsing():
+    assert parse_limits("passwords=2:8, default=32") == {"passwords": (2, 8), "default": (32, 0)}
+    assert parse_routes("exercise.start_workout=writes") == {"exercise.start_workout": "writes"}
+    assert Admission({"passwords": (0, 0)}).pools["passwords"].acquire(0)
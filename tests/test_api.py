@@ -20,6 +20,23 @@ def register_and_get_token(client):
     data = res.get_json()
     return data["userID"], data["token"]
 
+def register_admin(client, storage, **overrides):
+    """Register a user, promote it through storage (the API never grants admin) and log in again."""
+    payload = dict(REGISTER_PAYLOAD, **overrides)
+    user_id = client.post("/register", json=payload).get_json()["userID"]
+    assert storage.set_role(payload["username"], "admin")
+    res = client.post("/login", json={"username": payload["username"], "password": payload["password"]})
+    return user_id, {"Authorization": f"Bearer {res.get_json()['token']}"}
+
+def test_register_ignores_client_role(client):
+    res = client.post("/register", json=dict(REGISTER_PAYLOAD, role="admin"))
+    assert res.status_code == 201
+    headers = {"Authorization": f"Bearer {res.get_json()['token']}"}
+    assert client.get("/userProfile", headers=headers).get_json()["role"] == "user"
+    assert client.get("/admin/issues", headers=headers).status_code == 403
+    assert client.post("/admin/content", headers=headers,
+                       json={"type": "tip", "title": "x", "description": "y"}).status_code == 403
+
 def test_register_and_login(client):
     user_id, token = register_and_get_token(client)
 
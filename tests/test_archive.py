@@ -0,0 +1,55 @@
+from datetime import datetime
+import archive
+from test_api import register_and_get_token
+
+NOW = datetime(2024, 9, 15)
+
+def seed_sessions(storage, user_id):
+    storage.create_session(user_id, "2024-01-10 08:00:00", "00:10:00", 0.5)
+    storage.create_session(user_id, "2024-01-20 08:00:00", "00:20:00", 0.7)
+    storage.create_session(user_id, "2024-02-05 08:00:00", "00:30:00", 0.9)
+    storage.create_session(user_id, "2024-09-01 08:00:00", "01:00:00", 1.0)
+
+def test_duration_seconds():
+    assert archive.duration_seconds("01:02:03") == 3723
+    assert archive.duration_seconds("05:00") == 300
+    assert archive.duration_seconds(90) == 90
+    assert archive.duration_seconds("n/a") == 0
+
+def test_archive_moves_old_months_and_keeps_stats(storage, client):
+    user_id, _ = register_and_get_token(client)
+    seed_sessions(storage, user_id)
+    before = archive.workout_stats(storage, user_id)
+
+    # 90 day horizon from 2024-09-15 -> everything before 2024-06-01 is archived
+    assert archive.archive_sessions(storage, 90, now=NOW) == 3
+    assert [row[1] for row in storage.list_sessions(user_id)] == ["2024-09-01 08:00:00"]
+    assert archive.workout_stats(storage, user_id) == before
+    assert before["sessionCount"] == 4
+    assert before["totalDuration"] == 7200
+
+    conn = storage.connect_for_user(user_id)
+    months = conn.execute("SELECT month, sessionCount FROM workoutArchive ORDER BY month").fetchall()
+    conn.close()
+    assert months == [("2024-01", 2), ("2024-02", 1)]
+
+    # a second run has nothing left to do
+    assert archive.archive_sessions(storage, 90, now=NOW) == 0
+
+def test_workout_history_reads_archive_only_for_old_ranges(storage, client):
+    user_id, token = register_and_get_token(client)
+    headers = {"Authorization": f"Bearer {token}"}
+    seed_sessions(storage, user_id)
+    archive.archive_sessions(storage, 90, now=NOW)
+
+    full = client.get("/workoutHistory", headers=headers).get_json()["workoutHistory"]
+    assert [s["date"][:10] for s in full] == ["2024-01-10", "2024-01-20", "2024-02-05", "2024-09-01"]
+
+    january = client.get("/workoutHistory?since=2024-01-15&until=2024-02-01", headers=headers)
+    assert [s["date"][:10] for s in january.get_json()["workoutHistory"]] == ["2024-01-20"]
+
+    bad = client.get("/workoutHistory?since=yesterday", headers=headers)
+    assert bad.status_code == 400
+
+    stats = client.get("/workoutStats", headers=headers).get_json()
+    assert stats["sessionCount"] == 4
@@ -0,0 +1,80 @@
+import io
+import json
+from catalog_import import import_catalog
+from search import facet_cache
+from test_api import REGISTER_PAYLOAD, register_admin
+
+CSV = """name,category,targetedBodyParts,requiredEquipment,videoURL
+Push Ups,Upper Body,"Chest, Triceps",None,https://example.com/pushups.mp4
+Squats,Lower Body,"Quads, Hamstrings, Glutes",None,https://example.com/squats.mp4
+,Core,Abs,None,
+Deadlift,Full Body,"Back, Glutes",Barbell,ftp://bad
+"""
+
+def test_import_csv_upserts_and_reports_errors(storage):
+    progress = []
+    summary = import_catalog(storage, io.StringIO(CSV), "csv", chunk_size=1,
+                             progress=lambda done, secs: progress.append(done))
+    assert summary["processed"] == 4
+    assert summary["inserted"] == 1        # Squats already exists and is updated instead
+    assert summary["updated"] == 1
+    assert summary["invalid"] == 2
+    assert [e["line"] for e in summary["errors"]] == [4, 5]
+    assert progress == [1, 2]
+
+    conn = storage.connect()
+    url = conn.execute("SELECT videoURL FROM exercise WHERE name='Squats'").fetchone()[0]
+    count = conn.execute("SELECT COUNT(*) FROM exercise WHERE name='Squats'").fetchone()[0]
+    conn.close()
+    assert url == "https://example.com/squats.mp4"
+    assert count == 1
+
+    # unchanged rows are not rewritten on a second run
+    again = import_catalog(storage, io.StringIO(CSV), "csv")
+    assert (again["inserted"], again["updated"]) == (0, 0)
+
+def test_import_invalidates_catalog_cache_once(storage):
+    facet_cache.set("key", "stale")
+    rows = "\n".join(json.dumps({"name": f"Ex {i}", "category": "Core", "targetedBodyParts": "Abs",
+                                 "requiredEquipment": "None"}) for i in range(250))
+    summary = import_catalog(storage, io.StringIO(rows), "ndjson", chunk_size=100)
+    assert summary["inserted"] == 250
+    assert facet_cache.get("key") is None
+
+def test_admin_import_endpoint(client, storage):
+    _, headers = register_admin(client, storage)
+    body = "\n".join([json.dumps({"name": "Burpees", "category": "Full Body",
+                                  "targetedBodyParts": "Legs, Chest", "requiredEquipment": "None"}),
+                      "not json"])
+    res = client.post("/admin/exercises/import", headers=headers, data=body,
+                      content_type="application/x-ndjson")
+    assert res.status_code == 200
+    summary = res.get_json()
+    assert summary["inserted"] == 1 and summary["invalid"] == 1
+
+    search = client.get("/exercises/search?q=burpees", headers=headers).get_json()
+    assert search["total"] == 1
+
+def test_import_requires_admin(client):
+    res = client.post("/register", json=REGISTER_PAYLOAD)
+    headers = {"Authorization": f"Bearer {res.get_json()['token']}"}
+    res = client.post("/admin/exercises/import", headers=headers, data=CSV, content_type="text/csv")
+    assert res.status_code == 403
+
+def test_unreadable_body_stops_with_partial_summary(client, storage):
+    _, headers = register_admin(client, storage)
+    rows = "".join(f"Ex {i},Core,Abs,None,\n" for i in range(3000))
+    body = ("name,category,targetedBodyParts,requiredEquipment,videoURL\n" + rows).encode() + b"Bad \xff,Core,Abs,None,\n"
+    facet_cache.set("key", "stale")
+
+    res = client.post("/admin/exercises/import?chunk_size=100", headers=headers, data=body,
+                      content_type="text/csv")
+    assert res.status_code == 400
+    summary = res.get_json()
+    assert summary["inserted"] == summary["processed"] > 0
+    assert summary["failedLine"] == summary["processed"] + 2
+    assert "cannot read line" in summary["error"]
+    # the committed chunks are visible right away
+    assert facet_cache.get("key") is None
+    search = client.get("/exercises/search?q=ex", headers=headers).get_json()
+    assert search["total"] == summary["inserted"]
@@ -0,0 +1,74 @@
+import content
+from test_api import register_admin, register_and_get_token
+
+def admin_headers(client, storage):
+    return register_admin(client, storage, username="editor", email="editor@example.com")[1]
+
+def add(client, headers, kind, title):
+    res = client.post("/admin/content", headers=headers, json={"type": kind, "title": title, "description": "..."})
+    assert res.status_code == 201
+    return res.get_json()["contentID"]
+
+def test_feed_filters_by_type_and_pages_newest_first(client, storage):
+    _, token = register_and_get_token(client)
+    headers = {"Authorization": f"Bearer {token}"}
+    admin = admin_headers(client, storage)
+    tips = [add(client, admin, "tip", f"Tip {n}") for n in range(3)]
+    article = add(client, admin, "article", "Stretching 101")
+
+    data = client.get("/content", headers=headers).get_json()
+    assert [c["contentID"] for c in data["content"]] == [article] + tips[::-1]
+    assert data["next"] is None
+
+    page = client.get("/content?type=tip&limit=2", headers=headers).get_json()
+    assert [c["contentID"] for c in page["content"]] == [tips[2], tips[1]]
+    assert page["content"][0] == {"contentID": tips[2], "type": "tip", "title": "Tip 2", "description": "..."}
+    page = client.get(f"/content?type=tip&limit=2&before={page['next']}", headers=headers).get_json()
+    assert [c["contentID"] for c in page["content"]] == [tips[0]]
+    assert client.get("/content?limit=0", headers=headers).status_code == 400
+    assert client.get("/content").status_code == 401
+
+def test_first_page_is_served_from_memory_with_etag(client, storage, monkeypatch):
+    _, token = register_and_get_token(client)
+    headers = {"Authorization": f"Bearer {token}"}
+    admin = admin_headers(client, storage)
+    add(client, admin, "tip", "Drink water")
+
+    res = client.get("/content?type=tip", headers=headers)
+    etag = res.headers["ETag"]
+    assert res.status_code == 200 and res.headers["Cache-Control"] == "private, no-cache"
+
+    def no_database(*args, **kwargs):
+        raise AssertionError("the first page should not query SQLite")
+    monkeypatch.setattr(type(storage), "list_content", no_database)
+    assert client.get("/content?type=tip", headers=headers).get_data() == res.get_data()
+    res = client.get("/content?type=tip", headers=dict(headers, **{"If-None-Match": etag}))
+    assert res.status_code == 304
+    monkeypatch.undo()
+
+    # writes drop the cached pages, so the ETag changes
+    add(client, admin, "tip", "Sleep more")
+    res = client.get("/content?type=tip", headers=dict(headers, **{"If-None-Match": etag}))
+    assert res.status_code == 200 and res.headers["ETag"] != etag
+    assert res.get_json()["content"][0]["title"] == "Sleep more"
+
+def test_admin_updates_and_deletes_content(client, storage):
+    _, token = register_and_get_token(client)
+    headers = {"Authorization": f"Bearer {token}"}
+    admin = admin_headers(client, storage)
+    content_id = add(client, admin, "tip", "Old title")
+    client.get("/content", headers=headers)
+    assert len(content.pages) == 1
+
+    assert client.put(f"/admin/content/{content_id}", headers=admin, json={"title": "New title"}).status_code == 200
+    assert len(content.pages) == 0
+    assert client.get("/content", headers=headers).get_json()["content"][0]["title"] == "New title"
+    assert client.put(f"/admin/content/{content_id}", headers=admin, json={"title": " "}).status_code == 400
+    assert client.put("/admin/content/999", headers=admin, json={"title": "x"}).status_code == 404
+    assert client.post("/admin/content", headers=admin, json={"type": "tip"}).status_code == 400
+    assert client.post("/admin/content", headers=headers,
+                       json={"type": "tip", "title": "x", "description": "y"}).status_code == 403
+
+    assert client.delete(f"/admin/content/{content_id}", headers=admin).status_code == 200
+    assert client.get("/content", headers=headers).get_json()["content"] == []
+    assert client.delete(f"/admin/content/{content_id}", headers=admin).status_code == 404
@@ -0,0 +1,75 @@
+import gc
+import tracemalloc
+from events import EventBus, bus
+from test_api import register_and_get_token
+
+def read_events(res, count):
+    """Read SSE chunks from a streaming test response until `count` events arrived."""
+    chunks = []
+    stream = iter(res.response)
+    while sum(chunk.count("event: ") for chunk in chunks) < count:
+        chunk = next(stream)
+        chunks.append(chunk.decode() if isinstance(chunk, bytes) else chunk)
+    return "".join(chunks)
+
+def test_replay_after_last_event_id():
+    events = EventBus(replay_size=3)
+    first = events.publish(1, "session.created", {"sessionID": 1})
+    second = events.publish(1, "session.updated", {"sessionID": 1})
+    events.publish(2, "profile.updated", {"fields": ["weight"]})
+
+    subscriber, missed, complete = events.subscribe(1, last_event_id=first)
+    assert complete
+    assert [event[0] for event in missed] == [second]
+
+    # live events reach the subscriber, other users' events do not
+    third = events.publish(1, "session.created", {"sessionID": 2})
+    events.publish(2, "session.created", {"sessionID": 3})
+    assert [event[0] for event in subscriber.wait(0)] == [third]
+    events.unsubscribe(subscriber)
+    assert events.subscriber_count() == 0
+
+def test_resume_past_replay_buffer_requires_reset():
+    events = EventBus(replay_size=2)
+    first = events.publish(1, "session.created", {"sessionID": 1})
+    for session_id in range(2, 5):
+        events.publish(1, "session.created", {"sessionID": session_id})
+    _, missed, complete = events.subscribe(1, last_event_id=first)
+    assert not complete
+    assert len(missed) == 2
+
+def test_event_stream_pushes_writes_of_the_user(client):
+    user_id, token = register_and_get_token(client)
+    client.application.config["EVENTS_HEARTBEAT"] = 0.01
+    try:
+        res = client.get("/events", headers={"Authorization": f"Bearer {token}"}, buffered=False)
+        assert res.status_code == 200
+        assert res.mimetype == "text/event-stream"
+        assert bus.subscriber_count() == 1
+
+        client.put("/updateUserProfile", json={"weight": 70},
+                   headers={"Authorization": f"Bearer {token}"})
+        text = read_events(res, 1)
+        assert "event: profile.updated" in text
+        assert '"fields": ["weight"]' in text
+        # nothing else happens -> heartbeat comments
+        assert next(iter(res.response)) == b": keep-alive\n\n"
+        res.close()
+        assert bus.subscriber_count() == 0
+    finally:
+        client.application.config["EVENTS_HEARTBEAT"] = 15
+        bus.clear()
+
+def test_idle_subscribers_have_bounded_memory():
+    events = EventBus()
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    subscribers = [events.subscribe(user_id % 1000, None)[0] for user_id in range(5000)]
+    used = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    assert events.subscriber_count() == 5000
+    assert used / len(subscribers) < 1024, f"{used / len(subscribers):.0f} bytes per subscriber"
+    for subscriber in subscribers:
+        events.unsubscribe(subscriber)
+    assert events.subscriber_count() == 0
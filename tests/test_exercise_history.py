@@ -0,0 +1,86 @@
+from datetime import datetime
+import archive
+from test_api import register_and_get_token
+
+def test_start_workout_links_session_to_exercise(storage, client):
+    user_id, token = register_and_get_token(client)
+    headers = {"Authorization": f"Bearer {token}"}
+    for exercise_id in (1, 2, 1):
+        res = client.post("/startWorkout", json={"exerciseID": exercise_id, "duration": "00:10:00"}, headers=headers)
+        assert res.status_code == 201
+
+    history = client.get("/exerciseHistory/1", headers=headers).get_json()
+    assert history["exerciseID"] == 1
+    assert len(history["sessions"]) == 2
+    assert history["next"] is None
+
+    popular = client.get("/exercises/popular", headers=headers).get_json()
+    assert popular["week"] == datetime.now().strftime("%Y-%W")
+    assert [(e["exerciseID"], e["sessionCount"]) for e in popular["exercises"]] == [(1, 2), (2, 1)]
+    assert popular["exercises"][0]["name"] == "Planks"
+
+def test_exercise_history_pages_newest_first(storage, client):
+    user_id, token = register_and_get_token(client)
+    for day in range(1, 6):
+        storage.create_session(user_id, f"2024-09-0{day} 08:00:00", "00:10:00", 0.5, 3)
+    storage.create_session(user_id, "2024-09-06 08:00:00", "00:10:00", 0.5, 4)
+    headers = {"Authorization": f"Bearer {token}"}
+
+    page = client.get("/exerciseHistory/3?limit=2", headers=headers).get_json()
+    assert [s["date"][:10] for s in page["sessions"]] == ["2024-09-05", "2024-09-04"]
+    page = client.get("/exerciseHistory/3", headers=headers, query_string=dict(page["next"], limit=2)).get_json()
+    assert [s["date"][:10] for s in page["sessions"]] == ["2024-09-03", "2024-09-02"]
+
+    # 2024-09-01 is a Sunday, the rest fall into the next week
+    popular = client.get("/exercises/popular?week=2024-36", headers=headers).get_json()
+    assert popular["exercises"] == [
+        {"exerciseID": 3, "name": "Lunges", "sessionCount": 4},
+        {"exerciseID": 4, "name": None, "sessionCount": 1},
+    ]
+    assert client.get("/exercises/popular?week=soon", headers=headers).status_code == 400
+
+def test_history_pages_through_sessions_of_the_same_second(storage, client):
+    user_id, token = register_and_get_token(client)
+    ids = [storage.create_session(user_id, "2024-09-02 08:00:00", "00:10:00", 0.5, 1) for _ in range(5)]
+    headers = {"Authorization": f"Bearer {token}"}
+
+    seen, params = [], {"limit": 2}
+    while True:
+        page = client.get("/exerciseHistory/1", headers=headers, query_string=params).get_json()
+        seen += [s["sessionID"] for s in page["sessions"]]
+        if page["next"] is None:
+            break
+        params = dict(page["next"], limit=2)
+    assert seen == ids[::-1]
+
+def test_deleting_a_session_uncounts_it(storage, client):
+    user_id, token = register_and_get_token(client)
+    kept = storage.create_session(user_id, "2024-09-03 08:00:00", "00:10:00", 0.5, 2)
+    deleted = storage.create_session(user_id, "2024-09-03 09:00:00", "00:10:00", 0.5, 2)
+    assert storage.delete_session(user_id, deleted)
+    assert not storage.delete_session(user_id, deleted)
+    assert storage.popular_exercises("2024-36") == [(2, 1)]
+    assert storage.delete_session(user_id, kept)
+    assert storage.popular_exercises("2024-36") == [(2, 0)]
+
+def test_history_uses_the_composite_index(storage, client):
+    user_id, _ = register_and_get_token(client)
+    conn = storage.connect_for_user(user_id)
+    plan = conn.execute(
+        "EXPLAIN QUERY PLAN SELECT sessionID FROM workoutSession "
+        "WHERE userID=? AND exerciseID=? AND (date < ? OR (date = ? AND sessionID < ?)) "
+        "ORDER BY date DESC, sessionID DESC LIMIT 10", (user_id, 1, "2024-09-02", "2024-09-02", 10)
+    ).fetchall()
+    conn.close()
+    assert any("idx_workoutSession_user_exercise_date" in row[-1] for row in plan)
+    assert not any("TEMP B-TREE" in row[-1] for row in plan), plan
+
+def test_archive_keeps_the_exercise_link(storage, client):
+    user_id, _ = register_and_get_token(client)
+    storage.create_session(user_id, "2024-01-10 08:00:00", "00:10:00", 0.5, 2)
+    archive.archive_sessions(storage, 90, now=datetime(2024, 9, 15))
+    conn = storage.connect_for_user(user_id)
+    (data,) = conn.execute("SELECT data FROM workoutArchive").fetchone()
+    conn.close()
+    assert archive.decode_segment(data)[0][4] == 2
+    assert archive.list_archived_sessions(storage, user_id)[0][1] == "2024-01-10 08:00:00"
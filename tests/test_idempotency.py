@@ -0,0 +1,156 @@
+import threading
+import time
+import cache
+from main import app as flask_app
+from test_api import register_and_get_token, REGISTER_PAYLOAD
+
+def count_sessions(storage, user_id):
+    return len(storage.list_sessions(user_id))
+
+def start(client, token, key, exercise_id=1):
+    return client.post("/startWorkout", json={"exerciseID": exercise_id, "duration": "00:30:00"},
+                       headers={"Authorization": f"Bearer {token}", "Idempotency-Key": key})
+
+def test_retry_replays_the_original_response(storage, client):
+    user_id, token = register_and_get_token(client)
+    first = start(client, token, "key-1")
+    retry = start(client, token, "key-1")
+    assert first.status_code == retry.status_code == 201
+    assert retry.get_json() == first.get_json()
+    assert retry.headers["Idempotent-Replayed"] == "true"
+    assert count_sessions(storage, user_id) == 1
+
+    # another key is another request
+    assert start(client, token, "key-2").get_json()["sessionID"] != first.get_json()["sessionID"]
+
+def test_key_reused_with_different_body_is_rejected(client):
+    _, token = register_and_get_token(client)
+    assert start(client, token, "key-1").status_code == 201
+    assert start(client, token, "key-1", exercise_id=2).status_code == 422
+
+def test_replay_survives_a_restart(storage, client):
+    user_id, token = register_and_get_token(client)
+    first = start(client, token, "key-1").get_json()
+    cache.clear_all()  # drop the in-memory copies as a restart would
+    assert start(client, token, "key-1").get_json() == first
+    assert count_sessions(storage, user_id) == 1
+
+def test_register_retry_does_not_fail_as_duplicate(client):
+    headers = {"Idempotency-Key": "signup-1"}
+    first = client.post("/register", json=REGISTER_PAYLOAD, headers=headers)
+    retry = client.post("/register", json=REGISTER_PAYLOAD, headers=headers)
+    assert first.status_code == retry.status_code == 201
+    assert retry.get_json()["userID"] == first.get_json()["userID"]
+
+def test_register_replay_mints_fresh_tokens_and_stores_none(storage, client):
+    headers = {"Idempotency-Key": "signup-1"}
+    first = client.post("/register", json=REGISTER_PAYLOAD, headers=headers).get_json()
+    body = storage.get_idempotency_key("user.register:ip:127.0.0.1:signup-1")[2]
+    assert first["refreshToken"].encode() not in body and first["token"].encode() not in body
+
+    # the original refresh token was rotated meanwhile; the replay must not hand it out again
+    rotated = client.post("/refresh", json={"refreshToken": first["refreshToken"]}).get_json()
+    retry = client.post("/register", json=REGISTER_PAYLOAD, headers=headers)
+    assert retry.headers["Idempotent-Replayed"] == "true"
+    replayed = retry.get_json()
+    assert replayed["userID"] == first["userID"]
+    assert replayed["refreshToken"] not in (first["refreshToken"], rotated["refreshToken"])
+    assert client.post("/refresh", json={"refreshToken": replayed["refreshToken"]}).status_code == 200
+    # no reuse was detected: the rotated family still works
+    assert client.post("/refresh", json={"refreshToken": rotated["refreshToken"]}).status_code == 200
+
+def test_anonymous_keys_are_scoped_per_client(client):
+    headers = {"Idempotency-Key": "signup-1"}
+    assert client.post("/register", json=REGISTER_PAYLOAD, headers=headers).status_code == 201
+    other = dict(REGISTER_PAYLOAD, username="janedoe", email="jane@example.com")
+    res = client.post("/register", json=other, headers=headers, environ_base={"REMOTE_ADDR": "10.0.0.2"})
+    assert res.status_code == 201
+    assert "Idempotent-Replayed" not in res.headers
+
+def test_concurrent_duplicates_wait_for_the_first(storage, client, monkeypatch):
+    user_id, token = register_and_get_token(client)
+    create_session = storage.create_session
+
+    def slow_create_session(*args):
+        time.sleep(0.2)
+        return create_session(*args)
+    monkeypatch.setattr(storage, "create_session", slow_create_session)
+
+    results = []
+
+    def send():
+        with flask_app.test_client() as c:
+            res = start(c, token, "key-1")
+            results.append((res.status_code, res.get_json()["sessionID"]))
+
+    threads = [threading.Thread(target=send) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert [status for status, _ in results] == [201] * 4
+    assert len({session_id for _, session_id in results}) == 1
+    assert count_sessions(storage, user_id) == 1
+
+def test_failed_request_can_be_retried(storage, client, monkeypatch):
+    user_id, token = register_and_get_token(client)
+    assert start(client, token, "key-1", exercise_id=9999).status_code == 404
+
+    def broken(*args):
+        raise RuntimeError("disk full")
+    monkeypatch.setattr(storage, "create_session", broken)
+    flask_app.config["PROPAGATE_EXCEPTIONS"] = False
+    try:
+        assert start(client, token, "key-2").status_code == 500
+    finally:
+        flask_app.config["PROPAGATE_EXCEPTIONS"] = None
+    monkeypatch.undo()
+    assert start(client, token, "key-2").status_code == 201
+    assert count_sessions(storage, user_id) == 1
+
+def test_register_replay_refused_after_password_change_or_deactivation(storage, client):
+    headers = {"Idempotency-Key": "signup-1"}
+    first = client.post("/register", json=REGISTER_PAYLOAD, headers=headers).get_json()
+    auth = {"Authorization": f"Bearer {first['token']}"}
+    assert client.put("/updateUserProfile", json={"password": "changed-password"}, headers=auth).status_code == 200
+
+    retry = client.post("/register", json=REGISTER_PAYLOAD, headers=headers)
+    assert retry.status_code == 409
+    assert "token" not in retry.get_json() and "refreshToken" not in retry.get_json()
+
+    # back to the original password, but deactivated
+    client.put("/updateUserProfile", json={"password": REGISTER_PAYLOAD["password"]}, headers=auth)
+    storage.update_user(first["userID"], {"isActive": 0})
+    retry = client.post("/register", json=REGISTER_PAYLOAD, headers=headers)
+    assert retry.status_code == 409
+    assert "token" not in retry.get_json()
+
+def test_lookup_of_one_key_does_not_block_other_keys(storage, client, monkeypatch):
+    store = flask_app.extensions["idempotency"]
+    get_key = storage.get_idempotency_key
+    entered, release = threading.Event(), threading.Event()
+
+    def slow_get_key(scope):
+        if scope == "slow":
+            entered.set()
+            release.wait(5)
+        return get_key(scope)
+    monkeypatch.setattr(storage, "get_idempotency_key", slow_get_key)
+
+    slow = threading.Thread(target=store.begin, args=(storage, "slow", "a"))
+    slow.start()
+    assert entered.wait(5)
+    result = []
+    fast = threading.Thread(target=lambda: result.append(store.begin(storage, "fast", "b")))
+    try:
+        # the slow key's database lookup is still running
+        fast.start()
+        fast.join(1)
+        assert result == [("claimed", None)]
+    finally:
+        release.set()
+        slow.join()
+        fast.join()
+    store.abort(storage, "fast")
+    store.abort(storage, "slow")
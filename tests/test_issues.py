@@ -0,0 +1,93 @@
+from events import bus
+from test_api import REGISTER_PAYLOAD, register_admin
+
+def register(client, name):
+    payload = dict(REGISTER_PAYLOAD, username=name, email=f"{name}@example.com")
+    data = client.post("/register", json=payload).get_json()
+    return data["userID"], {"Authorization": f"Bearer {data['token']}"}
+
+def register_admin_user(client, storage, name):
+    return register_admin(client, storage, username=name, email=f"{name}@example.com")
+
+def submit(client, headers, text):
+    res = client.post("/issues", json={"description": text}, headers=headers)
+    assert res.status_code == 201
+    return res.get_json()["issueID"]
+
+def test_submit_and_list_own_issues(client):
+    _, headers = register(client, "reporter")
+    _, other = register(client, "other")
+    ids = [submit(client, headers, f"problem {n}") for n in range(3)]
+    submit(client, other, "not mine")
+    assert client.post("/issues", json={"description": "  "}, headers=headers).status_code == 400
+
+    page = client.get("/issues?limit=2", headers=headers).get_json()
+    assert [i["issueID"] for i in page["issues"]] == [ids[2], ids[1]]
+    assert page["issues"][0]["status"] == "open" and page["issues"][0]["adminID"] == 0
+    page = client.get(f"/issues?limit=2&before={page['next']}", headers=headers).get_json()
+    assert [i["issueID"] for i in page["issues"]] == [ids[0]]
+    assert page["next"] is None
+
+def test_queue_requires_admin(client):
+    _, headers = register(client, "reporter")
+    assert client.get("/admin/issues", headers=headers).status_code == 403
+    assert client.patch("/admin/issues", json={"issueIDs": [1], "status": "closed"},
+                        headers=headers).status_code == 403
+
+def test_keyset_pages_through_the_queue(client, storage):
+    _, user = register(client, "reporter")
+    _, admin = register_admin_user(client, storage, "admin1")
+    ids = [submit(client, user, f"problem {n}") for n in range(5)]
+
+    seen, after = [], 0
+    while after is not None:
+        page = client.get(f"/admin/issues?limit=2&after={after}", headers=admin).get_json()
+        seen += [i["issueID"] for i in page["issues"]]
+        after = page["next"]
+    assert seen == ids
+    assert client.get("/admin/issues?status=bogus", headers=admin).status_code == 400
+
+def test_bulk_transition_assigns_and_skips_invalid_moves(client, storage):
+    reporter_id, user = register(client, "reporter")
+    admin_id, admin = register_admin_user(client, storage, "admin1")
+    ids = [submit(client, user, f"problem {n}") for n in range(4)]
+
+    res = client.patch("/admin/issues", json={"issueIDs": ids[:3], "status": "in_progress"}, headers=admin)
+    assert res.get_json()["updated"] == ids[:3]
+    mine = client.get("/admin/issues?status=in_progress&assignee=me", headers=admin).get_json()["issues"]
+    assert [i["issueID"] for i in mine] == ids[:3]
+    assert all(i["adminID"] == admin_id for i in mine)
+    unassigned = client.get("/admin/issues?assignee=unassigned", headers=admin).get_json()["issues"]
+    assert [i["issueID"] for i in unassigned] == [ids[3]]
+
+    # open -> in_progress is not allowed again; only the three in progress move on
+    res = client.patch("/admin/issues", json={"issueIDs": ids, "status": "in_progress"}, headers=admin)
+    assert res.get_json()["updated"] == [ids[3]]
+    client.patch("/admin/issues", json={"issueIDs": ids[:2], "status": "closed"}, headers=admin)
+    res = client.patch("/admin/issues", json={"issueIDs": ids[:2], "status": "open"}, headers=admin)
+    assert res.get_json() == {"status": "open", "updated": [], "skipped": ids[:2]}
+
+    subscriber, missed, _ = bus.subscribe(reporter_id, last_event_id=0)
+    assert any(event[1] == "issue.updated" for event in missed)
+    bus.unsubscribe(subscriber)
+
+def test_bulk_update_validates_input(client, storage):
+    _, admin = register_admin_user(client, storage, "admin1")
+    for body in ({"issueIDs": [], "status": "closed"}, {"issueIDs": ["1"], "status": "closed"},
+                 {"issueIDs": [1], "status": "done"}):
+        assert client.patch("/admin/issues", json=body, headers=admin).status_code == 400
+
+def test_queue_pages_are_index_range_scans(storage):
+    conn = storage.connect()
+    plans = {}
+    for index, query, params in (
+        ("idx_issueForm_status_issue", "WHERE status=? AND issueID > ? ORDER BY issueID LIMIT 20", ("open", 0)),
+        ("idx_issueForm_admin_status", "WHERE status=? AND issueID > ? AND adminID=? ORDER BY issueID LIMIT 20",
+         ("open", 0, 0)),
+        ("idx_issueForm_user_issue", "WHERE userID=? AND issueID < ? ORDER BY issueID DESC LIMIT 20", (1, 100)),
+    ):
+        plans[index] = conn.execute(f"EXPLAIN QUERY PLAN SELECT * FROM issueForm {query}", params).fetchall()
+    conn.close()
+    for index, plan in plans.items():
+        assert any(index in row[-1] for row in plan), plan
+        assert not any("TEMP B-TREE" in row[-1] for row in plan), plan
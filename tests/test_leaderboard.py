@@ -0,0 +1,95 @@
+from datetime import datetime
+import leaderboard
+from leaderboard import Board, parse_duration
+from test_api import REGISTER_PAYLOAD
+
+def register(client, n):
+    payload = dict(REGISTER_PAYLOAD, username=f"player{n}", email=f"player{n}@example.com")
+    data = client.post("/register", json=payload).get_json()
+    return data["userID"], {"Authorization": f"Bearer {data['token']}"}
+
+def workout(client, headers, duration):
+    res = client.post("/startWorkout", headers=headers, json={"exerciseID": 1, "duration": duration})
+    assert res.status_code == 201
+    return res.get_json()["sessionID"]
+
+def test_board_ranks_with_ties():
+    board = Board([(1, 30), (2, 50), (3, 30)])
+    assert board.top(3) == [(1, 2, 50), (2, 1, 30), (2, 3, 30)]
+    board.update(3, 60)
+    assert board.rank(3) == (1, 60)
+    assert board.rank(1) == (3, 30)
+    board.update(2, None)
+    assert board.rank(2) is None
+    assert len(board) == 2
+
+def test_parse_duration():
+    assert parse_duration("01:02:03") == 3723
+    assert parse_duration("10:00") == 600
+    assert parse_duration("soon") == 0
+
+def test_duration_board_follows_workouts(client):
+    players = [register(client, n) for n in range(3)]
+    workout(client, players[0][1], "00:20:00")
+    workout(client, players[1][1], "00:30:00")
+
+    res = client.get("/leaderboard?limit=5", headers=players[0][1])
+    assert res.status_code == 200
+    data = res.get_json()
+    assert [(e["rank"], e["userID"], e["score"]) for e in data["entries"]] == [
+        (1, players[1][0], 1800), (2, players[0][0], 1200)]
+    assert data["entries"][0]["username"] == "player1"
+    assert data["me"] == {"rank": 2, "score": 1200}
+
+    # the cached board is updated in place by later workouts
+    workout(client, players[0][1], "00:15:00")
+    data = client.get("/leaderboard", headers=players[2][1]).get_json()
+    assert data["entries"][0]["userID"] == players[0][0]
+    assert data["me"] is None
+
+def test_accuracy_board_counts_scored_sessions(client, storage):
+    user_id, headers = register(client, 0)
+    session_ids = [workout(client, headers, "00:10:00") for _ in range(3)]
+    data = client.get("/leaderboard?metric=accuracy", headers=headers).get_json()
+    assert data["entries"] == []
+
+    for session_id, score in zip(session_ids, ("0.6", "0.8", "1.0")):
+        client.post(f"/workoutSession/{session_id}/posture", headers=headers, data=score, content_type="text/plain")
+        assert client.post(f"/workoutSession/{session_id}/close", headers=headers).status_code == 200
+
+    data = client.get("/leaderboard?metric=accuracy", headers=headers).get_json()
+    assert data["me"]["rank"] == 1
+    assert abs(data["me"]["score"] - 0.8) < 1e-9
+
+def test_rollover_rebuilds_the_finished_week(client, storage):
+    user_id, headers = register(client, 0)
+    storage.create_session(user_id, "2024-09-03 10:00:00", "00:40:00", 0.9)
+    storage.create_session(user_id, "2024-09-04 10:00:00", "00:20:00", 0.0)
+    leaderboard._current_week = None
+    assert leaderboard.rollover(storage, keep_weeks=520, now=datetime(2024, 9, 10, 8, 0)) == "2024-37"
+    assert leaderboard.rollover(storage, keep_weeks=520, now=datetime(2024, 9, 10, 9, 0)) is None
+
+    data = client.get("/leaderboard?week=2024-36", headers=headers).get_json()
+    assert data["me"] == {"rank": 1, "score": 3600}
+    assert client.get("/leaderboard?week=2024-99", headers=headers).status_code == 400
+
+    leaderboard._current_week = None
+    leaderboard.rollover(storage, keep_weeks=4, now=datetime(2025, 1, 6))
+    assert client.get("/leaderboard?week=2024-36", headers=headers).get_json()["entries"] == []
+    leaderboard._current_week = None
+
+def test_write_during_a_board_load_is_not_lost(storage, monkeypatch):
+    load = storage.leaderboard_durations
+
+    def load_then_write(week):
+        rows = load(week)
+        # a session is recorded after the board's rows were read, before it is cached
+        leaderboard.record_session(storage, 2, "2024-09-03 10:00:00", "00:30:00", 0.0)
+        return rows
+
+    leaderboard.record_session(storage, 1, "2024-09-03 09:00:00", "00:20:00", 0.0)
+    monkeypatch.setattr(storage, "leaderboard_durations", load_then_write)
+    board = leaderboard.get_board(storage, "2024-36", "duration")
+    assert board.top(5) == [(1, 2, 1800), (2, 1, 1200)]
+    assert leaderboard.get_board(storage, "2024-36", "duration") is board
+    assert leaderboard._loading == {}
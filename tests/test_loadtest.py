@@ -0,0 +1,23 @@
+import importlib.util
+import os
+from main import app
+
+def load_benchmark():
+    path = os.path.join(os.path.dirname(os.path.dirname(__file__)), "benchmarks", "loadtest.py")
+    spec = importlib.util.spec_from_file_location("loadtest", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+def test_every_route_has_a_load_scenario():
+    loadtest = load_benchmark()
+    endpoints = {rule.endpoint for rule in app.url_map.iter_rules()
+                 if rule.endpoint.split(".")[0] in loadtest.BLUEPRINTS}
+    assert endpoints <= set(loadtest.SCENARIOS)
+
+def test_compare_flags_p95_regressions():
+    loadtest = load_benchmark()
+    baseline = {"endpoints": {"user.login": {"p95_ms": 40.0}, "user.check_user": {"p95_ms": 2.0}}}
+    results = {"endpoints": {"user.login": {"p95_ms": 60.0}, "user.check_user": {"p95_ms": 2.8}}}
+    # check_user is 40% slower but by less than a millisecond
+    assert loadtest.compare(results, baseline, 0.2) == ["user.login"]
@@ -0,0 +1,89 @@
+import pytest
+import db as db_module
+import maintenance
+from main import app as flask_app
+from metrics import metrics, INFLIGHT
+from scheduler import JobDeferred
+from storage import create_storage
+from test_api import register_admin, register_and_get_token
+
+def fill_and_delete(dbname):
+    conn = db_module.connect(dbname)
+    conn.executemany(
+        "INSERT INTO content(type, description, title) VALUES (?, ?, ?)",
+        [("tip", "x" * 2000, f"t{i}") for i in range(500)]
+    )
+    conn.commit()
+    conn.execute("DELETE FROM content")
+    conn.commit()
+    conn.close()
+
+def test_vacuum_reclaims_space_and_reports_metrics(tmp_path):
+    store = create_storage(str(tmp_path / "maint.db"))
+    store.initialize()
+    fill_and_delete(store.dbname)
+    metrics.reset()
+
+    reclaimed = maintenance.run_task("vacuum", store, max_inflight=4)
+    assert reclaimed > 0
+    snapshot = metrics.snapshot()
+    assert snapshot["counters"]["maintenance.vacuum.bytes_reclaimed"] == reclaimed
+    assert snapshot["timings"]["maintenance.vacuum.seconds"]["count"] == 1
+
+def test_legacy_database_is_only_converted_on_request(tmp_path):
+    dbname = str(tmp_path / "legacy.db")
+    conn = db_module.connect(dbname)
+    conn.execute("PRAGMA auto_vacuum = NONE")
+    conn.execute("CREATE TABLE legacy(id INTEGER PRIMARY KEY)")
+    conn.close()
+    db_module.createDB(dbname)
+    fill_and_delete(dbname)
+    metrics.reset()
+
+    # the periodic job leaves the full VACUUM to the one-off conversion
+    assert maintenance.vacuum(dbname) == 0
+    assert metrics.snapshot()["counters"]["maintenance.vacuum.unconverted"] == 1
+    assert maintenance.convert(dbname) > 0
+    conn = db_module.connect(dbname)
+    assert conn.execute("PRAGMA auto_vacuum").fetchone()[0] == maintenance.AUTO_VACUUM_INCREMENTAL
+    conn.close()
+    assert maintenance.convert(dbname) == 0
+
+def test_tasks_deferred_under_load(storage):
+    metrics.reset()
+    metrics.set_gauge(INFLIGHT, 10)
+    with pytest.raises(JobDeferred):
+        maintenance.run_task("optimize", storage, max_inflight=4)
+    assert metrics.snapshot()["counters"]["maintenance.optimize.skipped"] == 1
+    metrics.reset()
+
+def test_checkpoint_and_analyze(tmp_path):
+    dbname = str(tmp_path / "wal.db")
+    db_module.createDB(dbname)
+    # an open reader keeps the WAL from being checkpointed when writers disconnect
+    holder = db_module.connect(dbname)
+    holder.execute("PRAGMA journal_mode = WAL")
+    holder.execute("SELECT COUNT(*) FROM content").fetchone()
+    fill_and_delete(dbname)
+
+    assert maintenance.checkpoint(dbname) > 0
+    assert maintenance.analyze(dbname) == 0
+    holder.close()
+
+def test_metrics_endpoint_requires_admin_or_token(client, storage):
+    assert client.get("/metrics").status_code == 401
+    _, token = register_and_get_token(client)
+    assert client.get("/metrics", headers={"Authorization": f"Bearer {token}"}).status_code == 403
+
+    _, admin = register_admin(client, storage, username="ops", email="ops@example.com")
+    res = client.get("/metrics", headers=admin)
+    assert res.status_code == 200
+    assert set(res.get_json()) == {"counters", "gauges", "timings"}
+
+    assert client.get("/metrics", headers={"X-Metrics-Token": "scrape"}).status_code == 401
+    flask_app.config["METRICS_TOKEN"] = "scrape"
+    try:
+        assert client.get("/metrics", headers={"X-Metrics-Token": "scrape"}).status_code == 200
+        assert client.get("/metrics", headers={"X-Metrics-Token": "guess"}).status_code == 401
+    finally:
+        flask_app.config["METRICS_TOKEN"] = None
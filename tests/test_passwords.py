@@ -0,0 +1,70 @@
+import hashlib
+import threading
+import pytest
+from passwords import PasswordHasher, Overloaded
+from test_api import register_and_get_token, REGISTER_PAYLOAD
+
+def test_hash_and_verify():
+    hasher = PasswordHasher(workers=1, n=1024)
+    stored = hasher.hash("Passw0rd!")
+    assert stored.startswith("scrypt$1024$8$1$")
+    assert hasher.hash("Passw0rd!") != stored  # salted
+    assert hasher.verify("Passw0rd!", stored) == (True, False)
+    assert hasher.verify("wrong", stored) == (False, False)
+    # stronger parameters than the stored hash -> rehash
+    assert PasswordHasher(n=2048).verify("Passw0rd!", stored) == (True, True)
+
+def test_legacy_md5_is_accepted_and_flagged():
+    hasher = PasswordHasher(workers=1, n=1024)
+    legacy = hashlib.md5(b"Passw0rd!").hexdigest()
+    assert hasher.verify("Passw0rd!", legacy) == (True, True)
+    assert hasher.verify("nope", legacy) == (False, True)
+    assert hasher.verify("x", "GOOGLE_AUTH_123") == (False, False)
+
+def test_full_queue_sheds_load():
+    hasher = PasswordHasher(workers=1, max_queue=0, n=1024)
+    release = threading.Event()
+    worker = threading.Thread(target=hasher._run, args=(release.wait,))
+    worker.start()
+    while hasher._pending == 0:
+        pass
+    with pytest.raises(Overloaded):
+        hasher.hash("Passw0rd!")
+    release.set()
+    worker.join()
+    assert hasher.verify("x", hasher.hash("x"))[0]
+
+def test_login_rehashes_legacy_md5(client, storage):
+    user_id, _ = register_and_get_token(client)
+    storage.update_user(user_id, {"password": hashlib.md5(b"Passw0rd!").hexdigest()})
+
+    res = client.post("/login", json={"username": REGISTER_PAYLOAD["username"], "password": "Passw0rd!"})
+    assert res.status_code == 200
+    assert storage.find_user(userID=user_id)["password"].startswith("scrypt$")
+
+    res = client.post("/login", json={"username": REGISTER_PAYLOAD["username"], "password": "Passw0rd!"})
+    assert res.status_code == 200
+
+def test_overloaded_hasher_returns_503(client):
+    from main import app
+    original = app.extensions["passwords"]
+    app.extensions["passwords"] = PasswordHasher(workers=1, max_queue=-1, n=1024)
+    try:
+        res = client.post("/register", json=REGISTER_PAYLOAD)
+    finally:
+        app.extensions["passwords"] = original
+    assert res.status_code == 503
+    assert res.headers["Retry-After"] == "1"
+
+def test_taken_username_or_email_is_refused_before_hashing(client, monkeypatch):
+    from main import app
+    register_and_get_token(client)
+    hasher = app.extensions["passwords"]
+
+    def no_hash(password):
+        raise AssertionError("a registration that cannot succeed should not hash the password")
+    monkeypatch.setattr(hasher, "hash", no_hash)
+    res = client.post("/register", json=REGISTER_PAYLOAD)
+    assert res.status_code == 400 and res.get_json()["error"] == "Username already exists"
+    res = client.post("/register", json=dict(REGISTER_PAYLOAD, username="someone_else"))
+    assert res.status_code == 400 and res.get_json()["error"] == "Email already registered"
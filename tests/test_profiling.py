@@ -0,0 +1,33 @@
+import os
+import pstats
+import pytest
+from main import app as flask_app
+from test_api import register_and_get_token
+
+@pytest.fixture
+def profiling(tmp_path):
+    flask_app.config.update(PROFILE_TOKEN="let-me-profile", PROFILE_DIR=str(tmp_path), PROFILE_KEEP=3)
+    yield tmp_path
+    flask_app.config.update(PROFILE_TOKEN=None, PROFILE_SAMPLE_RATE=0.0, PROFILE_DIR="profiles", PROFILE_KEEP=50)
+
+def test_debug_header_profiles_the_request(client, profiling):
+    _, token = register_and_get_token(client)
+    res = client.get("/userProfile", headers={"Authorization": f"Bearer {token}", "X-Profile": "let-me-profile"})
+    assert res.status_code == 200
+    name = res.headers["X-Profile-Id"]
+    assert "user.get_user_profile" in name
+
+    stats = pstats.Stats(str(profiling / name))
+    functions = {func for (_, _, func) in stats.stats}
+    assert "decode_auth_token" in functions
+
+def test_wrong_or_missing_header_is_not_profiled(client, profiling):
+    assert "X-Profile-Id" not in client.get("/metrics").headers
+    assert "X-Profile-Id" not in client.get("/metrics", headers={"X-Profile": "guess"}).headers
+    assert os.listdir(profiling) == []
+
+def test_sampling_and_ring_size(client, profiling):
+    flask_app.config.update(PROFILE_TOKEN=None, PROFILE_SAMPLE_RATE=1.0)
+    names = [client.get("/metrics").headers["X-Profile-Id"] for _ in range(5)]
+    assert len(set(names)) == 5
+    assert sorted(os.listdir(profiling)) == sorted(names[-3:])
@@ -0,0 +1,88 @@
+import pytest
+from main import app as flask_app
+from metrics import metrics
+from ratelimit import RateLimiter, parse_limits
+from test_api import register_and_get_token, REGISTER_PAYLOAD
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+@pytest.fixture
+def limiter():
+    limiter = flask_app.extensions["ratelimit"]
+    saved = dict(limiter.limits)
+    yield limiter
+    limiter.limits = saved
+
+def test_bucket_bursts_then_refills():
+    clock = Clock()
+    limiter = RateLimiter({"default": (3, 6)}, clock=clock)
+    assert [limiter.check("default", "a") for _ in range(3)] == [0, 0, 0]
+    assert limiter.check("default", "a") == pytest.approx(2.0)
+    # other clients have their own bucket
+    assert limiter.check("default", "b") == 0
+    clock.now += 2
+    assert limiter.check("default", "a") == 0
+    assert limiter.check("default", "a") > 0
+
+def test_unlimited_routes_and_rule_lookup():
+    limiter = RateLimiter({"user.login": (5, 60), "auth": (5, 60), "default": (0, 1)})
+    assert limiter.rule_for("user.login") == "user.login"
+    assert limiter.rule_for("auth.google_auth") == "auth"
+    assert limiter.rule_for("user.check_user") == "default"
+    assert all(limiter.check("default", "a") == 0 for _ in range(100))
+    assert len(limiter) == 0
+
+def test_key_cap_drops_full_buckets_first():
+    clock = Clock()
+    limiter = RateLimiter({"default": (2, 1)}, max_keys=2, clock=clock)
+    limiter.check("default", "a")
+    limiter.check("default", "b")
+    clock.now += 5
+    limiter.check("default", "c")
+    assert len(limiter) == 1
+
+def test_parse_limits():
+    assert parse_limits("user.login=5/60, default=0") == {"user.login": (5, 60.0), "default": (0, 1.0)}
+
+def test_login_is_limited_per_ip(client, limiter):
+    limiter.set_limit("user.login", 2, 60)
+    credentials = {"username": REGISTER_PAYLOAD["username"], "password": "wrong"}
+    assert client.post("/login", json=credentials).status_code == 404
+    assert client.post("/login", json=credentials).status_code == 404
+    res = client.post("/login", json=credentials)
+    assert res.status_code == 429
+    assert 1 <= int(res.headers["Retry-After"]) <= 30
+    assert metrics.snapshot()["counters"]["ratelimit.user.login.limited"] >= 1
+    # a different address has its own bucket
+    res = client.post("/login", json=credentials, environ_base={"REMOTE_ADDR": "10.0.0.2"})
+    assert res.status_code == 404
+
+def test_authenticated_requests_are_limited_per_user(client, limiter):
+    user_id, token = register_and_get_token(client)
+    limiter.set_limit("default", 2, 60)
+    headers = {"Authorization": f"Bearer {token}"}
+    assert client.get("/workoutHistory", headers=headers).status_code == 200
+    assert client.get("/workoutStats", headers=headers).status_code == 200
+    assert client.get("/workoutHistory", headers=headers).status_code == 429
+    # the same IP without a token is a different client
+    assert client.get("/workoutHistory").status_code == 401
+
+def test_buckets_survive_a_restart(storage):
+    clock = Clock()
+    limiter = RateLimiter({"user.login": (2, 60)}, clock=clock)
+    limiter.check("user.login", "ip:10.0.0.1")
+    limiter.check("user.login", "ip:10.0.0.1")
+    limiter.check("user.login", "ip:10.0.0.9")
+    clock.now += 60
+    limiter.check("user.login", "ip:10.0.0.3")
+    assert limiter.snapshot(storage) == 1
+
+    restarted = RateLimiter({"user.login": (2, 60)})
+    assert restarted.restore(storage) == 1
+    assert restarted.check("user.login", "ip:10.0.0.3") == 0
+    assert restarted.check("user.login", "ip:10.0.0.3") > 0
@@ -0,0 +1,90 @@
+import time
+import numpy as np
+import recommendations
+from recommendations import Catalog, profile_terms, score, rank
+from test_api import register_and_get_token, REGISTER_PAYLOAD
+
+ROWS = [
+    (1, "Planks", "Core", "Abdominals, Back", "None", None),
+    (2, "Squats", "Lower Body", "Quads, Hamstrings, Glutes", "None", None),
+    (3, "Lunges", "Lower Body", "Quads, Hamstrings, Glutes", "None", None),
+    (4, "Running", "Cardio", "Legs", "Treadmill", None),
+    (5, "Bench Press", "Upper Body", "Chest, Triceps", "Barbell", None),
+]
+
+def ranked_ids(terms, sessions=()):
+    catalog = Catalog(ROWS)
+    return [item["exerciseID"] for item in rank(catalog, score(catalog, terms, list(sessions)), 5)]
+
+def test_catalog_rows_are_unit_vectors():
+    catalog = Catalog(ROWS)
+    assert np.allclose(np.linalg.norm(catalog.features, axis=1), 1.0)
+    assert catalog.features.shape[0] == len(ROWS)
+
+def test_goal_drives_cold_start():
+    assert ranked_ids(profile_terms("Lose weight", "Moderate", 180, 75))[0] == 4
+    assert ranked_ids(profile_terms("Build strength", "High", 180, 75))[0] == 5
+
+def test_history_pulls_similar_exercises_up():
+    # squats done a week ago: lunges share every term, planks and running do not
+    ids = ranked_ids({}, [(2, 7.0, 0.9)])
+    assert ids.index(3) < ids.index(1)
+    assert ids.index(3) < ids.index(4)
+
+def test_recently_trained_muscles_rest():
+    # squats yesterday: lunges hit the same muscles, so they drop behind other work
+    terms = profile_terms("Build strength", "High", 180, 75)
+    assert ranked_ids(terms, [(2, 10.0, 0.9)])[0] in (2, 3)
+    ids = ranked_ids(terms, [(2, 1.0, 0.9)])
+    assert ids.index(3) > ids.index(5)
+    assert ids[-1] == 2
+
+def test_endpoint_caches_and_invalidates(client):
+    user_id, token = register_and_get_token(client)
+    headers = {"Authorization": f"Bearer {token}"}
+
+    res = client.get("/recommendations?limit=2", headers=headers)
+    assert res.status_code == 200
+    items = res.get_json()["recommendations"]
+    assert len(items) == 2
+    assert recommendations.results.get(user_id) is not None
+
+    assert client.post("/startWorkout", json={"exerciseID": 2, "duration": "00:10:00"},
+                       headers=headers).status_code == 201
+    assert recommendations.results.get(user_id) is None
+    assert client.get("/recommendations", headers=headers).status_code == 200
+
+    assert client.put("/updateUserProfile", json={"fitness_goal": "Flexibility"},
+                      headers=headers).status_code == 200
+    assert recommendations.results.get(user_id) is None
+
+    assert client.get("/recommendations?limit=0", headers=headers).status_code == 400
+
+def test_catalog_changes_drop_every_ranking(client):
+    user_id, token = register_and_get_token(client)
+    headers = {"Authorization": f"Bearer {token}"}
+    assert len(client.get("/recommendations", headers=headers).get_json()["recommendations"]) == 3
+
+    client.post("/resetWorkoutLibrary", headers=headers)
+    assert client.get("/recommendations", headers=headers).get_json()["recommendations"] == []
+
+def test_matrix_built_during_a_catalog_change_is_not_kept(storage, monkeypatch):
+    iter_exercises = storage.iter_exercises
+
+    def read_then_change():
+        rows = list(iter_exercises())
+        # the catalog changes after the rows were read, before the matrix is cached
+        recommendations.invalidate_catalog()
+        return rows
+
+    monkeypatch.setattr(storage, "iter_exercises", read_then_change)
+    stale = recommendations.get_catalog(storage)
+    monkeypatch.undo()
+    assert recommendations.get_catalog(storage) is not stale
+
+def test_matrix_expires_for_changes_made_by_other_processes(storage, monkeypatch):
+    catalog = recommendations.get_catalog(storage)
+    assert recommendations.get_catalog(storage) is catalog
+    later = time.monotonic() + recommendations.CATALOG_TTL + 1
+    monkeypatch.setattr(time, "monotonic", lambda: later)
+    assert recommendations.get_catalog(storage) is not catalog
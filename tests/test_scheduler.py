@@ -0,0 +1,15 @@
+from scheduler import Scheduler
+
+def test_run_pending_runs_due_jobs_only():
+    calls = []
+    scheduler = Scheduler()
+    scheduler.add_job("due", lambda: calls.append("due"), 0)
+    scheduler.add_job("later", lambda: calls.append("later"), 3600)
+    scheduler.run_pending()
+    assert calls == ["due"]
+
+def test_failing_job_is_recorded():
+    scheduler = Scheduler()
+    scheduler.add_job("boom", lambda: 1 / 0, 0)
+    scheduler.run_pending()
+    assert isinstance(scheduler.jobs["boom"].last_error, ZeroDivisionError)
@@ -0,0 +1,81 @@
+import search as search_module
+from search import fts_query
+from test_api import register_and_get_token
+
+EXERCISES = [
+    ("Push Ups", "Upper Body", "Chest, Triceps", "None"),
+    ("Bench Press", "Upper Body", "Chest, Triceps, Shoulders", "Barbell"),
+    ("Goblet Squats", "Lower Body", "Quads, Glutes", "Dumbbell"),
+]
+
+def seed(storage):
+    conn = storage.connect()
+    conn.executemany(
+        "INSERT INTO exercise(name, category, targetedBodyParts, requiredEquipment) VALUES (?, ?, ?, ?)",
+        EXERCISES
+    )
+    conn.commit()
+    conn.close()
+
+def search(client, headers, query):
+    res = client.get(f"/exercises/search?{query}", headers=headers)
+    assert res.status_code == 200
+    return res.get_json()
+
+def test_fts_query_quotes_user_input():
+    assert fts_query('squat "OR') == '"squat"* "OR"*'
+    assert fts_query("quads", "targetedBodyParts") == 'targetedBodyParts : ("quads"*)'
+    assert fts_query("  ") is None
+
+def test_text_search_ranks_and_counts_facets(client, storage):
+    _, token = register_and_get_token(client)
+    headers = {"Authorization": f"Bearer {token}"}
+    seed(storage)
+
+    body = search(client, headers, "q=squat")
+    assert [e["name"] for e in body["exercises"]] == ["Squats", "Goblet Squats"]
+    assert body["total"] == 2
+    assert body["facets"]["requiredEquipment"] == {"Dumbbell": 1, "None": 1}
+    assert body["facets"]["targetedBodyParts"]["Glutes"] == 2
+
+def test_facet_filters_and_pagination(client, storage):
+    _, token = register_and_get_token(client)
+    headers = {"Authorization": f"Bearer {token}"}
+    seed(storage)
+
+    body = search(client, headers, "category=Upper%20Body&bodyPart=triceps")
+    assert {e["name"] for e in body["exercises"]} == {"Push Ups", "Bench Press"}
+    body = search(client, headers, "equipment=Barbell")
+    assert [e["name"] for e in body["exercises"]] == ["Bench Press"]
+
+    first = search(client, headers, "per_page=2&page=1")
+    second = search(client, headers, "per_page=2&page=2")
+    assert first["total"] == 6
+    assert len(first["exercises"]) == 2
+    assert not {e["exerciseID"] for e in first["exercises"]} & {e["exerciseID"] for e in second["exercises"]}
+    assert client.get("/exercises/search?per_page=1000", headers=headers).status_code == 400
+
+def test_reset_library_clears_index_and_cache(client, storage):
+    _, token = register_and_get_token(client)
+    headers = {"Authorization": f"Bearer {token}"}
+    assert search(client, headers, "q=planks")["total"] == 1
+    client.post("/resetWorkoutLibrary", headers=headers)
+    body = search(client, headers, "q=planks")
+    assert body["total"] == 0 and body["exercises"] == []
+
+def test_counts_taken_during_a_catalog_change_are_not_served(client, storage, monkeypatch):
+    _, token = register_and_get_token(client)
+    headers = {"Authorization": f"Bearer {token}"}
+    counts = search_module.facet_counts
+
+    def counts_racing_a_write(conn, clause, params):
+        facets = counts(conn, clause, params)
+        # an import lands after the counts were read but before they are cached
+        seed(storage)
+        search_module.invalidate_catalog()
+        return facets
+
+    monkeypatch.setattr(search_module, "facet_counts", counts_racing_a_write)
+    assert search(client, headers, "q=squat")["total"] == 1
+    monkeypatch.undo()
+    assert search(client, headers, "q=squat")["total"] == 2
@@ -0,0 +1,140 @@
+import sqlite3
+from sharding import ShardedStorage, shard_name, current_shard_count
+from storage import SESSION_ID_SPAN
+
+def make_user(store, name):
+    return store.create_user({
+        "full_name": name, "username": name, "password": "x",
+        "email": f"{name}@example.com", "isActive": 1
+    })
+
+def test_users_and_sessions_routed_to_shards():
+    store = ShardedStorage("memory:routed", 3)
+    store.initialize()
+    ids = [make_user(store, f"user{i}") for i in range(6)]
+
+    for user_id in ids:
+        assert store.shard_index(user_id) == user_id % 3
+        shard = store.shards[user_id % 3]
+        assert shard.get_user_active(user_id) == 1
+
+    # global lookups go through the directory
+    assert store.username_exists("user4")
+    assert store.get_login("user4")[3] == ids[4]
+    assert store.find_user(email="user5@example.com")["userID"] == ids[5]
+
+    # sessionIDs come from each shard's own range
+    session_id = store.create_session(ids[2], "2024-01-01 10:00:00", "00:10:00", 0.0)
+    assert session_id // SESSION_ID_SPAN == ids[2] % 3
+    assert store.list_sessions(ids[2])[0][0] == session_id
+    store.close()
+
+def test_update_user_keeps_directory_in_sync():
+    store = ShardedStorage("memory:renamed", 2)
+    store.initialize()
+    user_id = make_user(store, "before")
+    store.update_user(user_id, {"username": "after"})
+    assert not store.username_exists("before")
+    assert store.get_login("after")[3] == user_id
+    store.close()
+
+def test_rebalance_moves_users_with_sessions():
+    store = ShardedStorage("memory:rebalanced", 2)
+    store.initialize()
+    ids = [make_user(store, f"user{i}") for i in range(8)]
+    sessions = {uid: store.create_session(uid, "2024-01-01", "00:05:00", 0.0) for uid in ids}
+
+    moved = store.rebalance(4)
+    assert moved > 0
+    assert len(store.shards) == 4
+    for user_id in ids:
+        assert store.shard_index(user_id) == user_id % 4
+        assert store.get_profile(user_id)[1] == f"user{ids.index(user_id)}"
+        assert [row[0] for row in store.list_sessions(user_id)] == [sessions[user_id]]
+    store.close()
+
+def test_rebalance_cli_helpers(tmp_path):
+    database = str(tmp_path / "fitness.db")
+    assert shard_name(database, 1) == str(tmp_path / "fitness-shard1.db")
+    store = ShardedStorage(database, 2)
+    store.initialize()
+    make_user(store, "a")
+    make_user(store, "b")
+    assert current_shard_count(database) == 2
+
+    conn = sqlite3.connect(shard_name(database, 1))
+    assert conn.execute("SELECT COUNT(*) FROM user").fetchone()[0] == 1
+    conn.close()
+
+def test_popularity_is_summed_over_shards_and_kept_on_shrink():
+    store = ShardedStorage("memory:popular", 3)
+    store.initialize()
+    ids = [make_user(store, f"user{i}") for i in range(6)]
+    for user_id in ids:
+        store.create_session(user_id, "2024-09-03 08:00:00", "00:05:00", 0.0, 1)
+    store.create_session(ids[0], "2024-09-03 09:00:00", "00:05:00", 0.0, 2)
+    assert store.popular_exercises("2024-36") == [(1, 6), (2, 1)]
+
+    store.rebalance(1)
+    assert store.popular_exercises("2024-36") == [(1, 6), (2, 1)]
+    store.close()
+
+def test_moved_users_take_their_popularity_counts_along():
+    store = ShardedStorage("memory:popular-moves", 2)
+    store.initialize()
+    ids = [make_user(store, f"user{i}") for i in range(6)]
+    sessions = {uid: store.create_session(uid, "2024-09-03 08:00:00", "00:05:00", 0.0, 1) for uid in ids}
+    store.create_session(ids[0], "2024-09-03 09:00:00", "00:05:00", 0.0, 2)
+    before = store.popular_exercises("2024-36")
+
+    store.rebalance(3)
+    assert store.popular_exercises("2024-36") == before == [(1, 6), (2, 1)]
+    # each shard counts exactly the sessions it holds
+    for index, shard in enumerate(store.shards):
+        held = sum(1 for uid in ids if store.shard_index(uid) == index)
+        assert dict(shard.popular_exercises("2024-36", limit=-1)).get(1, 0) == held
+
+    # so deleting a moved session lowers the total
+    moved = next(uid for uid in ids if uid % 2 != uid % 3)
+    store.delete_session(moved, sessions[moved])
+    assert store.popular_exercises("2024-36") == [(1, 5), (2, 1)]
+    store.close()
+
+def test_rebalance_does_not_reuse_moved_session_ids():
+    store = ShardedStorage("memory:reused", 2)
+    store.initialize()
+    ids = [make_user(store, f"user{i}") for i in range(6)]
+    # both on shard 1; only `stays` is still there with three shards
+    stays = next(uid for uid in ids if uid % 2 == 1 and uid % 3 == 1)
+    leaves = next(uid for uid in ids if uid % 2 == 1 and uid % 3 != 1)
+    store.create_session(stays, "2024-01-01", "00:05:00", 0.0)
+    kept = store.create_session(leaves, "2024-01-01", "00:05:00", 0.0)
+    deleted = store.create_session(leaves, "2024-01-02", "00:05:00", 0.0)
+    store.delete_session(leaves, deleted)
+
+    # `leaves` takes a range-1 session and tombstone along; shard 1 must not hand out either ID
+    store.rebalance(3)
+    assert store.shard_index(stays) == 1 and store.shard_index(leaves) != 1
+    assert store.create_session(stays, "2024-01-03", "00:05:00", 0.0) == deleted + 1
+    assert [row[0] for row in store.list_sessions(leaves)] == [kept]
+
+    # shrinking and growing again re-adds shard 2 with its old range
+    store.create_session(leaves, "2024-01-04", "00:05:00", 0.0)
+    store.rebalance(1)
+    store.rebalance(3)
+    taken = {row[0] for uid in ids for row in store.list_sessions(uid)}
+    for uid in ids:
+        assert store.create_session(uid, "2024-01-05", "00:05:00", 0.0) not in taken
+    store.close()
+
+def test_shrink_deletes_dropped_shard_files(tmp_path):
+    database = str(tmp_path / "fitness.db")
+    store = ShardedStorage(database, 3)
+    store.initialize()
+    for name in "abc":
+        make_user(store, name)
+    store.rebalance(2)
+    assert (tmp_path / "fitness-shard1.db").exists()
+    assert not (tmp_path / "fitness-shard2.db").exists()
+    assert store.get_login("c") is not None
+    store.close()
@@ -0,0 +1,77 @@
+import sqlite3
+import pytest
+from storage import create_storage, MemoryStorage, SQLiteStorage
+
+def test_create_storage_picks_backend(tmp_path):
+    mem = create_storage("memory:pick_backend")
+    disk = create_storage(str(tmp_path / "pick.db"))
+    assert isinstance(mem, MemoryStorage)
+    assert isinstance(disk, SQLiteStorage)
+    mem.close()
+
+def test_memory_storage_shared_between_connections():
+    store = create_storage("memory:shared_between")
+    store.initialize()
+    user_id = store.create_user({
+        "full_name": "A", "username": "a", "password": "x", "email": "a@example.com"
+    })
+    # a second connection sees the same in-memory database
+    assert store.find_user(username="a")["userID"] == user_id
+    assert store.username_exists("a")
+    assert not store.username_exists("a", exclude_user_id=user_id)
+    store.close()
+
+    # once closed the database is gone
+    fresh = create_storage("memory:shared_between")
+    conn = fresh.connect()
+    tables = conn.execute("SELECT name FROM sqlite_master WHERE type='table'").fetchall()
+    conn.close()
+    assert tables == []
+    fresh.close()
+
+def test_sqlite_storage_sessions(tmp_path):
+    db_file = tmp_path / "sessions.db"
+    store = create_storage(str(db_file))
+    store.initialize()
+    user_id = store.create_user({
+        "full_name": "B", "username": "b", "password": "x", "email": "b@example.com"
+    })
+    session_id = store.create_session(user_id, "2024-01-01 10:00:00", "00:10:00", 0.0)
+    assert store.list_sessions(user_id) == [(session_id, "2024-01-01 10:00:00", "00:10:00", 0.0)]
+
+    # data is on disk
+    conn = sqlite3.connect(str(db_file))
+    assert conn.execute("SELECT COUNT(*) FROM workoutSession").fetchone()[0] == 1
+    conn.close()
+
+def test_snapshot_restore_round_trip(tmp_path):
+    for store in (create_storage("memory:snapshot_round_trip"), create_storage(str(tmp_path / "snap.db"))):
+        store.initialize()
+        snapshot = store.snapshot()
+        user_id = store.create_user({"full_name": "C", "username": "c", "password": "x", "email": "c@example.com"})
+        store.create_session(user_id, "2024-01-01 10:00:00", "00:10:00", 0.0)
+        store.clear_exercises()
+
+        store.restore(snapshot)
+        assert not store.username_exists("c")
+        assert len(store._fetchall("SELECT exerciseID FROM exercise")) == 3
+        # the FTS index and its triggers come back with the pages
+        assert store._fetchall("SELECT rowid FROM exerciseSearch WHERE exerciseSearch MATCH 'squat*'") == [(2,)]
+        # the template is untouched by a restore and can be reused
+        store.create_user({"full_name": "C", "username": "c", "password": "x", "email": "c@example.com"})
+        store.restore(snapshot)
+        assert not store.username_exists("c")
+        for conn in snapshot:
+            conn.close()
+        store.close()
+
+def test_restore_rejects_a_snapshot_of_another_layout():
+    from sharding import ShardedStorage
+    sharded = ShardedStorage("memory:snapshot_sharded", 2)
+    sharded.initialize()
+    plain = create_storage("memory:snapshot_plain")
+    plain.initialize()
+    with pytest.raises(ValueError, match="3 databases"):
+        plain.restore(sharded.snapshot())
+    sharded.close()
+    plain.close()
@@ -0,0 +1,53 @@
+import json
+from streaming import json_array_object
+from test_api import register_and_get_token
+
+def test_json_array_object_chunks_to_valid_json():
+    for count in (0, 1, 3, 7):
+        items = ({"n": i} for i in range(count))
+        text = "".join(json_array_object("items", items, {"userID": 5}, chunk_items=3))
+        assert json.loads(text) == {"userID": 5, "items": [{"n": i} for i in range(count)]}
+    assert json.loads("".join(json_array_object("items", iter([])))) == {"items": []}
+
+def test_large_history_is_streamed_in_batches(storage, client):
+    user_id, token = register_and_get_token(client)
+    conn = storage.connect_for_user(user_id)
+    conn.executemany(
+        "INSERT INTO workoutSession(date, duration, postureAccuracy, userID) VALUES (?, ?, ?, ?)",
+        [(f"2030-01-01 00:{i // 60 % 60:02d}:{i % 60:02d}", "00:10:00", 0.5, user_id) for i in range(1200)]
+    )
+    conn.commit()
+    conn.close()
+
+    res = client.get("/workoutHistory", headers={"Authorization": f"Bearer {token}"}, buffered=False)
+    assert res.status_code == 200
+    assert res.is_streamed
+    chunks = list(res.response)
+    assert len(chunks) > 3
+    body = json.loads(b"".join(chunks))
+    assert body["userID"] == user_id
+    assert len(body["workoutHistory"]) == 1200
+
+def test_library_and_videos_keep_their_shape(client):
+    _, token = register_and_get_token(client)
+    headers = {"Authorization": f"Bearer {token}"}
+    exercises = client.get("/workoutLibrary", headers=headers).get_json()["exercises"]
+    videos = client.get("/exerciseVideos", headers=headers).get_json()["exerciseVideos"]
+    assert exercises and set(exercises[0]) == {
+        "exerciseID", "name", "category", "targetedBodyParts", "requiredEquipment", "videoURL"}
+    assert [v["exerciseID"] for v in videos] == [e["exerciseID"] for e in exercises]
+
+def test_stalled_stream_does_not_block_writers(storage, client):
+    user_id, token = register_and_get_token(client)
+    for i in range(1200):
+        # equal dates across batch boundaries must neither be skipped nor repeated
+        storage.create_session(user_id, f"2030-01-01 00:00:{i // 400:02d}", "00:10:00", 0.5)
+
+    res = client.get("/workoutHistory", headers={"Authorization": f"Bearer {token}"}, buffered=False)
+    stream = iter(res.response)
+    head = [next(stream), next(stream)]
+    # the client stops reading: no read transaction may be left open meanwhile
+    storage.create_session(user_id, "2030-01-02 00:00:00", "00:05:00", 0.9)
+    body = json.loads(b"".join(head + list(stream)))
+    ids = [s["sessionID"] for s in body["workoutHistory"]]
+    assert len(ids) == len(set(ids)) == 1201
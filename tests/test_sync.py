@@ -0,0 +1,121 @@
+import time
+from datetime import datetime
+import archive
+import sync
+from sharding import ShardedStorage
+from test_api import register_and_get_token
+
+def changes(client, token, since=None, **params):
+    if since is not None:
+        params["since"] = since
+    res = client.get("/workoutHistory/changes", query_string=params,
+                     headers={"Authorization": f"Bearer {token}"})
+    assert res.status_code == 200
+    return res.get_json()
+
+def test_changes_return_only_rows_modified_since_token(storage, client):
+    user_id, token = register_and_get_token(client)
+    first = storage.create_session(user_id, "2024-09-01 08:00:00", "00:10:00", 0.0)
+    second = storage.create_session(user_id, "2024-09-02 08:00:00", "00:20:00", 0.0)
+
+    full = changes(client, token)
+    assert full["reset"] is True
+    assert [c["sessionID"] for c in full["changes"]] == [first, second]
+
+    # nothing changed -> empty delta, same token
+    empty = changes(client, token, full["token"])
+    assert (empty["changes"], empty["deleted"], empty["reset"]) == ([], [], False)
+    assert empty["token"] == full["token"]
+
+    storage.update_session(user_id, first, {"postureAccuracy": 0.8})
+    third = storage.create_session(user_id, "2024-09-03 08:00:00", "00:30:00", 0.0)
+    storage.delete_session(user_id, second)
+
+    delta = changes(client, token, full["token"])
+    assert [(c["sessionID"], c["postureAccuracy"]) for c in delta["changes"]] == [(first, 0.8), (third, 0.0)]
+    assert delta["deleted"] == [second]
+    assert changes(client, token, delta["token"])["changes"] == []
+
+def test_changes_are_paginated(storage, client):
+    user_id, token = register_and_get_token(client)
+    ids = [storage.create_session(user_id, f"2024-09-{day:02d} 08:00:00", "00:10:00", 0.0) for day in range(1, 6)]
+    page = changes(client, token, limit=2)
+    seen = [c["sessionID"] for c in page["changes"]]
+    while page["hasMore"]:
+        page = changes(client, token, page["token"], limit=2)
+        seen += [c["sessionID"] for c in page["changes"]]
+    assert seen == ids
+
+def test_archived_sessions_are_not_tombstoned(storage, client):
+    user_id, token = register_and_get_token(client)
+    storage.create_session(user_id, "2024-01-10 08:00:00", "00:10:00", 0.5)
+    full = changes(client, token)
+    assert archive.archive_sessions(storage, 90, now=datetime(2024, 9, 15)) == 1
+    assert changes(client, token, full["token"])["deleted"] == []
+
+def test_purged_tombstones_force_a_full_resync(storage, client):
+    user_id, token = register_and_get_token(client)
+    session_id = storage.create_session(user_id, "2024-09-01 08:00:00", "00:10:00", 0.0)
+    full = changes(client, token)
+    storage.delete_session(user_id, session_id)
+
+    assert sync.purge_tombstones(storage, 30, now=time.time() + 31 * 86400) == 1
+    resync = changes(client, token, full["token"])
+    assert resync["reset"] is True
+    assert resync["changes"] == [] and resync["deleted"] == []
+
+def test_paged_resync_after_purge_terminates(storage, client):
+    user_id, token = register_and_get_token(client)
+    ids = [storage.create_session(user_id, f"2024-09-{day:02d} 08:00:00", "00:10:00", 0.0) for day in range(1, 6)]
+    # purge up to now: every session's changeSeq is below the purge horizon
+    time.sleep(0.002)
+    sync.purge_tombstones(storage, 0)
+    time.sleep(0.002)
+
+    page = changes(client, token, limit=2)
+    assert page["reset"] is True
+    seen = [c["sessionID"] for c in page["changes"]]
+    pages = 1
+    while page["hasMore"]:
+        if pages == 1:
+            # changed while the resync is paged: comes with the next delta
+            storage.update_session(user_id, ids[0], {"postureAccuracy": 0.7})
+        page = changes(client, token, page["token"], limit=2)
+        assert page["reset"] is False
+        seen += [c["sessionID"] for c in page["changes"]]
+        pages += 1
+    assert pages == 3 and sorted(seen) == ids
+
+    delta = changes(client, token, page["token"])
+    assert delta["reset"] is False
+    assert [(c["sessionID"], c["postureAccuracy"]) for c in delta["changes"]] == [(ids[0], 0.7)]
+
+def test_empty_resync_token_is_past_the_purge_horizon(storage, client):
+    _, token = register_and_get_token(client)
+    sync.purge_tombstones(storage, 30, now=time.time() + 31 * 86400)
+    full = changes(client, token)
+    assert full["reset"] is True and full["changes"] == []
+    assert changes(client, token, full["token"])["reset"] is False
+
+def test_invalid_token_is_rejected(client):
+    _, token = register_and_get_token(client)
+    res = client.get("/workoutHistory/changes?since=abc", headers={"Authorization": f"Bearer {token}"})
+    assert res.status_code == 400
+
+def test_rebalance_keeps_tokens_valid():
+    store = ShardedStorage("memory:synced", 2)
+    store.initialize()
+    for name in ("a", "b"):
+        user_id = store.create_user({"full_name": name, "username": name, "password": "x",
+                                     "email": f"{name}@example.com", "isActive": 1})
+    kept = store.create_session(user_id, "2024-09-01 08:00:00", "00:10:00", 0.0)
+    gone = store.create_session(user_id, "2024-09-02 08:00:00", "00:10:00", 0.0)
+    token = sync.list_changes(store, user_id)["token"]
+    store.delete_session(user_id, gone)
+
+    # user 2 moves from shard 0 to shard 2
+    assert store.rebalance(3) == 1
+    delta = sync.list_changes(store, user_id, int(token))
+    assert [c["sessionID"] for c in delta["changes"]] == [kept]
+    assert delta["deleted"] == [gone]
+    store.close()
@@ -0,0 +1,134 @@
+import numpy as np
+from datetime import datetime
+import leaderboard
+import telemetry
+from telemetry import PostureAggregator, parse_text
+from test_api import register_and_get_token
+
+def start_session(client, headers):
+    res = client.post("/startWorkout", headers=headers, json={"exerciseID": 1, "duration": "00:00:00"})
+    assert res.status_code == 201
+    return res.get_json()["sessionID"]
+
+def test_aggregator_downsamples_within_budget():
+    agg = PostureAggregator(1, datetime.now(), bucket_size=10, max_points=8)
+    for _ in range(10):
+        agg.add(np.full(25, 0.5))
+    agg.add([float("nan"), 2.0])
+    assert agg.count == 251
+    assert agg.maximum == 1.0
+    assert agg.series.size <= 8
+    assert np.allclose(agg.series, 0.5)
+
+def test_parse_text_handles_numbers_split_across_chunks():
+    chunks = [b"0.5\n0.2", b"5,1\n", b"0.75"]
+    values = np.concatenate(list(parse_text(chunks)))
+    assert values.tolist() == [0.5, 0.25, 1.0, 0.75]
+
+def test_stream_and_close_session(client, storage):
+    user_id, token = register_and_get_token(client)
+    headers = {"Authorization": f"Bearer {token}"}
+    session_id = start_session(client, headers)
+
+    binary = np.array([0.8, 0.9, 1.0, 0.9], dtype="<f4").tobytes()
+    res = client.post(f"/workoutSession/{session_id}/posture", headers=headers,
+                      data=binary, content_type="application/octet-stream")
+    assert res.status_code == 202
+    assert res.get_json()["received"] == 4
+
+    res = client.post(f"/workoutSession/{session_id}/posture", headers=headers,
+                      data="0.6\n0.8\n", content_type="text/plain")
+    assert res.get_json()["totalSamples"] == 6
+
+    res = client.post(f"/workoutSession/{session_id}/close", headers=headers)
+    assert res.status_code == 200
+    body = res.get_json()
+    assert body["samples"] == 6
+    assert abs(body["postureAccuracy"] - 0.8333) < 1e-3
+
+    row = storage.get_session(user_id, session_id)
+    assert row[3] == body["postureAccuracy"]
+    assert row[2] == body["duration"]
+
+def test_posture_rejects_bad_input_and_unknown_session(client):
+    _, token = register_and_get_token(client)
+    headers = {"Authorization": f"Bearer {token}"}
+    session_id = start_session(client, headers)
+
+    res = client.post(f"/workoutSession/{session_id}/posture", headers=headers,
+                      data="0.5 oops", content_type="text/plain")
+    assert res.status_code == 400
+    res = client.post("/workoutSession/999999/posture", headers=headers, data="0.5")
+    assert res.status_code == 404
+    telemetry.registry.pop(session_id)
+
+def test_idle_sessions_are_closed(client, storage):
+    user_id, token = register_and_get_token(client)
+    headers = {"Authorization": f"Bearer {token}"}
+    session_id = start_session(client, headers)
+    client.post(f"/workoutSession/{session_id}/posture", headers=headers, data="0.4")
+
+    assert telemetry.close_idle_sessions(storage, timeout=-1) == 1
+    assert len(telemetry.registry) == 0
+    assert storage.get_session(user_id, session_id)[3] == 0.4
+
+def test_closed_session_stays_closed(client, storage):
+    user_id, token = register_and_get_token(client)
+    headers = {"Authorization": f"Bearer {token}"}
+    session_id = start_session(client, headers)
+    client.post(f"/workoutSession/{session_id}/posture", headers=headers, data="0.6")
+    assert client.post(f"/workoutSession/{session_id}/close", headers=headers).status_code == 200
+    row = storage.get_session(user_id, session_id)
+
+    res = client.post(f"/workoutSession/{session_id}/posture", headers=headers, data="0.1")
+    assert res.status_code == 409
+    assert client.post(f"/workoutSession/{session_id}/close", headers=headers).status_code == 409
+    assert storage.get_session(user_id, session_id) == row
+    assert len(telemetry.registry) == 0
+
+def test_samples_racing_a_close_are_refused(client, storage, monkeypatch):
+    user_id, token = register_and_get_token(client)
+    headers = {"Authorization": f"Bearer {token}"}
+    session_id = start_session(client, headers)
+    client.post(f"/workoutSession/{session_id}/posture", headers=headers, data="0.6")
+    aggregator = telemetry.registry.get(session_id)
+    started = storage.get_session_start(user_id, session_id)
+
+    assert telemetry.finish_session(storage, session_id)["samples"] == 1
+    # a request that looked the session up just before the close must not add to it
+    monkeypatch.setattr(type(storage), "get_session_start", lambda self, uid, sid: started)
+    monkeypatch.setattr(telemetry.registry, "open", lambda *args: aggregator)
+    res = client.post(f"/workoutSession/{session_id}/posture", headers=headers, data="0.1")
+    assert res.status_code == 409 and res.get_json()["received"] == 0
+    assert storage.get_session(user_id, session_id)[3] == 0.6
+
+def test_sessions_dated_without_time_can_stream(client, storage):
+    user_id, token = register_and_get_token(client)
+    headers = {"Authorization": f"Bearer {token}"}
+    session_id = storage.create_session(user_id, "2024-09-01", "00:10:00", 0.0)
+    assert client.post(f"/workoutSession/{session_id}/posture", headers=headers, data="0.5").status_code == 202
+    assert client.post(f"/workoutSession/{session_id}/close", headers=headers).status_code == 200
+
+def test_stale_open_after_a_close_cannot_overwrite_it(client, storage):
+    user_id, token = register_and_get_token(client)
+    headers = {"Authorization": f"Bearer {token}"}
+    session_id = start_session(client, headers)
+    client.post(f"/workoutSession/{session_id}/posture", headers=headers, data="0.9")
+    started = telemetry.parse_started(storage.get_session_start(user_id, session_id)[0])
+    assert client.post(f"/workoutSession/{session_id}/close", headers=headers).status_code == 200
+    row = storage.get_session(user_id, session_id)
+    week = datetime.now().strftime("%Y-%W")
+    board = [(u, s) for _, u, s in leaderboard.get_board(storage, week, "duration").top(5)]
+
+    # a request that read the row while it was open must not start a new aggregator
+    def is_open():
+        return not storage.get_session_start(user_id, session_id)[1]
+    assert telemetry.registry.open(session_id, user_id, started, is_open) is None
+
+    # and an aggregator created before that check cannot close the session a second time
+    stale = PostureAggregator(user_id, started)
+    stale.add([0.1])
+    assert telemetry.finish_session(storage, session_id, stale) is None
+    assert storage.get_session(user_id, session_id) == row
+    assert [(u, s) for _, u, s in leaderboard.get_board(storage, week, "duration").top(5)] == board
+    assert len(telemetry.registry) == 0
@@ -0,0 +1,103 @@
+import base64
+import io
+import logging
+import urllib.request
+import pytest
+from main import app as flask_app
+import thumbnails
+from metrics import metrics
+from test_api import REGISTER_PAYLOAD
+
+Image = pytest.importorskip("PIL.Image")
+
+def picture(color, size=(640, 480)):
+    out = io.BytesIO()
+    Image.new("RGB", size, color).save(out, "PNG")
+    return base64.b64encode(out.getvalue()).decode("ascii")
+
+def register_with_picture(client, pic):
+    res = client.post("/register", json=dict(REGISTER_PAYLOAD, profilepic=pic))
+    assert res.status_code == 201
+    flask_app.extensions["thumbnails"].wait(10)
+    data = res.get_json()
+    return data["userID"], {"Authorization": f"Bearer {data['token']}"}
+
+def test_upload_produces_every_size(client):
+    user_id, headers = register_with_picture(client, picture("red"))
+    for size, edge in thumbnails.SIZES.items():
+        res = client.get(f"/profilePic/{user_id}/{size}", headers=headers)
+        assert res.status_code == 200
+        assert res.mimetype == "image/jpeg"
+        image = Image.open(io.BytesIO(res.data))
+        assert image.size == (edge, edge)
+    assert client.get(f"/profilePic/{user_id}/huge", headers=headers).status_code == 404
+
+def test_cache_headers_and_revalidation(client):
+    user_id, headers = register_with_picture(client, picture("blue"))
+    urls = client.get("/userProfile", headers=headers).get_json()["profilePicThumbnails"]
+
+    res = client.get(urls["small"], headers=headers)
+    assert "immutable" in res.headers["Cache-Control"]
+    etag = res.headers["ETag"]
+
+    res = client.get(f"/profilePic/{user_id}/small", headers=headers)
+    assert res.headers["Cache-Control"] == "private, no-cache"
+    res = client.get(f"/profilePic/{user_id}/small", headers=dict(headers, **{"If-None-Match": etag}))
+    assert res.status_code == 304
+
+def test_new_picture_replaces_thumbnails(client):
+    user_id, headers = register_with_picture(client, picture("green"))
+    old_urls = client.get("/userProfile", headers=headers).get_json()["profilePicThumbnails"]
+    old = client.get(f"/profilePic/{user_id}/large", headers=headers)
+
+    res = client.put("/updateUserProfile", json={"profilepic": picture("white", (300, 900))}, headers=headers)
+    assert res.status_code == 200
+    flask_app.extensions["thumbnails"].wait(10)
+
+    new_urls = client.get("/userProfile", headers=headers).get_json()["profilePicThumbnails"]
+    assert new_urls["large"] != old_urls["large"]
+    new = client.get(f"/profilePic/{user_id}/large", headers=headers)
+    assert new.headers["ETag"] != old.headers["ETag"]
+    assert Image.open(io.BytesIO(new.data)).getpixel((128, 128))[0] > 200
+
+def test_invalid_picture_is_skipped(client, storage):
+    res = client.post("/register", json=dict(REGISTER_PAYLOAD, profilepic=base64.b64encode(b"not an image").decode()))
+    assert res.status_code == 201
+    flask_app.extensions["thumbnails"].wait(10)
+    user_id = res.get_json()["userID"]
+    assert storage.get_thumbnail(user_id, "small") is None
+
+def test_backfill_generates_missing_thumbnails(storage):
+    user_id = storage.create_user({"full_name": "Old", "username": "old", "password": "x",
+                                   "email": "old@example.com", "profilepic": picture("black"), "isActive": 1})
+    assert thumbnails.backfill(storage) == 1
+    assert storage.get_thumbnail(user_id, "medium") is not None
+    assert thumbnails.backfill(storage) == 0
+
+def test_only_google_photo_urls_are_fetched():
+    with pytest.raises(ValueError):
+        thumbnails.load_picture("http://169.254.169.254/latest/meta-data")
+    with pytest.raises(ValueError):
+        thumbnails.load_picture("https://lh3.googleusercontent.com.evil.example/a.jpg")
+
+def test_redirects_are_checked_against_the_allowed_hosts():
+    handler = thumbnails.CheckedRedirectHandler()
+    request = urllib.request.Request("https://lh3.googleusercontent.com/a.jpg")
+    with pytest.raises(ValueError):
+        handler.redirect_request(request, None, 302, "Found", {}, "http://169.254.169.254/latest/meta-data")
+    with pytest.raises(ValueError):
+        handler.redirect_request(request, None, 302, "Found", {}, "https://internal.example/a.jpg")
+    allowed = handler.redirect_request(request, None, 302, "Found", {}, "https://lh4.googleusercontent.com/b.jpg")
+    assert allowed.full_url == "https://lh4.googleusercontent.com/b.jpg"
+
+def test_failures_are_counted_and_logged(storage, caplog):
+    worker = thumbnails.Thumbnailer()
+    user_id = storage.create_user({"full_name": "Bad", "username": "bad", "password": "x",
+                                   "email": "bad@example.com", "profilepic": "https://evil.example/a.jpg",
+                                   "isActive": 1})
+    metrics.reset()
+    with caplog.at_level(logging.WARNING, logger="thumbnails"):
+        worker.schedule(storage, user_id)
+        worker.wait(10)
+    assert metrics.snapshot()["counters"]["thumbnails.failed"] == 1
+    assert f"Thumbnails for user {user_id} failed" in caplog.text
@@ -0,0 +1,64 @@
+from datetime import datetime, timedelta
+import tokens
+from test_api import register_and_get_token, REGISTER_PAYLOAD
+
+def login(client):
+    res = client.post("/login", json={"username": REGISTER_PAYLOAD["username"],
+                                      "password": REGISTER_PAYLOAD["password"]})
+    assert res.status_code == 200
+    return res.get_json()
+
+def test_refresh_rotates_tokens(client):
+    user_id, _ = register_and_get_token(client)
+    first = login(client)["refreshToken"]
+
+    res = client.post("/refresh", json={"refreshToken": first})
+    assert res.status_code == 200
+    body = res.get_json()
+    assert body["userID"] == user_id
+    assert body["refreshToken"] != first
+
+    # the new access token works
+    headers = {"Authorization": f"Bearer {body['token']}"}
+    assert client.get("/userProfile", headers=headers).status_code == 200
+
+def test_reused_refresh_token_revokes_family(client):
+    register_and_get_token(client)
+    first = login(client)["refreshToken"]
+    second = client.post("/refresh", json={"refreshToken": first}).get_json()["refreshToken"]
+
+    res = client.post("/refresh", json={"refreshToken": first})
+    assert res.status_code == 401
+    assert "reuse" in res.get_json()["error"]
+    # the legitimate successor is revoked too
+    assert client.post("/refresh", json={"refreshToken": second}).status_code == 401
+
+def test_logout_and_invalid_tokens(client):
+    register_and_get_token(client)
+    token = login(client)["refreshToken"]
+    assert client.post("/logout", json={"refreshToken": token}).status_code == 200
+    assert client.post("/refresh", json={"refreshToken": token}).status_code == 401
+    assert client.post("/refresh", json={"refreshToken": "bogus"}).status_code == 401
+    assert client.post("/refresh", json={}).status_code == 400
+
+def test_expired_tokens_rejected_and_purged(client, storage):
+    user_id, _ = register_and_get_token(client)
+    old = tokens.issue_refresh_token(storage, user_id, now=datetime.utcnow() - timedelta(days=60))
+    assert client.post("/refresh", json={"refreshToken": old}).status_code == 401
+    assert tokens.purge_refresh_tokens(storage) == 1
+
+def test_password_change_revokes_refresh_tokens(client):
+    _, access = register_and_get_token(client)
+    stolen = login(client)["refreshToken"]
+    other_device = login(client)["refreshToken"]
+    res = client.put("/updateUserProfile", json={"password": "N3w-passw0rd!"},
+                     headers={"Authorization": f"Bearer {access}"})
+    assert res.status_code == 200
+    for token in (stolen, other_device):
+        assert client.post("/refresh", json={"refreshToken": token}).status_code == 401
+
+    # other profile changes leave them alone
+    fresh = client.post("/login", json={"username": REGISTER_PAYLOAD["username"],
+                                        "password": "N3w-passw0rd!"}).get_json()
+    client.put("/updateUserProfile", json={"weight": 70}, headers={"Authorization": f"Bearer {fresh['token']}"})
+    assert client.post("/refresh", json={"refreshToken": fresh["refreshToken"]}).status_code == 200
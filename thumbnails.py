@@ -0,0 +1,238 @@
+"""
+Profile picture thumbnails
+
+`user.profilepic` holds whatever the client uploaded (base64, possibly a data
+URL) or, for Google sign-ins, the photo URL (only fetched from Google's
+hosts). List views and headers only need a small avatar, so every new picture
+is scaled once into square JPEG thumbnails (see SIZES) by a background worker
+and stored in the `profileThumbnail` table:
+
+    GET /profilePic/<userID>/<small|medium|large>
+
+Thumbnails are served with an ETag derived from the source picture. The
+profile returns their URLs with `?v=<version>`; requests carrying the current
+version are cacheable for a year, others must revalidate (304 when unchanged).
+
+Uploads through /register, /updateUserProfile and /google-auth queue the
+user; the worker reads the current picture when it gets to it, so a burst of
+uploads for one user is scaled once. Pillow is optional: without it no
+thumbnails are made and the endpoints answer 404. Thumbnails for pictures
+stored before this existed are made with
+
+    python thumbnails.py --database fitness.db
+"""
+
+import argparse
+import base64
+import binascii
+import hashlib
+import io
+import logging
+import os
+import threading
+import urllib.parse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor, wait
+from flask import Blueprint, request, jsonify, current_app, url_for
+
+from metrics import metrics
+from security import token_required
+from storage import get_storage
+
+thumbnails_bp = Blueprint('thumbnails', __name__)
+logger = logging.getLogger(__name__)
+
+# size name -> edge length in pixels
+SIZES = {'small': 48, 'medium': 128, 'large': 256}
+JPEG_QUALITY = 80
+# Picture URLs are only fetched from Google's photo hosts; anyone can store a URL
+# through /updateUserProfile, and fetching arbitrary ones would reach internal hosts
+FETCH_HOSTS = ('.googleusercontent.com',)
+# Limits for pictures fetched from a URL and for decoded images
+FETCH_TIMEOUT = 10
+MAX_SOURCE_BYTES = 10 * 1024 * 1024
+MAX_PIXELS = 40_000_000
+IMMUTABLE_MAX_AGE = 365 * 86400
+
+
+def picture_version(picture):
+    """Short hash identifying a stored profile picture."""
+    return hashlib.sha256(picture.encode('utf-8')).hexdigest()[:16]
+
+
+def thumbnail_urls(user_id, picture):
+    """Versioned thumbnail URLs for a user's current picture, or None without one."""
+    if not picture:
+        return None
+    version = picture_version(picture)
+    return {size: url_for('thumbnails.profile_thumbnail', user_id=user_id, size=size, v=version)
+            for size in SIZES}
+
+
+def check_fetch_url(url):
+    """Raise ValueError unless `url` is an https URL on one of FETCH_HOSTS."""
+    host = urllib.parse.urlsplit(url).hostname or ''
+    if not url.startswith('https://') or not host.endswith(FETCH_HOSTS):
+        raise ValueError(f'pictures are not fetched from {host}')
+
+
+class CheckedRedirectHandler(urllib.request.HTTPRedirectHandler):
+    """Follows a redirect only to a URL that check_fetch_url accepts."""
+
+    def redirect_request(self, req, fp, code, msg, headers, newurl):
+        check_fetch_url(newurl)
+        return super().redirect_request(req, fp, code, msg, headers, newurl)
+
+
+_opener = urllib.request.build_opener(CheckedRedirectHandler)
+
+
+def load_picture(picture):
+    """Return the image bytes of a stored picture: fetched if it is a URL, else base64 decoded."""
+    if picture.startswith(('http://', 'https://')):
+        check_fetch_url(picture)
+        with _opener.open(picture, timeout=FETCH_TIMEOUT) as response:
+            data = response.read(MAX_SOURCE_BYTES + 1)
+        if len(data) > MAX_SOURCE_BYTES:
+            raise ValueError('picture is too large')
+        return data
+    if picture.startswith('data:'):
+        picture = picture.partition(',')[2]
+    try:
+        return base64.b64decode(picture, validate=False)
+    except (binascii.Error, ValueError):
+        raise ValueError('picture is not valid base64')
+
+
+def render_thumbnails(data):
+    """Scale image bytes into {size: JPEG bytes}. Needs Pillow."""
+    from PIL import Image, ImageOps
+
+    with Image.open(io.BytesIO(data)) as image:
+        if image.width * image.height > MAX_PIXELS:
+            raise ValueError('picture has too many pixels')
+        largest = max(SIZES.values())
+        # lets the JPEG decoder skip straight to a smaller scale
+        image.draft('RGB', (largest * 2, largest * 2))
+        image = ImageOps.exif_transpose(image).convert('RGB')
+        thumbnails = {}
+        for size, edge in sorted(SIZES.items(), key=lambda item: -item[1]):
+            image = ImageOps.fit(image, (edge, edge), Image.LANCZOS)
+            out = io.BytesIO()
+            image.save(out, 'JPEG', quality=JPEG_QUALITY, optimize=True)
+            thumbnails[size] = out.getvalue()
+        return thumbnails
+
+
+def generate(storage, user_id):
+    """Make the thumbnails of a user's current picture unless they exist. Returns True if made."""
+    picture = storage.get_profilepic(user_id)
+    if not picture:
+        storage.save_thumbnails(user_id, '', {})
+        return False
+    version = picture_version(picture)
+    current = storage.get_thumbnail(user_id, 'small')
+    if current and current[1] == version:
+        return False
+    storage.save_thumbnails(user_id, version, render_thumbnails(load_picture(picture)))
+    metrics.incr('thumbnails.generated')
+    return True
+
+
+class Thumbnailer:
+    """Background worker generating thumbnails; each user is queued at most once."""
+
+    def __init__(self, workers=1):
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='thumbnails')
+        self._queued = set()
+        self._futures = set()
+        self._lock = threading.Lock()
+        try:
+            import PIL  # noqa: F401
+            self.available = True
+        except ImportError:
+            self.available = False
+
+    def schedule(self, storage, user_id):
+        if not self.available:
+            metrics.incr('thumbnails.unavailable')
+            return
+        with self._lock:
+            if user_id in self._queued:
+                return
+            self._queued.add(user_id)
+            future = self._pool.submit(self._run, storage, user_id)
+            self._futures.add(future)
+        future.add_done_callback(self._futures.discard)
+
+    def _run(self, storage, user_id):
+        with self._lock:
+            self._queued.discard(user_id)
+        try:
+            generate(storage, user_id)
+        except (ValueError, OSError) as e:
+            # bad pictures and unreachable URLs are expected
+            metrics.incr('thumbnails.failed')
+            logger.warning("Thumbnails for user %s failed: %s", user_id, e)
+        except Exception:
+            metrics.incr('thumbnails.failed')
+            metrics.incr('thumbnails.errors')
+            logger.exception("Thumbnails for user %s failed", user_id)
+
+    def wait(self, timeout=None):
+        """Block until the queued thumbnails are done."""
+        with self._lock:
+            futures = list(self._futures)
+        wait(futures, timeout)
+
+
+def schedule(user_id):
+    """Queue thumbnail generation for a user whose picture changed."""
+    current_app.extensions['thumbnails'].schedule(get_storage(), user_id)
+
+
+@thumbnails_bp.route('/profilePic/<int:user_id>/<size>', methods=['GET'])
+@token_required
+def profile_thumbnail(current_user_id, user_id, size):
+    if size not in SIZES:
+        return jsonify({'error': f"size must be one of {', '.join(SIZES)}"}), 404
+    row = get_storage().get_thumbnail(user_id, size)
+    if not row:
+        return jsonify({'error': 'No thumbnail for this user'}), 404
+    image, version = row
+    response = current_app.response_class(image, mimetype='image/jpeg')
+    response.set_etag(f'{version}-{size}')
+    if request.args.get('v') == version:
+        response.headers['Cache-Control'] = f'private, max-age={IMMUTABLE_MAX_AGE}, immutable'
+    else:
+        response.headers['Cache-Control'] = 'private, no-cache'
+    return response.make_conditional(request)
+
+
+def backfill(storage):
+    """Make the missing thumbnails of every user with a picture. Returns how many users got them."""
+    made = 0
+    for partition in storage.partitions():
+        for user_id in partition.users_missing_thumbnails():
+            try:
+                made += generate(partition, user_id)
+            except (ValueError, OSError) as e:
+                print(f"User {user_id}: {e}")
+    return made
+
+
+def init_app(app):
+    app.extensions['thumbnails'] = Thumbnailer(app.config.get('THUMBNAIL_WORKERS', 1))
+
+
+if __name__ == '__main__':
+    from storage import create_storage
+
+    parser = argparse.ArgumentParser(description="Generate missing profile picture thumbnails.")
+    parser.add_argument('--database', default=os.getenv('DATABASE', 'fitness.db'))
+    parser.add_argument('--shards', type=int, default=int(os.getenv('DATABASE_SHARDS', '0')))
+    args = parser.parse_args()
+
+    store = create_storage(args.database, args.shards)
+    store.initialize()
+    print(f"Generated thumbnails for {backfill(store)} users")
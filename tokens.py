@@ -0,0 +1,118 @@
+"""
+Refresh tokens
+
+/login and /register return a short-lived JWT access token together with a
+long-lived opaque refresh token. POST /refresh trades a refresh token for a
+new access token without touching the password path: it is a single indexed
+lookup of the token's SHA-256 hash.
+
+Refresh tokens rotate: every use revokes the presented token and issues a new
+one in the same family. Presenting an already revoked token means it leaked,
+so the whole family is revoked and the user has to log in again. Changing the
+password revokes every refresh token of the user.
+"""
+
+import hashlib
+import secrets
+from datetime import datetime, timedelta
+from flask import Blueprint, request, jsonify, current_app
+
+from security import encode_auth_token
+from storage import get_storage
+
+tokens_bp = Blueprint('tokens', __name__)
+
+DATE_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+
+def hash_token(token):
+    return hashlib.sha256(token.encode('utf-8')).hexdigest()
+
+
+def issue_refresh_token(storage, user_id, family_id=None, now=None):
+    """Create and store a new refresh token, returning the plain token."""
+    now = now or datetime.utcnow()
+    token = secrets.token_urlsafe(32)
+    expires = now + timedelta(seconds=current_app.config.get('REFRESH_TOKEN_TTL', 30 * 86400))
+    storage.save_refresh_token(hash_token(token), user_id, family_id or secrets.token_hex(16),
+                               expires.strftime(DATE_FORMAT))
+    return token
+
+
+def rotate_refresh_token(storage, token, now=None):
+    """Revoke a refresh token and issue its successor.
+
+    Returns (user_id, new_token). Raises ValueError if the token is unknown,
+    expired or was already used.
+    """
+    now = now or datetime.utcnow()
+    stamp = now.strftime(DATE_FORMAT)
+    token_hash = hash_token(token)
+    row = storage.get_refresh_token(token_hash)
+    if not row:
+        raise ValueError('Invalid refresh token, please login again.')
+    user_id, family_id, expires_at, revoked_at = row
+    if revoked_at:
+        # reuse of a rotated token: revoke the whole family
+        storage.revoke_refresh_token_family(stamp, family_id=family_id)
+        raise ValueError('Refresh token reuse detected, please login again.')
+    if expires_at <= stamp:
+        raise ValueError('Refresh token expired, please login again.')
+    if not storage.revoke_refresh_token(token_hash, stamp):
+        raise ValueError('Invalid refresh token, please login again.')
+    return user_id, issue_refresh_token(storage, user_id, family_id, now)
+
+
+def revoke_refresh_token(storage, token, now=None):
+    """Revoke every token in the family of `token` (logout)."""
+    stamp = (now or datetime.utcnow()).strftime(DATE_FORMAT)
+    storage.revoke_refresh_token_family(stamp, token_hash=hash_token(token))
+
+
+def revoke_user_tokens(storage, user_id, now=None):
+    """Revoke every refresh token of a user (password change). Returns the number revoked."""
+    stamp = (now or datetime.utcnow()).strftime(DATE_FORMAT)
+    return storage.revoke_user_refresh_tokens(user_id, stamp)
+
+
+def purge_refresh_tokens(storage, now=None):
+    """Delete expired tokens. Returns the number of rows removed."""
+    return storage.purge_refresh_tokens((now or datetime.utcnow()).strftime(DATE_FORMAT))
+
+
+@tokens_bp.route('/refresh', methods=['POST'])
+def refresh():
+    """Exchange a refresh token for a new access token and a rotated refresh token."""
+    data = request.json or {}
+    token = data.get('refreshToken')
+    if not token:
+        return jsonify({'error': 'refreshToken is required'}), 400
+
+    store = get_storage()
+    try:
+        user_id, new_token = rotate_refresh_token(store, token)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 401
+
+    account = store.get_account(user_id)
+    if not account or not account[1]:
+        revoke_refresh_token(store, new_token)
+        return jsonify({'error': 'Account inactive'}), 403
+
+    return jsonify({
+        'userID': user_id,
+        'token': encode_auth_token(user_id, account[0]),
+        'expiresIn': current_app.config.get('ACCESS_TOKEN_TTL', 900),
+        'refreshToken': new_token
+    }), 200
+
+
+@tokens_bp.route('/logout', methods=['POST'])
+def logout():
+    """Revoke a refresh token and every token rotated from it."""
+    data = request.json or {}
+    token = data.get('refreshToken')
+    if not token:
+        return jsonify({'error': 'refreshToken is required'}), 400
+    revoke_refresh_token(get_storage(), token)
+    return jsonify({'message': 'Logged out'}), 200